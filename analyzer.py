@@ -1,277 +1,409 @@
 import requests
-import time
-from bs4 import BeautifulSoup
-import re
-from urllib.parse import urlparse
-import ssl
-import socket
-from datetime import datetime
+from requests.structures import CaseInsensitiveDict
+from fetcher import descargar, MODO_DEFAULT
+from extractor import parsear_html, extraer_metricas, elegir_parser
+from cache import hash_contenido
+from profiling import crear_cronometro
+from crawler import enlaces_de_pagina
 
-def analizar_url(url, repeticion=1):
+# Headers con los que una CDN o proxy indica que respondió desde su cache
+HEADERS_CACHE_CDN = ('X-Cache', 'CF-Cache-Status', 'X-Cache-Status', 'X-Proxy-Cache', 'X-Vercel-Cache')
+
+class RespuestaParseo:
+    """
+    Lo que el análisis usa de una respuesta de requests (status, URL final,
+    cuerpo, headers y los status de las redirecciones). Se envía al pool de
+    procesos en lugar del Response, que arrastra la conexión cruda, el
+    historial completo y atributos del adaptador que cuesta serializar o que
+    no se pueden serializar.
+    """
+    __slots__ = ('status_code', 'url', 'content', 'headers', 'history')
+
+    def __init__(self, status_code, url, content, headers, history=()):
+        self.status_code = status_code
+        self.url = url
+        self.content = content
+        self.headers = CaseInsensitiveDict(headers)
+        self.history = tuple(history)
+
+    @classmethod
+    def desde_response(cls, response):
+        return cls(
+            response.status_code, response.url, response.content, response.headers,
+            [anterior.status_code for anterior in response.history]
+        )
+
+def analizar_url(url, repeticion=1, modo=MODO_DEFAULT, parser=None, cache=None, base=None, max_bytes=None,
+                 etapas=False):
     """
     Analiza una URL y retorna métricas de rendimiento, SEO, seguridad y accesibilidad.
+    El modo "cold" abre conexiones nuevas y el modo "warm" reutiliza las del worker.
+    Si se pasa una cache, las métricas del HTML se reutilizan cuando el cuerpo es idéntico.
+    Con base (el resultado de la primera repetición) la solicitud se revalida con
+    su ETag / Last-Modified y un 304 reutiliza las métricas de base sin parsear.
+    El cuerpo se descarga hasta max_bytes (ver fetcher.descargar).
+    Con etapas el resultado trae en stage_timings_ms cuánto tardó cada parte.
     """
-    start_time = time.time()
-    
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        response = requests.get(url, timeout=30, headers=headers)
-        total_time = time.time() - start_time
-        
-        # Parsear el HTML
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Métricas básicas
-        content_size = len(response.content)
-        text_size = len(soup.get_text())
-        title = soup.title.string if soup.title else "Sin título"
-        num_tags = len(soup.find_all())
-        
-        # Clasificar velocidad
-        speed_rating = clasificar_velocidad(total_time)
-        
-        # Métricas de rendimiento
-        performance_metrics = calcular_metricas_rendimiento(soup, response)
-        
-        # Métricas de SEO
-        seo_metrics = calcular_metricas_seo(soup)
-        
-        # Métricas de seguridad
-        security_metrics = calcular_metricas_seguridad(response)
-        
-        # Métricas de accesibilidad
-        accessibility_metrics = calcular_metricas_accesibilidad(soup)
-        
-        # Información del servidor
-        server_info = obtener_info_servidor(response)
-        
-        # Contar líneas de código HTML y caracteres (solo en la primera repetición)
-        html_lines = 0
-        html_chars = 0
-        if repeticion == 1:
-            html_content = str(soup)
-            html_lines = len(html_content.split('\n'))
-            html_chars = len(html_content)
-        
-        resultado = {
-            'status': response.status_code,
-            'response_time': round(total_time, 3),
-            'size_bytes': content_size,
-            'char_count': text_size,
-            'title': title,
-            'num_tags': num_tags,
-            'error': None,
-            'speed_rating': speed_rating,
-            'load_time_ms': round(total_time * 1000, 0),
-            'size_kb': round(content_size / 1024, 2),
-            'compression_ratio': performance_metrics['compression_ratio'],
-            'image_count': performance_metrics['image_count'],
-            'script_count': performance_metrics['script_count'],
-            'css_count': performance_metrics['css_count'],
-            'external_resources': performance_metrics['external_resources'],
-            'inline_styles': performance_metrics['inline_styles'],
-            'inline_scripts': performance_metrics['inline_scripts'],
-            'gzip_enabled': performance_metrics['gzip_enabled'],
-            'redirect_count': performance_metrics['redirect_count'],
-            'meta_description': seo_metrics['meta_description'],
-            'meta_keywords': seo_metrics['meta_keywords'],
-            'h1_count': seo_metrics['h1_count'],
-            'h2_count': seo_metrics['h2_count'],
-            'h3_count': seo_metrics['h3_count'],
-            'canonical_url': seo_metrics['canonical_url'],
-            'robots_meta': seo_metrics['robots_meta'],
-            'og_tags': seo_metrics['og_tags'],
-            'twitter_cards': seo_metrics['twitter_cards'],
-            'https_enabled': security_metrics['https_enabled'],
-            'security_headers': security_metrics['security_headers'],
-            'ssl_grade': security_metrics['ssl_grade'],
-            'xss_protection': security_metrics['xss_protection'],
-            'content_security_policy': security_metrics['content_security_policy'],
-            'alt_text_images': accessibility_metrics['alt_text_images'],
-            'form_labels': accessibility_metrics['form_labels'],
-            'aria_labels': accessibility_metrics['aria_labels'],
-            'semantic_html': accessibility_metrics['semantic_html'],
-            'color_contrast_issues': accessibility_metrics['color_contrast_issues'],
-            'server': server_info['server'],
-            'content_type': server_info['content_type'],
-            'cache_headers': server_info['cache_headers'],
-            'last_modified': server_info['last_modified'],
-            'etag': server_info['etag'],
-            'html_lines': html_lines,
-            'html_chars': html_chars
-        }
-        
+        condicionales = cabeceras_condicionales(base)
+        response, info_conexion = descargar(
+            url, modo=modo, timeout=30, headers=condicionales or None, max_bytes=max_bytes
+        )
+        if condicionales and response.status_code == 304:
+            return resultado_revalidado(response, info_conexion, base)
+        resultado = analizar_respuesta(response, info_conexion, repeticion, parser, cache, etapas=etapas)
+        if condicionales:
+            marcar_revalidacion(resultado, base)
         return resultado
         
     except requests.exceptions.Timeout:
-        return {
-            'status': 0,
-            'response_time': 30,
-            'size_bytes': 0,
-            'char_count': 0,
-            'title': "Timeout",
-            'num_tags': 0,
-            'error': 'Timeout - La solicitud tardó más de 30 segundos',
-            'speed_rating': 'MUY LENTO',
-            'load_time_ms': 30000,
-            'size_kb': 0,
-            'compression_ratio': 0,
-            'image_count': 0,
-            'script_count': 0,
-            'css_count': 0,
-            'external_resources': 0,
-            'inline_styles': 0,
-            'inline_scripts': 0,
-            'gzip_enabled': False,
-            'redirect_count': 0,
-            'meta_description': '',
-            'meta_keywords': '',
-            'h1_count': 0,
-            'h2_count': 0,
-            'h3_count': 0,
-            'canonical_url': '',
-            'robots_meta': '',
-            'og_tags': 0,
-            'twitter_cards': 0,
-            'https_enabled': False,
-            'security_headers': 0,
-            'ssl_grade': 'F',
-            'xss_protection': False,
-            'content_security_policy': False,
-            'alt_text_images': 0,
-            'form_labels': 0,
-            'aria_labels': 0,
-            'semantic_html': False,
-            'color_contrast_issues': 0,
-            'server': '',
-            'content_type': '',
-            'cache_headers': 0,
-            'last_modified': '',
-            'etag': '',
-            'html_lines': 0,
-            'html_chars': 0
-        }
+        return resultado_timeout(modo)
         
     except Exception as e:
-        return {
-            'status': 0,
-            'response_time': 0,
-            'size_bytes': 0,
-            'char_count': 0,
-            'title': "Error",
-            'num_tags': 0,
-            'error': str(e),
-            'speed_rating': 'ERROR',
-            'load_time_ms': 0,
-            'size_kb': 0,
-            'compression_ratio': 0,
-            'image_count': 0,
-            'script_count': 0,
-            'css_count': 0,
-            'external_resources': 0,
-            'inline_styles': 0,
-            'inline_scripts': 0,
-            'gzip_enabled': False,
-            'redirect_count': 0,
-            'meta_description': '',
-            'meta_keywords': '',
-            'h1_count': 0,
-            'h2_count': 0,
-            'h3_count': 0,
-            'canonical_url': '',
-            'robots_meta': '',
-            'og_tags': 0,
-            'twitter_cards': 0,
-            'https_enabled': False,
-            'security_headers': 0,
-            'ssl_grade': 'F',
-            'xss_protection': False,
-            'content_security_policy': False,
-            'alt_text_images': 0,
-            'form_labels': 0,
-            'aria_labels': 0,
-            'semantic_html': False,
-            'color_contrast_issues': 0,
-            'server': '',
-            'content_type': '',
-            'cache_headers': 0,
-            'last_modified': '',
-            'etag': '',
-            'html_lines': 0,
-            'html_chars': 0
-        }
+        return resultado_error(str(e), modo)
 
-def calcular_metricas_rendimiento(soup, response):
-    """Calcula métricas relacionadas con el rendimiento del sitio"""
+def analizar_respuesta(response, info_conexion, repeticion=1, parser=None, cache=None, con_recursos=False,
+                       etapas=False, con_enlaces=False):
+    """
+    Calcula todas las métricas de una respuesta ya descargada (un Response o una
+    RespuestaParseo). Es la parte de CPU del análisis y puede ejecutarse en otro
+    proceso que el de la descarga.
+    Con con_recursos el resultado trae además en 'subresources' los (tipo, src,
+    bloqueante) de las imágenes, scripts y hojas de estilo del HTML, y con
+    con_enlaces trae en 'links' los enlaces que se pueden seguir, ya absolutos
+    y canónicos (ver crawler.enlaces_de_pagina).
+    Con etapas agrega stage_timings_ms: ms de la descarga (fetch, que incluye el
+    conteo de líneas) y de cada paso del análisis.
+    """
+    total_time = info_conexion['total_time']
+    cronometro = crear_cronometro(etapas)
+    cronometro.agregar('fetch', total_time * 1000)
     
-    # Contar recursos
-    images = soup.find_all('img')
-    scripts = soup.find_all('script')
-    css_links = soup.find_all('link', rel='stylesheet')
+    # Métricas que solo dependen del HTML (desde la cache si el cuerpo no cambió)
+    estaticas = obtener_metricas_estaticas(response.content, parser, cache, cronometro)
+    metricas_dom = estaticas['dom']
     
-    # Contar recursos externos
-    external_resources = 0
-    for img in images:
-        if img.get('src') and (img['src'].startswith('http') or img['src'].startswith('//')):
-            external_resources += 1
+    # Métricas básicas
+    content_size = len(response.content)
+    text_size = metricas_dom['text_size']
+    title = metricas_dom['title']
+    num_tags = metricas_dom['num_tags']
     
-    for script in scripts:
-        if script.get('src') and (script['src'].startswith('http') or script['src'].startswith('//')):
-            external_resources += 1
+    # Clasificar velocidad
+    speed_rating = clasificar_velocidad(total_time)
     
-    # Contar estilos y scripts inline
-    inline_styles = len(soup.find_all('style'))
-    inline_scripts = len([s for s in scripts if not s.get('src')])
+    # Métricas de rendimiento
+    with cronometro.etapa('performance_metrics'):
+        performance_metrics = calcular_metricas_rendimiento(None, response, metricas_dom)
+    
+    # Métricas de SEO
+    with cronometro.etapa('seo_metrics'):
+        seo_metrics = calcular_metricas_seo(None, metricas_dom)
+    
+    # Métricas de seguridad
+    with cronometro.etapa('security_metrics'):
+        security_metrics = calcular_metricas_seguridad(response)
+    
+    # Métricas de accesibilidad
+    with cronometro.etapa('accessibility_metrics'):
+        accessibility_metrics = calcular_metricas_accesibilidad(None, metricas_dom)
+    
+    # Información del servidor
+    with cronometro.etapa('server_info'):
+        server_info = obtener_info_servidor(response)
+    
+    # Líneas de código HTML y caracteres (solo en la primera repetición), contados
+    # durante la descarga en lugar de volver a serializar el documento
+    html_lines = info_conexion['body_lines'] if repeticion == 1 else 0
+    html_chars = info_conexion['body_chars'] if repeticion == 1 else 0
+    
+    resultado = {
+        'status': response.status_code,
+        'response_time': round(total_time, 3),
+        'size_bytes': content_size,
+        'char_count': text_size,
+        'title': title,
+        'num_tags': num_tags,
+        'error': None,
+        'speed_rating': speed_rating,
+        'load_time_ms': round(total_time * 1000, 0),
+        'size_kb': round(content_size / 1024, 2),
+        'compression_ratio': performance_metrics['compression_ratio'],
+        'image_count': performance_metrics['image_count'],
+        'script_count': performance_metrics['script_count'],
+        'css_count': performance_metrics['css_count'],
+        'external_resources': performance_metrics['external_resources'],
+        'inline_styles': performance_metrics['inline_styles'],
+        'inline_scripts': performance_metrics['inline_scripts'],
+        'gzip_enabled': performance_metrics['gzip_enabled'],
+        'redirect_count': performance_metrics['redirect_count'],
+        'meta_description': seo_metrics['meta_description'],
+        'meta_keywords': seo_metrics['meta_keywords'],
+        'h1_count': seo_metrics['h1_count'],
+        'h2_count': seo_metrics['h2_count'],
+        'h3_count': seo_metrics['h3_count'],
+        'canonical_url': seo_metrics['canonical_url'],
+        'robots_meta': seo_metrics['robots_meta'],
+        'og_tags': seo_metrics['og_tags'],
+        'twitter_cards': seo_metrics['twitter_cards'],
+        'https_enabled': security_metrics['https_enabled'],
+        'security_headers': security_metrics['security_headers'],
+        'ssl_grade': security_metrics['ssl_grade'],
+        'xss_protection': security_metrics['xss_protection'],
+        'content_security_policy': security_metrics['content_security_policy'],
+        'alt_text_images': accessibility_metrics['alt_text_images'],
+        'form_labels': accessibility_metrics['form_labels'],
+        'aria_labels': accessibility_metrics['aria_labels'],
+        'semantic_html': accessibility_metrics['semantic_html'],
+        'color_contrast_issues': accessibility_metrics['color_contrast_issues'],
+        'server': server_info['server'],
+        'content_type': server_info['content_type'],
+        'cache_headers': server_info['cache_headers'],
+        'last_modified': server_info['last_modified'],
+        'etag': server_info['etag'],
+        'html_lines': html_lines,
+        'html_chars': html_chars,
+        'mode': info_conexion['mode'],
+        'connection_reused': info_conexion['connection_reused'],
+        'dns_ms': info_conexion['dns_ms'],
+        'connect_ms': info_conexion['connect_ms'],
+        'tls_ms': info_conexion['tls_ms'],
+        'ttfb_ms': info_conexion['ttfb_ms'],
+        'download_ms': info_conexion['download_ms'],
+        'ttlb_ms': info_conexion['ttlb_ms'],
+        'bytes_per_second': info_conexion['bytes_per_second'],
+        'truncated': info_conexion['truncated'],
+        'content_hash': estaticas['content_hash'],
+        'cache_hit': estaticas['cache_hit'],
+        'revalidated': False,
+        'not_modified': False,
+        'revalidation_source': None,
+        'revalidation_saved_ms': None,
+        'revalidation_saved_kb': None
+    }
+    if con_recursos:
+        resultado['subresources'] = metricas_dom.get('recursos', [])
+    if con_enlaces:
+        resultado['links'] = enlaces_de_pagina(response.url, metricas_dom, response.headers)
+    if cronometro.etapas is not None:
+        resultado['stage_timings_ms'] = cronometro.etapas
+    
+    return resultado
+
+def cabeceras_condicionales(base):
+    """If-None-Match / If-Modified-Since a partir de un resultado previo (vacío si no hay validadores)"""
+    if not base or base.get('status') != 200:
+        return {}
+    cabeceras = {}
+    if base.get('etag'):
+        cabeceras['If-None-Match'] = base['etag']
+    if base.get('last_modified'):
+        cabeceras['If-Modified-Since'] = base['last_modified']
+    return cabeceras
+
+def origen_revalidacion(headers):
+    """'cdn' si los headers indican que respondió una cache intermedia, si no 'origin'"""
+    for header in HEADERS_CACHE_CDN:
+        valor = headers.get(header, '').upper()
+        if 'HIT' in valor or 'REVALIDATED' in valor:
+            return 'cdn'
+    try:
+        if int(headers.get('Age', 0)) > 0:
+            return 'cdn'
+    except ValueError:
+        pass
+    return 'origin'
+
+def marcar_revalidacion(resultado, base):
+    """Marca un resultado como solicitud condicional y registra cuánto ahorró respecto de base"""
+    resultado['revalidated'] = True
+    resultado['not_modified'] = resultado['status'] == 304
+    resultado['revalidation_saved_ms'] = round(base['load_time_ms'] - resultado['load_time_ms'], 0)
+    resultado['revalidation_saved_kb'] = round(base['size_kb'] - resultado['size_kb'], 2)
+    return resultado
+
+def resultado_revalidado(response, info_conexion, base):
+    """
+    Resultado de una revalidación respondida con 304: no hay cuerpo que parsear,
+    así que las métricas del HTML (y las de headers que un 304 puede omitir) se
+    copian de base y solo se reemplazan las de la descarga.
+    """
+    total_time = info_conexion['total_time']
+    content_size = len(response.content)
+    
+    resultado = dict(base)
+    resultado.update({
+        'status': response.status_code,
+        'response_time': round(total_time, 3),
+        'size_bytes': content_size,
+        'speed_rating': clasificar_velocidad(total_time),
+        'load_time_ms': round(total_time * 1000, 0),
+        'size_kb': round(content_size / 1024, 2),
+        'redirect_count': len(response.history),
+        'mode': info_conexion['mode'],
+        'connection_reused': info_conexion['connection_reused'],
+        'dns_ms': info_conexion['dns_ms'],
+        'connect_ms': info_conexion['connect_ms'],
+        'tls_ms': info_conexion['tls_ms'],
+        'ttfb_ms': info_conexion['ttfb_ms'],
+        'download_ms': info_conexion['download_ms'],
+        'ttlb_ms': info_conexion['ttlb_ms'],
+        'bytes_per_second': info_conexion['bytes_per_second'],
+        'truncated': info_conexion['truncated'],
+        # cache_hit es solo de la cache de métricas; el 304 queda en not_modified
+        'cache_hit': False,
+        'revalidation_source': origen_revalidacion(response.headers)
+    })
+    return marcar_revalidacion(resultado, base)
+
+def resultado_timeout(modo=MODO_DEFAULT):
+    """Resultado de una solicitud que superó el timeout"""
+    return _resultado_fallido(
+        modo,
+        response_time=30,
+        title="Timeout",
+        error='Timeout - La solicitud tardó más de 30 segundos',
+        speed_rating='MUY LENTO',
+        load_time_ms=30000
+    )
+
+def resultado_error(error, modo=MODO_DEFAULT):
+    """Resultado de una solicitud que falló"""
+    return _resultado_fallido(modo, error=error)
+
+def _resultado_fallido(modo, **campos):
+    """Resultado con todas las métricas vacías, sobrescribiendo los campos indicados"""
+    resultado = {
+        'status': 0,
+        'response_time': 0,
+        'size_bytes': 0,
+        'char_count': 0,
+        'title': "Error",
+        'num_tags': 0,
+        'error': None,
+        'speed_rating': 'ERROR',
+        'load_time_ms': 0,
+        'size_kb': 0,
+        'compression_ratio': 0,
+        'image_count': 0,
+        'script_count': 0,
+        'css_count': 0,
+        'external_resources': 0,
+        'inline_styles': 0,
+        'inline_scripts': 0,
+        'gzip_enabled': False,
+        'redirect_count': 0,
+        'meta_description': '',
+        'meta_keywords': '',
+        'h1_count': 0,
+        'h2_count': 0,
+        'h3_count': 0,
+        'canonical_url': '',
+        'robots_meta': '',
+        'og_tags': 0,
+        'twitter_cards': 0,
+        'https_enabled': False,
+        'security_headers': 0,
+        'ssl_grade': 'F',
+        'xss_protection': False,
+        'content_security_policy': False,
+        'alt_text_images': 0,
+        'form_labels': 0,
+        'aria_labels': 0,
+        'semantic_html': False,
+        'color_contrast_issues': 0,
+        'server': '',
+        'content_type': '',
+        'cache_headers': 0,
+        'last_modified': '',
+        'etag': '',
+        'html_lines': 0,
+        'html_chars': 0,
+        'mode': modo,
+        'connection_reused': False,
+        'dns_ms': None,
+        'connect_ms': None,
+        'tls_ms': None,
+        'ttfb_ms': None,
+        'download_ms': None,
+        'ttlb_ms': None,
+        'bytes_per_second': 0,
+        'truncated': False,
+        'content_hash': None,
+        'cache_hit': False,
+        'revalidated': False,
+        'not_modified': False,
+        'revalidation_source': None,
+        'revalidation_saved_ms': None,
+        'revalidation_saved_kb': None
+    }
+    resultado.update(campos)
+    return resultado
+
+def obtener_metricas_estaticas(contenido, parser=None, cache=None, cronometro=None):
+    """
+    Retorna las métricas que dependen solo del cuerpo HTML. Con cache, un cuerpo
+    ya visto (mismo hash y parser) no se vuelve a parsear. cronometro (ver
+    profiling.Cronometro) registra las etapas hash, cache, parse y extract.
+    """
+    cronometro = cronometro or crear_cronometro(False)
+    with cronometro.etapa('hash'):
+        content_hash = hash_contenido(contenido)
+    clave = f"{elegir_parser(parser)}:{content_hash}"
+    
+    if cache is not None:
+        with cronometro.etapa('cache'):
+            guardado = cache.obtener(clave)
+        if guardado is not None:
+            return dict(guardado, content_hash=content_hash, cache_hit=True)
+    
+    with cronometro.etapa('parse'):
+        soup = parsear_html(contenido, parser)
+    with cronometro.etapa('extract'):
+        estaticas = {'dom': extraer_metricas(soup)}
+    
+    if cache is not None:
+        cache.guardar(clave, estaticas)
+    return dict(estaticas, content_hash=content_hash, cache_hit=False)
+
+def calcular_metricas_rendimiento(soup, response, metricas_dom=None):
+    """Calcula métricas relacionadas con el rendimiento del sitio"""
+    
+    if metricas_dom is None:
+        metricas_dom = extraer_metricas(soup)
     
     # Calcular ratio de compresión (estimado)
-    text_size = len(soup.get_text())
+    text_size = metricas_dom['text_size']
     compression_ratio = round((text_size / len(response.content)) * 100, 2) if len(response.content) > 0 else 0
     
     return {
         'compression_ratio': compression_ratio,
-        'image_count': len(images),
-        'script_count': len(scripts),
-        'css_count': len(css_links),
-        'external_resources': external_resources,
-        'inline_styles': inline_styles,
-        'inline_scripts': inline_scripts,
+        'image_count': metricas_dom['image_count'],
+        'script_count': metricas_dom['script_count'],
+        'css_count': metricas_dom['css_count'],
+        'external_resources': metricas_dom['external_resources'],
+        'inline_styles': metricas_dom['inline_styles'],
+        'inline_scripts': metricas_dom['inline_scripts'],
         'gzip_enabled': 'gzip' in response.headers.get('Content-Encoding', '').lower(),
         'redirect_count': len(response.history)
     }
 
-def calcular_metricas_seo(soup):
+def calcular_metricas_seo(soup, metricas_dom=None):
     """Calcula métricas relacionadas con SEO"""
     
-    # Meta tags
-    meta_description = soup.find('meta', attrs={'name': 'description'})
-    meta_keywords = soup.find('meta', attrs={'name': 'keywords'})
-    canonical = soup.find('link', attrs={'rel': 'canonical'})
-    robots = soup.find('meta', attrs={'name': 'robots'})
-    
-    # Open Graph tags
-    og_tags = len(soup.find_all('meta', attrs={'property': re.compile(r'^og:')}))
-    
-    # Twitter Card tags
-    twitter_cards = len(soup.find_all('meta', attrs={'name': re.compile(r'^twitter:')}))
-    
-    # Headings
-    h1_count = len(soup.find_all('h1'))
-    h2_count = len(soup.find_all('h2'))
-    h3_count = len(soup.find_all('h3'))
+    if metricas_dom is None:
+        metricas_dom = extraer_metricas(soup)
     
     return {
-        'meta_description': meta_description.get('content') if meta_description else None,
-        'meta_keywords': meta_keywords.get('content') if meta_keywords else None,
-        'canonical_url': canonical.get('href') if canonical else None,
-        'robots_meta': robots.get('content') if robots else None,
-        'og_tags': og_tags,
-        'twitter_cards': twitter_cards,
-        'h1_count': h1_count,
-        'h2_count': h2_count,
-        'h3_count': h3_count
+        'meta_description': metricas_dom['meta_description'],
+        'meta_keywords': metricas_dom['meta_keywords'],
+        'canonical_url': metricas_dom['canonical_url'],
+        'robots_meta': metricas_dom['robots_meta'],
+        'og_tags': metricas_dom['og_tags'],
+        'twitter_cards': metricas_dom['twitter_cards'],
+        'h1_count': metricas_dom['h1_count'],
+        'h2_count': metricas_dom['h2_count'],
+        'h3_count': metricas_dom['h3_count']
     }
 
 def calcular_metricas_seguridad(response):
@@ -305,33 +437,23 @@ def calcular_metricas_seguridad(response):
         'content_security_policy': headers.get('Content-Security-Policy') is not None
     }
 
-def calcular_metricas_accesibilidad(soup):
+def calcular_metricas_accesibilidad(soup, metricas_dom=None):
     """Calcula métricas relacionadas con la accesibilidad"""
     
-    # Imágenes con alt text
-    images = soup.find_all('img')
-    images_with_alt = len([img for img in images if img.get('alt')])
-    alt_text_ratio = round((images_with_alt / len(images)) * 100, 1) if images else 0
-    
-    # Formularios con labels
-    forms = soup.find_all('form')
-    form_labels = len(soup.find_all('label'))
+    if metricas_dom is None:
+        metricas_dom = extraer_metricas(soup)
     
-    # ARIA labels
-    aria_labels = len(soup.find_all(attrs={'aria-label': True}))
-    
-    # HTML semántico
-    semantic_elements = len(soup.find_all(['nav', 'main', 'article', 'section', 'aside', 'header', 'footer']))
-    
-    # Problemas de contraste (simplificado - solo verificar si hay colores inline)
-    inline_colors = len(soup.find_all(style=re.compile(r'color:')))
+    # Imágenes con alt text
+    total_images = metricas_dom['image_count']
+    images_with_alt = metricas_dom['images_with_alt']
+    alt_text_ratio = round((images_with_alt / total_images) * 100, 1) if total_images else 0
     
     return {
-        'alt_text_images': f"{images_with_alt}/{len(images)} ({alt_text_ratio}%)",
-        'form_labels': form_labels,
-        'aria_labels': aria_labels,
-        'semantic_html': semantic_elements,
-        'color_contrast_issues': inline_colors
+        'alt_text_images': f"{images_with_alt}/{total_images} ({alt_text_ratio}%)",
+        'form_labels': metricas_dom['form_labels'],
+        'aria_labels': metricas_dom['aria_labels'],
+        'semantic_html': metricas_dom['semantic_html'],
+        'color_contrast_issues': metricas_dom['color_contrast_issues']
     }
 
 def clasificar_velocidad(load_time):
@@ -1,41 +1,238 @@
-from flask import Flask, render_template, request, jsonify
-from analyzer import analizar_url
-import uuid
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
+from async_engine import MAX_EN_VUELO_DEFAULT
+from worker_pool import obtener_pool
+from fetcher import MODOS_VALIDOS, MODO_DEFAULT, FASES
+from extractor import PARSERS_VALIDOS
+from cache import MAX_ENTRADAS_DEFAULT
+from scheduler import ESTRATEGIAS_VALIDAS, ESTRATEGIA_DEFAULT
+from distributed import ejecutar_distribuido, obtener_cola
+from subresources import METODOS_VALIDOS, METODO_DEFAULT, TIPOS_RECURSO
+from compression import MAX_NIVEL
+from profiling import ETAPAS_DEFAULT, PerfilTarea
+from load_test import MAX_FILAS_CARGA, ProgramaCarga, SerieCarga
+from history_store import (
+    DIAS_BASE_DEFAULT, GRANULARIDADES, HISTORIAL_ACTIVO, MAX_DIAS_BASE, PERCENTIL_DEFAULT, PERCENTILES_HISTORIAL,
+    UMBRAL_REGRESION_DEFAULT, leer_fecha, obtener_historial
+)
+from crawler import (
+    FronteraRastreo, MAX_FRONTERA_DEFAULT, MAX_PAGINAS, MAX_PAGINAS_DEFAULT, MAX_PROFUNDIDAD, PROFUNDIDAD_DEFAULT,
+    RETRASO_HOST_MS_DEFAULT, canonicalizar_url
+)
+from metrics import REGISTRO, CAPACIDAD, EN_VUELO, TAREA_SEGUNDOS, TAREAS, UTILIZACION
+from task_store import crear_almacen, nueva_tarea, registrar_latencia
+from latency_sketch import LatenciasPorUrl, HistogramaLatencias
+from columnar import MAGIA, generar_columnar, leer_resultados_columnar
+from result_stats import (
+    AcumuladorValores, MuestraSerie, StreamConPrefijo, leer_resultados_json, leer_resultados_ndjson
+)
+import asyncio
 import threading
+import time
+import uuid
 import os
 import json
 
 app = Flask(__name__)
-tasks = {}  # {"task_id": {"status": "processing", "progress": 0-100, "result": {}}
+# {"task_id": {"status": "processing", "progress": 0-100, "tabla": TablaResultados, "latencias": ...}}
+# Solo las tareas activas y las terminadas recientes quedan en memoria; el resto vive en SQLite
+tasks = crear_almacen()
+
+# Máximo de resultados nuevos que devuelve cada consulta de progreso
+MAX_NUEVOS_POR_CONSULTA = 200
+
+# Segundos entre comentarios de keep-alive en /stream si no hay novedades
+LATIDO_SSE = 15
 
+# Despierta a los streams SSE cuando una tarea registra un resultado o cambia de estado
+cambios = threading.Condition()
 
-def ejecutar_analisis(task_id, payload):
-    total = sum(url['repeticiones'] for url in payload['urls'])
+
+def notificar_cambios():
+    with cambios:
+        cambios.notify_all()
+
+
+async def ejecutar_analisis(task_id, payload, pool, historial=HISTORIAL_ACTIVO):
+    """
+    Ejecuta una tarea en el loop del pool. Con historial, al terminar bien se
+    agrega al historial de resultados; los que corren tareas sintéticas o
+    internas (benchmarks) pasan historial=False para no mezclar sus URLs con
+    las líneas base.
+    """
+    task = tasks[task_id]
+    carga = payload.get('carga')
+    rastreo = payload.get('rastreo')
+    total = task['total']
     completados = 0
-    resultados = {}
-
-    with ProcessPoolExecutor() as executor:
-        future_map = {}
-        for item in payload['urls']:
-            url = item['url']
-            repeticiones = item['repeticiones']
-            for _ in range(repeticiones):
-                future = executor.submit(analizar_url, url, 1)
-                future_map[future] = url
-
-        for future in as_completed(future_map):
-            url = future_map[future]
-            resultado = future.result()  # Ahora retorna un solo resultado, no una lista
-            if url not in resultados:
-                resultados[url] = []
-            resultados[url].append(resultado)
-            completados += 1
-            tasks[task_id]['progress'] = int((completados / total) * 100)
-
-    tasks[task_id]['status'] = 'done'
-    tasks[task_id]['result'] = resultados
+    modo = payload.get('mode', MODO_DEFAULT)
+    parser = payload.get('parser')
+    revalidar = payload.get('revalidar', False)
+    max_bytes = payload['max_cuerpo_kb'] * 1024 if payload.get('max_cuerpo_kb') else None
+    etapas = payload.get('etapas', ETAPAS_DEFAULT)
+    perfil = PerfilTarea() if payload.get('perfilar') else None
+
+    trabajos = []
+    # En una prueba de carga los envíos salen del programa de carga y en un
+    # rastreo de la frontera, no de las repeticiones
+    for item in payload['urls'] if not (carga or rastreo) else []:
+        for indice in range(item['repeticiones']):
+            trabajos.append({
+                'url': item['url'],
+                'mode': item.get('mode', modo),
+                'parser': parser,
+                'repeticion': 1,
+                'indice': indice,
+                'revalidar': item.get('revalidar', revalidar),
+                'max_bytes': max_bytes,
+                'etapas': etapas
+            })
+
+    def al_completar(trabajo, resultado):
+        nonlocal completados
+        url = trabajo['url']
+        # Tabla columnar en orden de llegada (también sirve al progreso incremental).
+        # En una prueba de carga solo se guardan las primeras MAX_FILAS_CARGA filas:
+        # el resto queda en la serie por segundo y en los sketches
+        if 'carga' not in task or len(task['tabla']) < MAX_FILAS_CARGA:
+            task['tabla'].agregar(url, resultado)
+        registrar_latencia(task, url, resultado)
+        if 'carga' in task:
+            task['carga'].registrar(resultado)
+        completados += 1
+        task['progress'] = int((completados / total) * 100)
+        task['completados'] = completados
+        if cache is not None:
+            task['cache'] = cache.estadisticas()
+        if frontera is not None:
+            task['rastreo'] = frontera.estadisticas()
+        notificar_cambios()
+
+    task['status'] = 'processing'
+    inicio = time.monotonic()
+    notificar_cambios()
+
+    # Cache de métricas por hash del HTML compartida por todos los procesos de parseo
+    # (las pruebas de carga no parsean)
+    cache = None if carga else pool.nueva_cache(payload.get('cache_max_entradas', MAX_ENTRADAS_DEFAULT))
+    frontera = nueva_frontera(payload) if rastreo else None
+    try:
+        if rastreo:
+            await pool.motor.ejecutar_rastreo(
+                frontera,
+                {
+                    'mode': modo,
+                    'parser': parser,
+                    'repeticion': 1,
+                    'indice': 0,
+                    'max_bytes': max_bytes,
+                    'etapas': etapas
+                },
+                al_completar,
+                sitemaps=rastreo.get('sitemaps', []),
+                grupo=task_id,
+                prioridad=payload.get('prioridad', 0),
+                max_en_vuelo=payload.get('concurrencia', MAX_EN_VUELO_DEFAULT),
+                programacion=payload.get('programacion'),
+                cache=cache,
+                subrecursos=opciones_subrecursos(payload.get('subrecursos')),
+                compresion=opciones_compresion(payload.get('compresion')),
+                perfil=perfil
+            )
+            # El total era el máximo de páginas: al terminar pasa a ser lo que se rastreó
+            task['total'] = completados
+            task['progress'] = 100
+            task['rastreo'] = frontera.estadisticas()
+        elif carga:
+            await pool.motor.ejecutar_carga(
+                [item['url'] for item in payload['urls']],
+                ProgramaCarga(**carga),
+                al_completar,
+                grupo=task_id,
+                prioridad=payload.get('prioridad', 0),
+                max_en_vuelo=payload.get('concurrencia', MAX_EN_VUELO_DEFAULT),
+                modo=modo,
+                max_bytes=max_bytes
+            )
+        elif payload.get('distribuido'):
+            # Esta tarea solo coordina: los trabajos los ejecutan los workers remotos
+            await ejecutar_distribuido(obtener_cola(), task_id, trabajos, al_completar, {
+                'programacion': payload.get('programacion'),
+                'subrecursos': opciones_subrecursos(payload.get('subrecursos')),
+                'compresion': opciones_compresion(payload.get('compresion'))
+            })
+        else:
+            await pool.motor.ejecutar(
+                trabajos,
+                al_completar,
+                grupo=task_id,
+                prioridad=payload.get('prioridad', 0),
+                max_en_vuelo=payload.get('concurrencia', MAX_EN_VUELO_DEFAULT),
+                programacion=payload.get('programacion'),
+                cache=cache,
+                subrecursos=opciones_subrecursos(payload.get('subrecursos')),
+                compresion=opciones_compresion(payload.get('compresion')),
+                perfil=perfil
+            )
+    except asyncio.CancelledError:
+        # Se conservan los resultados que alcanzaron a terminar
+        task['status'] = 'cancelled'
+        if frontera is not None:
+            task['rastreo'] = frontera.estadisticas()
+        terminar_tarea(task_id, task, inicio, perfil)
+        raise
+
+    task['status'] = 'done'
+    terminar_tarea(task_id, task, inicio, perfil)
+    # Las pruebas de carga no entran al historial: su latencia incluye la espera del generador
+    if historial and not carga:
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: obtener_historial().agregar(
+                task_id, task['tabla'].filas(), tipo='rastreo' if rastreo else 'analisis'
+            )
+        )
+
+
+def terminar_tarea(task_id, task, inicio, perfil):
+    """Registra la duración y el perfil de la tarea, la persiste y avisa a los streams"""
+    TAREA_SEGUNDOS.observar(time.monotonic() - inicio, status=task['status'])
+    if perfil is not None:
+        task['perfil'] = perfil.reporte()
+    tasks.terminar(task_id)
+    notificar_cambios()
+
 
+def nueva_frontera(payload):
+    """
+    Frontera de un rastreo con las URLs del payload como semillas. Los hosts
+    de las semillas y de los sitemaps son los del sitio: solo se siguen sus enlaces.
+    """
+    rastreo = payload['rastreo']
+    frontera = FronteraRastreo(
+        max_profundidad=rastreo.get('profundidad', PROFUNDIDAD_DEFAULT),
+        max_paginas=rastreo.get('max_paginas', MAX_PAGINAS_DEFAULT),
+        max_frontera=rastreo.get('max_frontera', MAX_FRONTERA_DEFAULT),
+        retraso_ms=rastreo.get('retraso_ms', RETRASO_HOST_MS_DEFAULT)
+    )
+    semillas = [item['url'] for item in payload.get('urls', [])]
+    for url in semillas + rastreo.get('sitemaps', []):
+        frontera.agregar_host(url)
+    for url in semillas:
+        frontera.agregar_semilla(url)
+    return frontera
+
+
+def opciones_subrecursos(subrecursos):
+    """Opciones de CacheRecursos a partir del campo subrecursos del payload (None si está desactivado)"""
+    if not subrecursos:
+        return None
+    return {} if subrecursos is True else subrecursos
+
+
+def opciones_compresion(compresion):
+    """Opciones de MedidorCompresion a partir del campo compresion del payload (None si está desactivado)"""
+    if not compresion:
+        return None
+    return {} if compresion is True else compresion
 
 @app.route('/')
 def index():
@@ -44,20 +241,493 @@ def index():
 @app.route('/analizar-inicio', methods=['POST'])
 def analizar_inicio():
     data = request.get_json()
+
+    # Validar modo de medición (global y por URL)
+    modos = [data.get('mode', MODO_DEFAULT)] + [item.get('mode', MODO_DEFAULT) for item in data.get('urls', [])]
+    if any(modo not in MODOS_VALIDOS for modo in modos):
+        return jsonify({'error': f"Modo no válido, usar uno de: {', '.join(MODOS_VALIDOS)}"}), 400
+    concurrencia = data.get('concurrencia', MAX_EN_VUELO_DEFAULT)
+    if not isinstance(concurrencia, int) or concurrencia < 1:
+        return jsonify({'error': 'La concurrencia debe ser un entero mayor que 0'}), 400
+    programacion = data.get('programacion') or {}
+    if programacion.get('estrategia', ESTRATEGIA_DEFAULT) not in ESTRATEGIAS_VALIDAS:
+        return jsonify({'error': f"Estrategia no válida, usar una de: {', '.join(ESTRATEGIAS_VALIDAS)}"}), 400
+    if set(programacion) - {'estrategia', 'intervalo_ms', 'max_por_host'}:
+        return jsonify({'error': 'Opciones de programación no válidas'}), 400
+    if data.get('parser') is not None and data['parser'] not in PARSERS_VALIDOS:
+        return jsonify({'error': f"Parser no válido, usar uno de: {', '.join(PARSERS_VALIDOS)}"}), 400
+    if not isinstance(data.get('prioridad', 0), int):
+        return jsonify({'error': 'La prioridad debe ser un entero'}), 400
+    revalidaciones = [data.get('revalidar', False)] + [item.get('revalidar', False) for item in data.get('urls', [])]
+    if any(not isinstance(revalidar, bool) for revalidar in revalidaciones):
+        return jsonify({'error': 'revalidar debe ser true o false'}), 400
+    max_cuerpo_kb = data.get('max_cuerpo_kb')
+    if max_cuerpo_kb is not None and (not isinstance(max_cuerpo_kb, int) or max_cuerpo_kb < 1):
+        return jsonify({'error': 'max_cuerpo_kb debe ser un entero mayor que 0'}), 400
+    if any(not isinstance(data.get(campo, False), bool) for campo in ('distribuido', 'etapas', 'perfilar')):
+        return jsonify({'error': 'distribuido, etapas y perfilar deben ser true o false'}), 400
+    if data.get('perfilar') and data.get('distribuido'):
+        return jsonify({'error': 'perfilar no está disponible en modo distribuido'}), 400
+    if data.get('distribuido'):
+        # Publica la cola ahora: sin clave el coordinador no arranca
+        try:
+            obtener_cola()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 500
+    programa = None
+    if data.get('carga') is not None:
+        carga = data['carga']
+        if not isinstance(carga, dict) or set(carga) - {'rps', 'duracion_s', 'rampa', 'rampa_s', 'escalones'}:
+            return jsonify({'error': 'Opciones de carga no válidas'}), 400
+        if data.get('distribuido') or data.get('perfilar'):
+            return jsonify({'error': 'La prueba de carga no admite distribuido ni perfilar'}), 400
+        if any(not isinstance(carga.get(campo, 0), (int, float)) for campo in ('rps', 'duracion_s', 'rampa_s')):
+            return jsonify({'error': 'rps, duracion_s y rampa_s deben ser números'}), 400
+        try:
+            programa = ProgramaCarga(**carga)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+    rastreo = data.get('rastreo')
+    if rastreo is not None:
+        if not isinstance(rastreo, dict) or set(rastreo) - {
+            'sitemaps', 'profundidad', 'max_paginas', 'max_frontera', 'retraso_ms'
+        }:
+            return jsonify({'error': 'Opciones de rastreo no válidas'}), 400
+        if data.get('distribuido') or programa is not None:
+            return jsonify({'error': 'El rastreo no admite distribuido ni carga'}), 400
+        sitemaps = rastreo.get('sitemaps', [])
+        if not isinstance(sitemaps, list) or any(
+            not isinstance(url, str) or canonicalizar_url('/', url) is None for url in sitemaps
+        ):
+            return jsonify({'error': 'sitemaps debe ser una lista de URLs http(s)'}), 400
+        if any(canonicalizar_url(item['url']) is None for item in data.get('urls', [])):
+            return jsonify({'error': 'Las semillas del rastreo deben ser páginas http(s)'}), 400
+        if not data.get('urls') and not sitemaps:
+            return jsonify({'error': 'El rastreo necesita URLs semilla o sitemaps'}), 400
+        limites = {
+            'profundidad': (0, MAX_PROFUNDIDAD),
+            'max_paginas': (1, MAX_PAGINAS),
+            'max_frontera': (1, MAX_PAGINAS),
+            'retraso_ms': (0, 60000)
+        }
+        for campo, (minimo, maximo) in limites.items():
+            valor = rastreo.get(campo, minimo)
+            if not isinstance(valor, int) or not minimo <= valor <= maximo:
+                return jsonify({'error': f"{campo} debe ser un entero entre {minimo} y {maximo}"}), 400
+    subrecursos = opciones_subrecursos(data.get('subrecursos'))
+    if subrecursos is not None:
+        if not isinstance(subrecursos, dict) or set(subrecursos) - {'metodo', 'max_por_pagina', 'concurrencia'}:
+            return jsonify({'error': 'Opciones de subrecursos no válidas'}), 400
+        if subrecursos.get('metodo', METODO_DEFAULT) not in METODOS_VALIDOS:
+            return jsonify({'error': f"Método no válido, usar uno de: {', '.join(METODOS_VALIDOS)}"}), 400
+        if any(not isinstance(subrecursos.get(campo, 1), int) or subrecursos.get(campo, 1) < 1
+               for campo in ('max_por_pagina', 'concurrencia')):
+            return jsonify({'error': 'max_por_pagina y concurrencia deben ser enteros mayores que 0'}), 400
+    compresion = opciones_compresion(data.get('compresion'))
+    if compresion is not None:
+        if not isinstance(compresion, dict) or set(compresion) - {'niveles_gzip', 'niveles_brotli', 'concurrencia'}:
+            return jsonify({'error': 'Opciones de compresión no válidas'}), 400
+        for campo, codificacion in (('niveles_gzip', 'gzip'), ('niveles_brotli', 'br')):
+            niveles = compresion.get(campo, [])
+            if not isinstance(niveles, list) or any(
+                not isinstance(nivel, int) or not 0 <= nivel <= MAX_NIVEL[codificacion] for nivel in niveles
+            ):
+                maximo = MAX_NIVEL[codificacion]
+                return jsonify({'error': f"{campo} debe ser una lista de enteros entre 0 y {maximo}"}), 400
+        if not isinstance(compresion.get('concurrencia', 1), int) or compresion.get('concurrencia', 1) < 1:
+            return jsonify({'error': 'concurrencia debe ser un entero mayor que 0'}), 400
+
     task_id = str(uuid.uuid4())
-    tasks[task_id] = {'status': 'processing', 'progress': 0, 'result': {}}
+    if programa is not None:
+        # En una prueba de carga las URLs se rotan y repeticiones no se usa
+        tasks[task_id] = nueva_tarea(len(programa))
+        tasks[task_id]['carga'] = SerieCarga.para(programa)
+    elif rastreo is not None:
+        # El total real se conoce al terminar; mientras tanto es el máximo de páginas
+        tasks[task_id] = nueva_tarea(rastreo.get('max_paginas', MAX_PAGINAS_DEFAULT))
+    else:
+        tasks[task_id] = nueva_tarea(sum(item['repeticiones'] for item in data['urls']))
 
-    thread = threading.Thread(target=ejecutar_analisis, args=(task_id, data))
-    thread.start()
+    pool = obtener_pool()
+    pool.enviar(task_id, lambda pool: ejecutar_analisis(task_id, data, pool), data.get('prioridad', 0))
 
     return jsonify({'task_id': task_id})
 
 @app.route('/progreso/<task_id>')
 def progreso(task_id):
+    """
+    Estado y contadores de la tarea más los resultados nuevos desde ?cursor=N.
+    El resultado completo se pide una sola vez a /resultados/<task_id>.
+    """
+    task = tasks.get(task_id)
+    if not task:
+        return jsonify({'error': 'ID no válido'}), 404
+
+    try:
+        cursor = max(int(request.args.get('cursor', 0)), 0)
+        limite = min(max(int(request.args.get('limite', MAX_NUEVOS_POR_CONSULTA)), 0), MAX_NUEVOS_POR_CONSULTA)
+    except ValueError:
+        return jsonify({'error': 'cursor y limite deben ser enteros'}), 400
+
+    nuevos = [
+        {'url': url, 'resultado': resultado}
+        for url, resultado in task['tabla'].filas(cursor, cursor + limite)
+    ]
+    respuesta = {
+        'status': task['status'],
+        'progress': task['progress'],
+        'completados': task['completados'],
+        'total': task['total'],
+        'cursor': cursor + len(nuevos),
+        'nuevos': nuevos
+    }
+    if 'cache' in task:
+        respuesta['cache'] = task['cache']
+    if 'rastreo' in task:
+        respuesta['rastreo'] = task['rastreo']
+    if task['status'] == 'queued':
+        respuesta['posicion_cola'] = obtener_pool().posicion_en_cola(task_id)
+    return jsonify(respuesta)
+
+@app.route('/resultados/<task_id>')
+def resultados_tarea(task_id):
+    """
+    Resultado completo de la tarea. Con ?pagina=N&por_pagina=M se pagina por
+    URL; sin parámetros se transmite el JSON completo URL por URL.
+    """
+    task = tasks.get(task_id)
+    if not task:
+        return jsonify({'error': 'ID no válido'}), 404
+
+    tabla = task['tabla']
+    if 'url' in request.args:
+        url = request.args['url']
+        return jsonify({'status': task['status'], 'result': {url: tabla.resultados_de(url)}})
+
+    if 'pagina' in request.args:
+        try:
+            pagina = max(int(request.args['pagina']), 1)
+            por_pagina = min(max(int(request.args.get('por_pagina', 50)), 1), 500)
+        except ValueError:
+            return jsonify({'error': 'pagina y por_pagina deben ser enteros'}), 400
+        urls = tabla.lista_urls()
+        inicio = (pagina - 1) * por_pagina
+        return jsonify({
+            'status': task['status'],
+            'pagina': pagina,
+            'por_pagina': por_pagina,
+            'urls_total': len(urls),
+            'result': {url: tabla.resultados_de(url) for url in urls[inicio:inicio + por_pagina]}
+        })
+
+    return Response(stream_with_context(generar_json(tabla)), mimetype='application/json')
+
+def generar_json(tabla):
+    """JSON {url: [resultados]} de una tabla, URL por URL"""
+    yield '{'
+    for i, url in enumerate(tabla.lista_urls()):
+        separador = ',' if i else ''
+        yield f"{separador}{json.dumps(url)}:{json.dumps(tabla.resultados_de(url))}"
+    yield '}'
+
+def generar_ndjson(tabla):
+    """Una línea {"url", "resultado"} por resultado, en orden de llegada"""
+    for url, resultado in tabla.filas():
+        yield json.dumps({'url': url, 'resultado': resultado}) + '\n'
+
+# formato: (generador, tipo de contenido, extensión)
+FORMATOS_EXPORTACION = {
+    'json': (generar_json, 'application/json', 'json'),
+    'ndjson': (generar_ndjson, 'application/x-ndjson', 'ndjson'),
+    'columnar': (lambda tabla: generar_columnar(tabla.filas()), 'application/octet-stream', 'wacr')
+}
+
+@app.route('/exportar/<task_id>')
+def exportar(task_id):
+    """Descarga los resultados de la tarea en JSON, NDJSON o el formato columnar binario"""
+    task = tasks.get(task_id)
+    if not task:
+        return jsonify({'error': 'ID no válido'}), 404
+
+    formato = request.args.get('formato', 'json')
+    if formato not in FORMATOS_EXPORTACION:
+        return jsonify({'error': f"Formato no válido: {formato}. Opciones: {', '.join(FORMATOS_EXPORTACION)}"}), 400
+
+    generador, mimetype, extension = FORMATOS_EXPORTACION[formato]
+    return Response(stream_with_context(generador(task['tabla'])), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=resultados.{extension}'
+    })
+
+@app.route('/latencias/<task_id>')
+def latencias_tarea(task_id):
+    """
+    Percentiles e histograma de los tiempos de carga de la tarea, global y por
+    URL, calculados con los sketches que se actualizan mientras corre. Con
+    ?sketch=1 incluye los sketches serializados para combinarlos después.
+    """
+    task = tasks.get(task_id)
+    if not task:
+        return jsonify({'error': 'ID no válido'}), 404
+
+    try:
+        num_barras = min(max(int(request.args.get('barras', 10)), 1), 100)
+    except ValueError:
+        return jsonify({'error': 'barras debe ser un entero'}), 400
+
+    resumen = task['latencias'].resumen(num_barras, incluir_sketch=request.args.get('sketch') == '1')
+    resumen['status'] = task['status']
+    return jsonify(resumen)
+
+@app.route('/combinar-latencias', methods=['POST'])
+def combinar_latencias():
+    """
+    Combina los sketches de varias tareas ("task_ids") y/o sketches guardados
+    ("sketches": los de /latencias?sketch=1 o el "sketch" de
+    /procesar-resultados) y retorna los percentiles del conjunto.
+    """
+    data = request.get_json(silent=True) or {}
+    combinado = LatenciasPorUrl()
+    try:
+        for task_id in data.get('task_ids', []):
+            task = tasks.get(task_id)
+            if not task:
+                return jsonify({'error': f'ID no válido: {task_id}'}), 404
+            combinado.fusionar(task['latencias'])
+        for sketch in data.get('sketches', []):
+            if 'total' in sketch:
+                combinado.fusionar(LatenciasPorUrl.desde_dict(sketch))
+            else:
+                combinado.total.fusionar(HistogramaLatencias.desde_dict(sketch))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f'Sketch no válido: {e}'}), 400
+
+    return jsonify(combinado.resumen(incluir_sketch=True))
+
+def evento_sse(evento, datos, id_evento=None):
+    """Formatea un evento Server-Sent Events"""
+    lineas = []
+    if id_evento is not None:
+        lineas.append(f"id: {id_evento}")
+    lineas.append(f"event: {evento}")
+    lineas.append(f"data: {json.dumps(datos)}")
+    return '\n'.join(lineas) + '\n\n'
+
+@app.route('/stream/<task_id>')
+def stream_tarea(task_id):
+    """
+    Transmite por Server-Sent Events cada resultado en cuanto termina (evento
+    "resultado"), los cambios de estado ("estado") y el cierre ("fin"). Al
+    reconectar, el navegador manda Last-Event-ID y se retoma desde ahí.
+    """
+    task = tasks.get(task_id)
+    if not task:
+        return jsonify({'error': 'ID no válido'}), 404
+
+    try:
+        ultimo = request.headers.get('Last-Event-ID')
+        cursor = int(ultimo) + 1 if ultimo is not None else max(int(request.args.get('cursor', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'cursor debe ser un entero'}), 400
+
+    def generar():
+        nonlocal cursor
+        estado = None
+        while True:
+            nuevos = list(task['tabla'].filas(cursor))
+            for i, (url, resultado) in enumerate(nuevos, start=cursor):
+                yield evento_sse('resultado', {
+                    'url': url,
+                    'resultado': resultado,
+                    'completados': i + 1,
+                    'total': task['total'],
+                    'progress': int(((i + 1) / task['total']) * 100) if task['total'] else 100
+                }, i)
+            cursor += len(nuevos)
+
+            if task['status'] != estado:
+                estado = task['status']
+                datos = {'status': estado, 'progress': task['progress'], 'completados': task['completados'], 'total': task['total']}
+                if estado == 'queued':
+                    datos['posicion_cola'] = obtener_pool().posicion_en_cola(task_id)
+                yield evento_sse('estado', datos)
+
+            if estado in ('done', 'cancelled') and cursor >= len(task['tabla']):
+                yield evento_sse('fin', {'status': estado, 'completados': task['completados'], 'cache': task.get('cache')})
+                return
+
+            with cambios:
+                hubo_cambios = cambios.wait_for(
+                    lambda: len(task['tabla']) > cursor or task['status'] != estado,
+                    timeout=LATIDO_SSE
+                )
+            if not hubo_cambios:
+                yield ': ping\n\n'
+                if estado == 'queued':
+                    estado = None  # Reenviar la posición en la cola
+
+    return Response(stream_with_context(generar()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/distribuido/estado')
+def estado_distribuido():
+    """Trabajos pendientes, leases activos y workers vistos por el coordinador"""
+    try:
+        return jsonify(obtener_cola().estado())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/carga/<task_id>')
+def carga_tarea(task_id):
+    """
+    Prueba de carga: resumen (throughput objetivo vs logrado, latencia desde la
+    hora programada vs tiempo de servicio) y series por segundo desde ?desde=N.
+    """
+    task = tasks.get(task_id)
+    if not task:
+        return jsonify({'error': 'ID no válido'}), 404
+    if 'carga' not in task:
+        return jsonify({'error': 'La tarea no es una prueba de carga'}), 404
+    try:
+        desde = max(int(request.args.get('desde', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'desde debe ser un entero'}), 400
+    return jsonify({
+        'status': task['status'],
+        'resumen': task['carga'].resumen(),
+        'segundos': task['carga'].segundos(desde),
+        'resultados_guardados': len(task['tabla']),
+        'resultados_sin_guardar': task['completados'] - len(task['tabla'])
+    })
+
+@app.route('/perfil/<task_id>')
+def perfil_tarea(task_id):
+    """Reporte de cProfile del análisis de una tarea creada con "perfilar": true"""
+    task = tasks.get(task_id)
+    if not task:
+        return jsonify({'error': 'ID no válido'}), 404
+    if not task.get('perfil'):
+        return jsonify({'error': 'La tarea no tiene perfil (todavía no terminó o no se pidió)'}), 404
+    return Response(task['perfil'], mimetype='text/plain')
+
+@app.route('/metrics')
+def metricas():
+    """Contadores, histogramas y medidores del proceso en formato de texto de Prometheus"""
+    pool = obtener_pool()
+    TAREAS.fijar(pool.tareas_activas(), state='running')
+    TAREAS.fijar(pool.tareas_en_cola(), state='queued')
+    capacidades = {'download': pool.motor.max_en_vuelo, 'parse': pool.motor.procesos_parseo}
+    for nombre, capacidad in capacidades.items():
+        CAPACIDAD.fijar(capacidad, pool=nombre)
+        UTILIZACION.fijar(round(min(EN_VUELO.valor(pool=nombre) / capacidad, 1), 4), pool=nombre)
+    return Response(REGISTRO.exponer(), mimetype='text/plain; version=0.0.4')
+
+def parametros_comparacion():
+    """(dias, percentil, umbral) de la línea base desde la query string; ValueError si no son válidos"""
+    dias = int(request.args.get('dias', DIAS_BASE_DEFAULT))
+    percentil = int(request.args.get('percentil', PERCENTIL_DEFAULT))
+    umbral = float(request.args.get('umbral', UMBRAL_REGRESION_DEFAULT))
+    if not 1 <= dias <= MAX_DIAS_BASE:
+        raise ValueError(f"dias debe estar entre 1 y {MAX_DIAS_BASE}")
+    if percentil not in PERCENTILES_HISTORIAL:
+        raise ValueError(f"percentil debe ser uno de: {', '.join(map(str, PERCENTILES_HISTORIAL))}")
+    if umbral < 0:
+        raise ValueError('umbral no puede ser negativo')
+    return dias, percentil, umbral
+
+@app.route('/historial/urls')
+def historial_urls():
+    """URLs con historial, con los días y corridas registrados"""
+    return jsonify({'urls': obtener_historial().urls()})
+
+@app.route('/historial/serie')
+def historial_serie():
+    """
+    Serie de una URL (?url=) entre ?desde= y ?hasta= (epoch o ISO 8601): por
+    día desde los resúmenes diarios o, con ?granularidad=corrida, por corrida.
+    """
+    url = request.args.get('url')
+    if not url:
+        return jsonify({'error': 'Falta el parámetro url'}), 400
+    granularidad = request.args.get('granularidad', 'dia')
+    if granularidad not in GRANULARIDADES:
+        return jsonify({'error': f"Granularidad no válida, usar una de: {', '.join(GRANULARIDADES)}"}), 400
+    try:
+        desde = leer_fecha(request.args.get('desde'))
+        hasta = leer_fecha(request.args.get('hasta'))
+    except ValueError:
+        return jsonify({'error': 'desde y hasta deben ser epoch en segundos o fechas ISO 8601'}), 400
+    return jsonify({
+        'url': url,
+        'granularidad': granularidad,
+        'serie': obtener_historial().serie(url, desde, hasta, granularidad)
+    })
+
+@app.route('/historial/comparar/<corrida>')
+def historial_comparar(corrida):
+    """Cada URL de una corrida (task_id) contra su línea base de ?dias= días (?percentil=, ?umbral=)"""
+    try:
+        dias, percentil, umbral = parametros_comparacion()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    comparacion = obtener_historial().comparar_corrida(corrida, dias, percentil, umbral)
+    if comparacion is None:
+        return jsonify({'error': 'La corrida no está en el historial'}), 404
+    return jsonify(comparacion)
+
+@app.route('/historial/regresiones')
+def historial_regresiones():
+    """URLs cuya última corrida (desde ?desde=) es una regresión respecto de su línea base"""
+    try:
+        dias, percentil, umbral = parametros_comparacion()
+        desde = leer_fecha(request.args.get('desde'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(obtener_historial().regresiones(dias, percentil, umbral, desde))
+
+@app.route('/historial/importar', methods=['POST'])
+def historial_importar():
+    """
+    Agrega al historial un archivo de resultados exportado (JSON, NDJSON o
+    columnar) como una corrida con la fecha del campo "fecha" (epoch o ISO 8601).
+    """
+    if 'file' not in request.files or request.files['file'].filename == '':
+        return jsonify({'error': 'No se proporcionó archivo'}), 400
+    file = request.files['file']
+    try:
+        ts = leer_fecha(request.form.get('fecha'))
+    except ValueError:
+        return jsonify({'error': 'fecha debe ser epoch en segundos o una fecha ISO 8601'}), 400
+    corrida = request.form.get('corrida') or f"importada-{uuid.uuid4()}"
+    try:
+        stream = StreamConPrefijo(file.stream, len(MAGIA))
+        if stream.prefijo == MAGIA:
+            pares = leer_resultados_columnar(stream)
+        elif es_ndjson(file):
+            pares = leer_resultados_ndjson(stream)
+        else:
+            pares = leer_resultados_json(stream)
+        urls = obtener_historial().agregar(corrida, pares, ts, tipo='importada')
+    except (json.JSONDecodeError, ValueError) as e:
+        return jsonify({'error': f'Archivo no válido: {str(e)}'}), 400
+    return jsonify({'corrida': corrida, 'urls': urls})
+
+@app.route('/cancelar/<task_id>', methods=['POST'])
+def cancelar(task_id):
     task = tasks.get(task_id)
     if not task:
         return jsonify({'error': 'ID no válido'}), 404
-    return jsonify(task)
+    if task['status'] not in ('queued', 'processing'):
+        return jsonify({'error': f"La tarea ya terminó ({task['status']})"}), 409
+
+    estado_previo = task['status']
+    obtener_pool().cancelar(task_id)
+    if estado_previo == 'queued':
+        task['status'] = 'cancelled'
+        tasks.terminar(task_id)
+        notificar_cambios()
+    return jsonify({'task_id': task_id, 'status': 'cancelled'})
 
 @app.route('/visualizar')
 def visualizar():
@@ -67,6 +737,15 @@ def visualizar():
 def tiempo_respuesta():
     return render_template('tiempo_respuesta.html')
 
+def es_ndjson(file):
+    """Detecta un archivo NDJSON por extensión, tipo de contenido o el campo formato"""
+    nombre = (file.filename or '').lower()
+    return (
+        nombre.endswith(('.ndjson', '.jsonl'))
+        or file.mimetype in ('application/x-ndjson', 'application/jsonl')
+        or request.form.get('formato') == 'ndjson'
+    )
+
 @app.route('/procesar-resultados', methods=['POST'])
 def procesar_resultados():
     try:
@@ -78,17 +757,25 @@ def procesar_resultados():
         if file.filename == '':
             return jsonify({'error': 'No se seleccionó archivo'}), 400
         
-        # Leer y parsear el JSON
-        content = file.read().decode('utf-8')
-        data = json.loads(content)
+        # Leer el archivo por bloques: columnar (por su cabecera), NDJSON (una línea
+        # por resultado) o JSON {url: [resultados]}
+        stream = StreamConPrefijo(file.stream, len(MAGIA))
+        if stream.prefijo == MAGIA:
+            pares = leer_resultados_columnar(stream)
+        elif es_ndjson(file):
+            pares = leer_resultados_ndjson(stream)
+        else:
+            pares = leer_resultados_json(stream)
         
         # Procesar los datos para gráficos
-        resultados_procesados = procesar_datos_para_graficos(data)
+        resultados_procesados = procesar_datos_para_graficos(pares)
         
         return jsonify(resultados_procesados)
         
     except json.JSONDecodeError:
         return jsonify({'error': 'Archivo JSON inválido'}), 400
+    except ValueError as e:
+        return jsonify({'error': f'Archivo no válido: {str(e)}'}), 400
     except Exception as e:
         return jsonify({'error': f'Error procesando archivo: {str(e)}'}), 500
 
@@ -118,55 +805,70 @@ def procesar_tiempo_respuesta():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
-def procesar_datos_para_graficos(data):
-    """Procesa los datos JSON para generar información para gráficos"""
+def procesar_datos_para_graficos(pares):
+    """
+    Procesa los resultados para generar información para gráficos. Recibe un
+    iterable de (url, resultado) y los consume de a uno, así el uso de memoria
+    no depende del tamaño del archivo: las series para los gráficos se
+    muestrean y las estadísticas se acumulan al vuelo.
+    """
     
-    # Datos para gráfico de tiempo de respuesta
-    tiempos_respuesta = []
-    urls_analizadas = []
-    velocidades = []
-    tamanos = []
+    # Datos para gráfico de tiempo de respuesta: (tiempo, url, velocidad, tamaño)
+    serie = MuestraSerie()
+    tiempos = AcumuladorValores()
+    tiempos_por_url = {}
+    distribucion_velocidad = {}
+    tamanos_por_rango = {
+        '0-100 KB': 0,
+        '100-500 KB': 0,
+        '500-1000 KB': 0,
+        '1000+ KB': 0
+    }
     
     # Datos para líneas de código HTML (solo primera repetición)
     html_lines_data = []
     html_chars_data = []
     urls_html_data = []
+    urls_vistas = set()
     
-    for url, resultados in data.items():
-        for i, resultado in enumerate(resultados):
-            if resultado.get('load_time_ms'):
-                tiempos_respuesta.append(resultado['load_time_ms'])
-                urls_analizadas.append(url)
-                velocidades.append(resultado.get('speed_rating', 'N/A'))
-                tamanos.append(resultado.get('size_kb', 0))
-            
-            # Solo tomar datos de líneas de código de la primera repetición
-            if i == 0 and resultado.get('html_lines', 0) > 0:
-                html_lines_data.append(resultado['html_lines'])
-                html_chars_data.append(resultado['html_chars'])
-                urls_html_data.append(url)
+    # Fases de la descarga por URL (DNS, conexión, TLS, TTFB, descarga)
+    fases_por_url = {}
+    fases_globales = {fase: AcumuladorValores(con_percentiles=False) for fase in FASES}
     
-    # Estadísticas
-    if tiempos_respuesta:
-        tiempo_promedio = sum(tiempos_respuesta) / len(tiempos_respuesta)
-        tiempo_min = min(tiempos_respuesta)
-        tiempo_max = max(tiempos_respuesta)
-        
-        # Distribución de velocidades
-        distribucion_velocidad = {}
-        for velocidad in velocidades:
+    # Solicitudes condicionales (modo de revalidación)
+    revalidaciones = {'total': 0, 'no_modificadas': 0, 'cdn': 0, 'origin': 0}
+    ahorro_ms = AcumuladorValores(con_percentiles=False)
+    ahorro_kb = AcumuladorValores(con_percentiles=False)
+    
+    # Descargas cortadas por superar el tamaño máximo del cuerpo
+    truncados = 0
+    
+    # Peso de la página con sus subrecursos (modo de subrecursos)
+    peso_pagina = AcumuladorValores(con_percentiles=False)
+    ruta_critica = AcumuladorValores(con_percentiles=False)
+    peso_por_tipo = {tipo: 0.0 for tipo in TIPOS_RECURSO}
+    
+    # Compresión real de la transferencia (modo de compresión)
+    compresion_red = AcumuladorValores(con_percentiles=False)
+    desperdicio_kb = AcumuladorValores(con_percentiles=False)
+    desperdicio_ms = AcumuladorValores(con_percentiles=False)
+    codificaciones_servidas = {}
+    
+    for url, resultado in pares:
+        primera = url not in urls_vistas
+        urls_vistas.add(url)
+        
+        if resultado.get('load_time_ms'):
+            tiempo = resultado['load_time_ms']
+            velocidad = resultado.get('speed_rating', 'N/A')
+            tamano = resultado.get('size_kb', 0)
+            serie.agregar((tiempo, url, velocidad, tamano))
+            tiempos.agregar(tiempo)
+            tiempos_por_url.setdefault(url, AcumuladorValores()).agregar(tiempo)
+            
             if velocidad != 'N/A':
                 distribucion_velocidad[velocidad] = distribucion_velocidad.get(velocidad, 0) + 1
-        
-        # Distribución de tamaños
-        tamanos_por_rango = {
-            '0-100 KB': 0,
-            '100-500 KB': 0,
-            '500-1000 KB': 0,
-            '1000+ KB': 0
-        }
-        
-        for tamano in tamanos:
+            
             if tamano <= 100:
                 tamanos_por_rango['0-100 KB'] += 1
             elif tamano <= 500:
@@ -176,6 +878,50 @@ def procesar_datos_para_graficos(data):
             else:
                 tamanos_por_rango['1000+ KB'] += 1
         
+        for fase in FASES:
+            if resultado.get(fase) is not None:
+                fases_url = fases_por_url.setdefault(url, {})
+                if fase not in fases_url:
+                    fases_url[fase] = AcumuladorValores(con_percentiles=False)
+                fases_url[fase].agregar(resultado[fase])
+                fases_globales[fase].agregar(resultado[fase])
+        
+        if resultado.get('truncated'):
+            truncados += 1
+        
+        if resultado.get('page_weight_kb') is not None:
+            peso_pagina.agregar(resultado['page_weight_kb'])
+            ruta_critica.agregar(resultado.get('critical_path_ms') or 0)
+            for tipo, pesos in (resultado.get('subresource_weight_by_type') or {}).items():
+                peso_por_tipo[tipo] = peso_por_tipo.get(tipo, 0.0) + pesos['kb']
+        
+        if resultado.get('transfer_compression_ratio') is not None:
+            compresion_red.agregar(resultado['transfer_compression_ratio'])
+            servida = resultado.get('compression_served') or 'identity'
+            codificaciones_servidas[servida] = codificaciones_servidas.get(servida, 0) + 1
+            if resultado.get('compression_waste_kb') is not None:
+                desperdicio_kb.agregar(resultado['compression_waste_kb'])
+            if resultado.get('compression_waste_ms') is not None:
+                desperdicio_ms.agregar(resultado['compression_waste_ms'])
+        
+        if resultado.get('revalidated'):
+            revalidaciones['total'] += 1
+            if resultado.get('not_modified'):
+                revalidaciones['no_modificadas'] += 1
+                revalidaciones[resultado.get('revalidation_source') or 'origin'] += 1
+            ahorro_ms.agregar(resultado.get('revalidation_saved_ms') or 0)
+            ahorro_kb.agregar(resultado.get('revalidation_saved_kb') or 0)
+        
+        # Solo tomar datos de líneas de código de la primera repetición
+        if primera and resultado.get('html_lines', 0) > 0:
+            html_lines_data.append(resultado['html_lines'])
+            html_chars_data.append(resultado['html_chars'])
+            urls_html_data.append(url)
+    
+    # Estadísticas
+    if tiempos.cuenta:
+        puntos = serie.puntos()
+        
         # Estadísticas de líneas de código HTML
         html_stats = {}
         if html_lines_data:
@@ -189,23 +935,69 @@ def procesar_datos_para_graficos(data):
                 'max_caracteres': max(html_chars_data)
             }
         
+        estadisticas = {
+            'promedio': round(tiempos.promedio, 2),
+            'minimo': tiempos.minimo,
+            'maximo': tiempos.maximo,
+            'desviacion': round(tiempos.desviacion, 2),
+            'total_analisis': tiempos.cuenta,
+            'muestreado': serie.muestreada,
+            'truncados': truncados
+        }
+        estadisticas.update(tiempos.percentiles())
+        
+        revalidacion = {}
+        if revalidaciones['total']:
+            revalidacion = dict(
+                revalidaciones,
+                ahorro_promedio_ms=round(ahorro_ms.promedio, 2),
+                ahorro_promedio_kb=round(ahorro_kb.promedio, 2)
+            )
+        
+        subrecursos = {}
+        if peso_pagina.cuenta:
+            subrecursos = {
+                'peso_pagina_kb': peso_pagina.resumen(),
+                'ruta_critica_ms': ruta_critica.resumen(),
+                'peso_promedio_por_tipo_kb': {
+                    tipo: round(total / peso_pagina.cuenta, 2) for tipo, total in peso_por_tipo.items()
+                }
+            }
+        
+        compresion = {}
+        if compresion_red.cuenta:
+            compresion = {
+                'ratio_red': compresion_red.resumen(),
+                'codificaciones_servidas': codificaciones_servidas,
+                'desperdicio_kb': desperdicio_kb.resumen(),
+                'desperdicio_ms': desperdicio_ms.resumen()
+            }
+        
         return {
-            'tiempos_respuesta': tiempos_respuesta,
-            'urls_analizadas': urls_analizadas,
-            'velocidades': velocidades,
-            'tamanos': tamanos,
+            'tiempos_respuesta': [p[0] for p in puntos],
+            'urls_analizadas': [p[1] for p in puntos],
+            'velocidades': [p[2] for p in puntos],
+            'tamanos': [p[3] for p in puntos],
             'html_lines_data': html_lines_data,
             'html_chars_data': html_chars_data,
             'urls_html_data': urls_html_data,
-            'estadisticas': {
-                'promedio': round(tiempo_promedio, 2),
-                'minimo': tiempo_min,
-                'maximo': tiempo_max,
-                'total_analisis': len(tiempos_respuesta)
-            },
+            'estadisticas': estadisticas,
+            'por_url': {url: acumulador.resumen() for url, acumulador in tiempos_por_url.items()},
+            'histograma': tiempos.sketch.histograma(),
+            'sketch': tiempos.sketch.a_dict(),
             'html_stats': html_stats,
             'distribucion_velocidad': distribucion_velocidad,
-            'distribucion_tamanos': tamanos_por_rango
+            'distribucion_tamanos': tamanos_por_rango,
+            'fases_por_url': {
+                url: {fase: acumulador.resumen() for fase, acumulador in fases.items()}
+                for url, fases in fases_por_url.items()
+            },
+            'fases_promedio': {
+                fase: round(acumulador.promedio, 2) for fase, acumulador in fases_globales.items() if acumulador.cuenta
+            },
+            'revalidacion': revalidacion,
+            'subrecursos': subrecursos,
+            'compresion': compresion
         }
     else:
         return {
@@ -217,4 +1009,7 @@ if __name__ == '__main__':
     print(f"Directorio actual: {os.getcwd()}")
     print(f"Templates existe: {os.path.exists('templates')}")
     print(f"Static existe: {os.path.exists('static')}")
+    # Precalentar el pool de workers (con el reloader de debug solo en el proceso que sirve)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        obtener_pool()
     app.run(debug=True, port=5001)
@@ -0,0 +1,485 @@
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import asynccontextmanager
+
+import requests
+
+from analyzer import (
+    RespuestaParseo, analizar_respuesta, cabeceras_condicionales, marcar_revalidacion, resultado_error,
+    resultado_revalidado, resultado_timeout
+)
+from crawler import MAX_SITEMAPS, descargar_sitemap
+from extractor import parsear_html, extraer_metricas
+from fetcher import descargar, MODO_DEFAULT
+from load_test import FACTOR_PENDIENTES, enviar_sin_analizar, resultado_carga, resultado_descartado
+from metrics import BYTES_DESCARGADOS, DESCARGA_SEGUNDOS, EN_VUELO, PARSEO_SEGUNDOS, RESULTADOS, desenlace
+from profiling import perfilar_llamada
+from scheduler import PlanificadorHosts, intercalar_por_host
+from subresources import CacheRecursos
+from compression import MedidorCompresion
+
+MAX_EN_VUELO_DEFAULT = 100
+TIMEOUT_DEFAULT = 30
+
+
+def procesos_parseo_default():
+    """Tamaño por defecto del pool de parseo: la parte de CPU no gana nada con más procesos que CPUs"""
+    return max(1, min(os.cpu_count() or 1, 8))
+
+
+def _precalentar():
+    """Fuerza en el worker la importación y primer uso de bs4 para que la primera tarea no lo pague"""
+    extraer_metricas(parsear_html(b'<html><head><title>x</title></head><body></body></html>'))
+    time.sleep(0.05)  # Mantener ocupado el worker para que el pool arranque los demás
+    return os.getpid()
+
+
+def _descargar_marcado(url, modo, marca, cabeceras=None, max_bytes=None):
+    """Descarga registrando en marca la hora real (epoch) en que empezó"""
+    marca['inicio'] = time.time()
+    return descargar(url, modo, TIMEOUT_DEFAULT, cabeceras, max_bytes)
+
+
+def _registrar_programacion(resultado, programado, marca):
+    """Agrega al resultado la hora programada, la real y el retraso por cola"""
+    inicio = marca.get('inicio', programado)
+    resultado['scheduled_start'] = round(programado, 3)
+    resultado['actual_start'] = round(inicio, 3)
+    resultado['queue_delay_ms'] = round(max(inicio - programado, 0) * 1000, 2)
+    return resultado
+
+
+class SemaforoJusto:
+    """
+    Semáforo asyncio que reparte los cupos entre grupos (tareas): cuando se libera
+    un cupo lo recibe el grupo en espera de mayor prioridad y, a igual prioridad,
+    los grupos se turnan en round-robin.
+    """
+
+    def __init__(self, cupos):
+        self._libres = cupos
+        self._esperas = {}
+        self._prioridades = {}
+        self._turno = deque()
+
+    def _siguiente_grupo(self):
+        candidatos = [g for g in self._turno if self._esperas.get(g)]
+        if not candidatos:
+            return None
+        prioridad = max(self._prioridades[g] for g in candidatos)
+        for grupo in candidatos:
+            if self._prioridades[grupo] == prioridad:
+                # Pasar el grupo al final de la rotación
+                self._turno.remove(grupo)
+                self._turno.append(grupo)
+                return grupo
+
+    def _despertar(self):
+        while self._libres > 0:
+            grupo = self._siguiente_grupo()
+            if grupo is None:
+                return
+            espera = self._esperas[grupo].popleft()
+            if espera.done():
+                continue
+            self._libres -= 1
+            espera.set_result(None)
+
+    def _olvidar(self, grupo):
+        if not self._esperas.get(grupo):
+            self._esperas.pop(grupo, None)
+            self._prioridades.pop(grupo, None)
+            if grupo in self._turno:
+                self._turno.remove(grupo)
+
+    async def adquirir(self, grupo, prioridad=0):
+        if self._libres > 0 and not any(self._esperas.values()):
+            self._libres -= 1
+            return
+
+        espera = asyncio.get_running_loop().create_future()
+        self._esperas.setdefault(grupo, deque()).append(espera)
+        self._prioridades[grupo] = prioridad
+        if grupo not in self._turno:
+            self._turno.append(grupo)
+        try:
+            await espera
+        except asyncio.CancelledError:
+            if espera.done() and not espera.cancelled():
+                # Ya se le había dado el cupo: devolverlo
+                self.liberar()
+            elif espera in self._esperas.get(grupo, ()):
+                self._esperas[grupo].remove(espera)
+            self._olvidar(grupo)
+            raise
+        self._olvidar(grupo)
+
+    def liberar(self):
+        self._libres += 1
+        self._despertar()
+
+    @asynccontextmanager
+    async def cupo(self, grupo, prioridad=0):
+        await self.adquirir(grupo, prioridad)
+        try:
+            yield
+        finally:
+            self.liberar()
+
+
+class MotorAnalisis:
+    """
+    Pools de descarga (hilos) y de parseo (procesos) de larga vida. Varias
+    tareas pueden ejecutarse a la vez sobre el mismo motor: los cupos de
+    descarga se reparten entre ellas con un SemaforoJusto.
+    """
+
+    def __init__(self, max_en_vuelo=MAX_EN_VUELO_DEFAULT, procesos_parseo=None):
+        self.max_en_vuelo = max_en_vuelo
+        self.procesos_parseo = procesos_parseo or procesos_parseo_default()
+        self.hilos = ThreadPoolExecutor(max_workers=max_en_vuelo)
+        self.procesos = ProcessPoolExecutor(max_workers=self.procesos_parseo)
+        self._en_vuelo = None
+        self._parseos = None
+
+    def precalentar(self):
+        """Arranca todos los procesos de parseo e importa bs4 en ellos"""
+        wait([self.procesos.submit(_precalentar) for _ in range(self.procesos_parseo)])
+
+    def cerrar(self, cancelar=False):
+        self.hilos.shutdown(wait=not cancelar, cancel_futures=cancelar)
+        self.procesos.shutdown(wait=not cancelar, cancel_futures=cancelar)
+
+    def _semaforos(self):
+        # Se crean dentro del loop que los va a usar
+        if self._en_vuelo is None:
+            self._en_vuelo = SemaforoJusto(self.max_en_vuelo)
+            self._parseos = asyncio.Semaphore(self.procesos_parseo * 4)
+        return self._en_vuelo, self._parseos
+
+    async def _ejecutar_trabajo(self, trabajo, grupo, prioridad, limite_tarea, planificador, cache, primera=None,
+                                recursos=None, perfil=None, compresion=None):
+        """
+        Descarga una URL en el pool de hilos y analiza el cuerpo en el pool de procesos.
+        primera es el futuro con el resultado de la primera repetición de la URL: si
+        se pasa, la descarga se revalida con sus validadores y un 304 no se parsea.
+        Con recursos (la CacheRecursos de la tarea) se miden además los subrecursos
+        y con compresion (el MedidorCompresion de la tarea) la compresión real.
+        Con perfil (profiling.PerfilTarea) el análisis corre bajo cProfile y su
+        perfil se suma al de la tarea.
+        """
+        loop = asyncio.get_running_loop()
+        en_vuelo, parseos = self._semaforos()
+        url = trabajo['url']
+        modo = trabajo.get('mode', MODO_DEFAULT)
+        marca = {}
+
+        # Se espera antes de pedir turno al host para no ocupar su lugar mientras tanto
+        base = await asyncio.shield(primera) if primera is not None else None
+        cabeceras = cabeceras_condicionales(base)
+
+        # Primero el turno del host (y la espera programada), luego los cupos de
+        # la tarea y globales, así un host saturado no acapara cupos de otros hosts
+        async with planificador.turno(trabajo) as programado:
+            async with limite_tarea, en_vuelo.cupo(grupo, prioridad):
+                EN_VUELO.incrementar(pool='download')
+                try:
+                    response, info_conexion = await loop.run_in_executor(
+                        self.hilos, _descargar_marcado, url, modo, marca, cabeceras or None,
+                        trabajo.get('max_bytes')
+                    )
+                except requests.exceptions.Timeout:
+                    return trabajo, _registrar_programacion(resultado_timeout(modo), programado, marca)
+                except Exception as e:
+                    return trabajo, _registrar_programacion(resultado_error(str(e), modo), programado, marca)
+                finally:
+                    EN_VUELO.decrementar(pool='download')
+        DESCARGA_SEGUNDOS.observar(info_conexion['total_time'], mode=modo)
+        BYTES_DESCARGADOS.incrementar(len(response.content))
+
+        if cabeceras and response.status_code == 304:
+            resultado = resultado_revalidado(response, info_conexion, base)
+            if trabajo.get('etapas'):
+                resultado['stage_timings_ms'] = {'fetch': round(info_conexion['total_time'] * 1000, 3)}
+            return trabajo, _registrar_programacion(resultado, programado, marca)
+
+        # El cupo de descarga ya se liberó; el parseo tiene su propio límite para no
+        # acumular cuerpos en memoria si la CPU va más lenta que la red. Al proceso
+        # solo viaja lo que usa el análisis, no el Response con su conexión
+        argumentos = (
+            RespuestaParseo.desde_response(response), info_conexion, trabajo.get('repeticion', 1), trabajo.get('parser'), cache,
+            recursos is not None, trabajo.get('etapas', False), trabajo.get('enlaces', False)
+        )
+        espera = time.perf_counter()
+        async with parseos:
+            inicio = time.perf_counter()
+            EN_VUELO.incrementar(pool='parse')
+            try:
+                if perfil is not None:
+                    resultado, stats = await loop.run_in_executor(
+                        self.procesos, perfilar_llamada, analizar_respuesta, *argumentos
+                    )
+                    perfil.agregar(stats)
+                else:
+                    resultado = await loop.run_in_executor(self.procesos, analizar_respuesta, *argumentos)
+            except Exception as e:
+                resultado = resultado_error(str(e), modo)
+            finally:
+                EN_VUELO.decrementar(pool='parse')
+            fin = time.perf_counter()
+        PARSEO_SEGUNDOS.observar(fin - inicio)
+        etapas = resultado.get('stage_timings_ms')
+        if etapas is not None:
+            # Lo que el análisis no midió adentro es la espera de un proceso libre y el envío entre procesos
+            medido = sum(ms for etapa, ms in etapas.items() if etapa != 'fetch')
+            etapas['parse_queue'] = round(max((fin - espera) * 1000 - medido, 0), 3)
+        # Fuera del límite de parseos: los subrecursos son solo espera de red
+        encontrados = resultado.pop('subresources', None)
+        if recursos is not None and encontrados is not None:
+            inicio = time.perf_counter()
+            resultado.update(await recursos.medir_pagina(response.url, encontrados, resultado, self.hilos))
+            if etapas is not None:
+                etapas['subresources'] = round((time.perf_counter() - inicio) * 1000, 3)
+        if compresion is not None and not resultado.get('error'):
+            inicio = time.perf_counter()
+            resultado.update(await compresion.medir_pagina(
+                response.url, response.content, self.hilos, self.procesos, trabajo.get('max_bytes'),
+                info_conexion['truncated']
+            ))
+            if etapas is not None:
+                etapas['compression'] = round((time.perf_counter() - inicio) * 1000, 3)
+        if cabeceras and not resultado.get('error'):
+            marcar_revalidacion(resultado, base)
+        return trabajo, _registrar_programacion(resultado, programado, marca)
+
+    async def ejecutar(self, trabajos, al_completar, grupo=None, prioridad=0, max_en_vuelo=None,
+                       programacion=None, cache=None, subrecursos=None, perfil=None, compresion=None,
+                       bases=None):
+        """
+        Ejecuta una lista de trabajos ({'url', 'mode', 'parser', 'repeticion', 'indice',
+        'revalidar', 'max_bytes', 'etapas', 'enlaces'}). Con enlaces el resultado
+        trae en 'links' los enlaces de la página (lo usa ejecutar_rastreo). Con etapas cada resultado trae
+        stage_timings_ms y con perfil (profiling.PerfilTarea) se perfila el
+        análisis de todos los trabajos. Con revalidar, las repeticiones de índice > 0 de una
+        URL esperan a la de índice 0 y se hacen como solicitudes condicionales con su
+        ETag / Last-Modified; bases ({url: resultado}) da el resultado de índice 0 de
+        las URLs cuya primera repetición ya se hizo antes (al reanudar una corrida).
+        max_bytes limita el cuerpo que se descarga.
+        max_en_vuelo limita las descargas simultáneas de esta tarea además del
+        límite global del motor; programacion son los argumentos de PlanificadorHosts
+        (estrategia, intervalo_ms, max_por_host) y subrecursos, si se pasa, los de
+        CacheRecursos (metodo, max_por_pagina, concurrencia) para medir el peso de
+        cada página con una cache de recursos común a toda la tarea; compresion,
+        si se pasa, son los de MedidorCompresion (niveles_gzip, niveles_brotli,
+        concurrencia) para medir la compresión real de cada página. Llama
+        al_completar(trabajo, resultado) en cuanto termina cada uno, con el mismo
+        esquema de resultado que analizar_url más la hora programada y la real. Si
+        se cancela, cancela todo lo pendiente.
+        """
+        grupo = grupo if grupo is not None else id(trabajos)
+        limite_tarea = asyncio.Semaphore(max_en_vuelo or self.max_en_vuelo)
+        planificador = PlanificadorHosts(**(programacion or {}))
+        recursos = CacheRecursos(**subrecursos) if subrecursos is not None else None
+        medidor = MedidorCompresion(**compresion) if compresion is not None else None
+
+        loop = asyncio.get_running_loop()
+        bases = bases or {}
+        primeras = {}
+        for t in trabajos:
+            if not t.get('revalidar') or t['url'] in primeras:
+                continue
+            if t['url'] in bases:
+                primeras[t['url']] = loop.create_future()
+                primeras[t['url']].set_result(bases[t['url']])
+            elif t.get('indice', 0) == 0:
+                primeras[t['url']] = loop.create_future()
+
+        def publicar_primera(url, ejecucion):
+            primera = primeras[url]
+            if primera.done():
+                return
+            if ejecucion.cancelled() or ejecucion.exception() is not None:
+                primera.set_result(None)
+            else:
+                primera.set_result(ejecucion.result()[1])
+
+        pendientes = []
+        for t in intercalar_por_host(trabajos):
+            revalida = t.get('revalidar') and t['url'] in primeras
+            primera = primeras[t['url']] if revalida and t.get('indice', 0) > 0 else None
+            pendiente = asyncio.ensure_future(
+                self._ejecutar_trabajo(
+                    t, grupo, prioridad, limite_tarea, planificador, cache, primera, recursos, perfil, medidor
+                )
+            )
+            if revalida and t.get('indice', 0) == 0:
+                pendiente.add_done_callback(lambda ejecucion, url=t['url']: publicar_primera(url, ejecucion))
+            pendientes.append(pendiente)
+        try:
+            for siguiente in asyncio.as_completed(pendientes):
+                trabajo, resultado = await siguiente
+                RESULTADOS.incrementar(outcome=desenlace(resultado))
+                al_completar(trabajo, resultado)
+        finally:
+            for pendiente in pendientes:
+                pendiente.cancel()
+            if recursos is not None:
+                recursos.cancelar()
+
+    async def ejecutar_rastreo(self, frontera, plantilla, al_completar, sitemaps=(), grupo=None, prioridad=0,
+                               max_en_vuelo=None, programacion=None, cache=None, subrecursos=None, perfil=None,
+                               compresion=None):
+        """
+        Rastrea un sitio: toma URLs de frontera (crawler.FronteraRastreo, ya con
+        las semillas) y las analiza como trabajos de ejecutar con las opciones de
+        plantilla; los enlaces de cada página vuelven a la frontera con un nivel
+        más de profundidad mientras el rastreo sigue. Los sitemaps (también
+        índices) se leen de a uno y solo cuando la frontera se está vaciando, así
+        un sitemap de 50.000 URLs no se carga entero en la frontera. Como mucho
+        hay max_en_vuelo páginas en curso a la vez. Llama
+        al_completar(trabajo, resultado) con cada página; resultado lleva
+        crawl_depth y links_found.
+        """
+        loop = asyncio.get_running_loop()
+        grupo = grupo if grupo is not None else id(frontera)
+        limite = max_en_vuelo or self.max_en_vuelo
+        limite_tarea = asyncio.Semaphore(limite)
+        planificador = PlanificadorHosts(**(programacion or {}))
+        recursos = CacheRecursos(**subrecursos) if subrecursos is not None else None
+        medidor = MedidorCompresion(**compresion) if compresion is not None else None
+        modo = plantilla.get('mode', MODO_DEFAULT)
+
+        sitemaps = deque(sitemaps)
+        leidos = 0
+        locs = deque()
+        pendientes = set()
+        try:
+            while True:
+                # Se rellena la frontera desde los sitemaps cuando no alcanza para los cupos libres
+                while len(frontera) < limite and frontera.hay_lugar() and (locs or sitemaps):
+                    if locs:
+                        frontera.agregar_semilla(locs.popleft())
+                        continue
+                    url_sitemap = sitemaps.popleft()
+                    leidos += 1
+                    try:
+                        es_indice, encontradas = await loop.run_in_executor(
+                            self.hilos, descargar_sitemap, url_sitemap, modo
+                        )
+                    except Exception as e:
+                        frontera.errores_sitemap.append(f"{url_sitemap}: {e}")
+                        continue
+                    if es_indice:
+                        sitemaps.extend(encontradas[:max(MAX_SITEMAPS - leidos - len(sitemaps), 0)])
+                    else:
+                        locs.extend(encontradas)
+
+                siguiente = frontera.siguiente() if len(pendientes) < limite else None
+                if isinstance(siguiente, tuple):
+                    url, profundidad = siguiente
+                    trabajo = dict(
+                        plantilla, url=url, profundidad=profundidad,
+                        enlaces=profundidad < frontera.max_profundidad and not frontera.completa()
+                    )
+                    pendientes.add(asyncio.ensure_future(
+                        self._ejecutar_trabajo(trabajo, grupo, prioridad, limite_tarea, planificador, cache,
+                                               recursos=recursos, perfil=perfil, compresion=medidor)
+                    ))
+                    continue
+                if not pendientes:
+                    if siguiente is None:
+                        break
+                    # Solo queda esperar el retraso de cortesía de los hosts
+                    await asyncio.sleep(siguiente)
+                    continue
+
+                listos, pendientes = await asyncio.wait(
+                    pendientes, timeout=siguiente, return_when=asyncio.FIRST_COMPLETED
+                )
+                for listo in listos:
+                    trabajo, resultado = listo.result()
+                    enlaces = resultado.pop('links', None) or []
+                    for enlace in enlaces:
+                        frontera.agregar(enlace, trabajo['profundidad'] + 1)
+                    resultado['crawl_depth'] = trabajo['profundidad']
+                    resultado['links_found'] = len(enlaces)
+                    RESULTADOS.incrementar(outcome=desenlace(resultado))
+                    al_completar(trabajo, resultado)
+        finally:
+            for pendiente in pendientes:
+                pendiente.cancel()
+            if recursos is not None:
+                recursos.cancelar()
+
+    async def ejecutar_carga(self, urls, programa, al_completar, grupo=None, prioridad=0, max_en_vuelo=None,
+                             modo=MODO_DEFAULT, max_bytes=None):
+        """
+        Prueba de carga open-loop: lanza el envío k en el instante que indica
+        programa (load_test.ProgramaCarga) sin esperar a que terminen los
+        anteriores, rotando entre urls, y solo descarga (no parsea). Si el
+        generador se atrasa los envíos atrasados salen enseguida y su latencia
+        se sigue midiendo desde la hora programada. Si el servidor no da abasto
+        y ya hay FACTOR_PENDIENTES envíos pendientes por cupo de la tarea, el
+        envío se registra como descartado (error 'overload') en su hora
+        programada, así la memoria queda acotada sin esconder la saturación. Llama
+        al_completar(trabajo, resultado) con cada resultado (ver load_test.resultado_carga).
+        """
+        loop = asyncio.get_running_loop()
+        en_vuelo, _ = self._semaforos()
+        grupo = grupo if grupo is not None else id(urls)
+        limite_tarea = asyncio.Semaphore(max_en_vuelo or self.max_en_vuelo)
+        max_pendientes = (max_en_vuelo or self.max_en_vuelo) * FACTOR_PENDIENTES
+        # Un margen para que el primer envío no salga ya atrasado
+        inicio_prueba = time.perf_counter() + 0.05
+        epoch_prueba = time.time() + 0.05
+
+        async def enviar(numero, url, programado):
+            async with limite_tarea, en_vuelo.cupo(grupo, prioridad):
+                EN_VUELO.incrementar(pool='download')
+                try:
+                    status, tamano, error, inicio, fin = await loop.run_in_executor(
+                        self.hilos, enviar_sin_analizar, url, modo, max_bytes
+                    )
+                finally:
+                    EN_VUELO.decrementar(pool='download')
+            if not error:
+                DESCARGA_SEGUNDOS.observar(fin - inicio, mode=modo)
+                BYTES_DESCARGADOS.incrementar(tamano)
+            resultado = resultado_carga(status, tamano, error, modo, programado, inicio, fin, inicio_prueba,
+                                        epoch_prueba)
+            RESULTADOS.incrementar(outcome=desenlace(resultado))
+            al_completar({'url': url, 'mode': modo, 'indice': numero}, resultado)
+
+        pendientes = set()
+        try:
+            for numero, instante in enumerate(programa.instantes()):
+                programado = inicio_prueba + instante
+                espera = programado - time.perf_counter()
+                if espera > 0:
+                    await asyncio.sleep(espera)
+                if len(pendientes) >= max_pendientes:
+                    resultado = resultado_descartado(modo, programado, inicio_prueba, epoch_prueba)
+                    RESULTADOS.incrementar(outcome=desenlace(resultado))
+                    al_completar({'url': urls[numero % len(urls)], 'mode': modo, 'indice': numero}, resultado)
+                    continue
+                pendiente = asyncio.ensure_future(enviar(numero, urls[numero % len(urls)], programado))
+                pendientes.add(pendiente)
+                pendiente.add_done_callback(pendientes.discard)
+            if pendientes:
+                await asyncio.gather(*pendientes)
+        finally:
+            for pendiente in list(pendientes):
+                pendiente.cancel()
+
+
+def ejecutar_trabajos(trabajos, al_completar, max_en_vuelo=MAX_EN_VUELO_DEFAULT, procesos_parseo=None,
+                      programacion=None, cache=None):
+    """Ejecuta una sola tanda de trabajos con un motor propio que se cierra al terminar"""
+    motor = MotorAnalisis(max_en_vuelo, procesos_parseo)
+    try:
+        asyncio.run(motor.ejecutar(trabajos, al_completar, programacion=programacion, cache=cache))
+    finally:
+        motor.cerrar()
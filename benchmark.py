@@ -0,0 +1,228 @@
+"""
+Benchmarks reproducibles contra el servidor de páginas sintéticas (fixture_server.py).
+
+    python benchmark.py --guardar baselines/$(date +%F).json
+    python benchmark.py --comparar baselines/2026-10-01.json
+
+Mide analizar_url (llamadas por segundo, tiempo y CPU por llamada, memoria
+pico) con páginas de distinto tamaño y estructura, y el throughput de
+ejecutar_analisis de punta a punta con distintas concurrencias. Con --comparar
+sale con código 1 si alguna métrica empeoró más que el umbral.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+
+from analyzer import analizar_url
+from fixture_server import ServidorFixture
+
+VERSION_BASELINE = 1
+UMBRAL_REGRESION_DEFAULT = 0.15
+
+# nombre: parámetros de /pagina
+ESCENARIOS = {
+    'pagina_1kb': {'kb': 1},
+    'pagina_10kb': {'kb': 10},
+    'pagina_100kb': {'kb': 100},
+    'pagina_1mb': {'kb': 1024},
+    'pagina_5mb': {'kb': 5 * 1024},
+    'muchas_etiquetas_500kb': {'kb': 500, 'densidad': 60},
+    'muchos_recursos': {'kb': 100, 'imagenes': 300, 'scripts': 100, 'css': 30},
+    'gzip_1mb': {'kb': 1024, 'gzip': 1},
+    'redirecciones': {'kb': 10, 'redirecciones': 3},
+    'headers_seguridad': {'kb': 10, 'seguridad': 1},
+    'latencia_50ms': {'kb': 10, 'latencia_ms': 50}
+}
+ESCENARIOS_LENTOS = ('pagina_5mb',)
+CONCURRENCIAS_E2E = (1, 10, 50)
+
+# Métricas comparables: True si más alto es mejor
+METRICAS = {
+    'llamadas_por_s': True,
+    'ms_mediana': False,
+    'ms_p95': False,
+    'cpu_ms_mediana': False,
+    'memoria_pico_kb': False,
+    'resultados_por_s': True
+}
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(int(round(p / 100 * (len(ordenados) - 1))), len(ordenados) - 1)]
+
+
+def medir_analizar_url(url, repeticiones, modo='warm'):
+    """
+    Llama a analizar_url repeticiones veces (después de una de calentamiento) y
+    mide tiempo real y CPU de cada llamada; la memoria pico se toma con
+    tracemalloc en una llamada aparte para no distorsionar los tiempos.
+    """
+    resultado = analizar_url(url, modo=modo)
+    if resultado['error']:
+        raise RuntimeError(f"{url}: {resultado['error']}")
+
+    tiempos = []
+    cpus = []
+    for _ in range(repeticiones):
+        inicio_cpu = time.process_time()
+        inicio = time.perf_counter()
+        analizar_url(url, modo=modo)
+        tiempos.append(time.perf_counter() - inicio)
+        cpus.append(time.process_time() - inicio_cpu)
+
+    tracemalloc.start()
+    analizar_url(url, modo=modo)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'tamano_kb': resultado['size_kb'],
+        'etiquetas': resultado['num_tags'],
+        'repeticiones': repeticiones,
+        'llamadas_por_s': round(repeticiones / sum(tiempos), 2),
+        'ms_mediana': round(statistics.median(tiempos) * 1000, 2),
+        'ms_p95': round(percentil(tiempos, 95) * 1000, 2),
+        'cpu_ms_mediana': round(statistics.median(cpus) * 1000, 2),
+        'memoria_pico_kb': round(pico / 1024, 1)
+    }
+
+
+def medir_ejecutar_analisis(servidor, concurrencias, num_urls, procesos_parseo=None):
+    """
+    Throughput de punta a punta de app.ejecutar_analisis sobre un PoolTareas
+    propio, con num_urls páginas distintas (para que la cache de métricas no
+    acierte) y cada nivel de concurrencia. Las tareas no entran al historial
+    de resultados: sus URLs del servidor local ensuciarían las líneas base.
+    """
+    os.environ.setdefault('WEB_ANALYZER_ALMACEN', 'memoria')
+    import app as aplicacion
+    from task_store import AlmacenMemoria, nueva_tarea
+    from worker_pool import PoolTareas
+
+    aplicacion.tasks = AlmacenMemoria()
+    pool = PoolTareas(max_tareas=1, max_en_vuelo=max(concurrencias), procesos_parseo=procesos_parseo)
+    pool.iniciar()
+    mediciones = {}
+    try:
+        for concurrencia in concurrencias:
+            payload = {
+                'mode': 'warm',
+                'concurrencia': concurrencia,
+                'urls': [
+                    {'url': servidor.url(kb=50, latencia_ms=20, semilla=f"{concurrencia}{i}"), 'repeticiones': 1}
+                    for i in range(num_urls)
+                ]
+            }
+            task_id = str(uuid.uuid4())
+            aplicacion.tasks[task_id] = nueva_tarea(num_urls)
+            inicio = time.perf_counter()
+            asyncio.run_coroutine_threadsafe(
+                aplicacion.ejecutar_analisis(task_id, payload, pool, historial=False), pool.loop
+            ).result()
+            duracion = time.perf_counter() - inicio
+
+            tiempos = [resultado['load_time_ms'] for _, resultado in aplicacion.tasks[task_id]['tabla'].filas()]
+            mediciones[str(concurrencia)] = {
+                'urls': num_urls,
+                'resultados_por_s': round(num_urls / duracion, 2),
+                'ms_mediana': round(statistics.median(tiempos), 2),
+                'ms_p95': round(percentil(tiempos, 95), 2)
+            }
+    finally:
+        pool.cerrar()
+    return mediciones
+
+
+def comparar(base, actual, umbral=UMBRAL_REGRESION_DEFAULT):
+    """Lista de (clave, métrica, valor base, valor actual, cambio relativo, es_regresion)"""
+    filas = []
+    for seccion in ('escenarios', 'e2e'):
+        for clave, metricas in actual.get(seccion, {}).items():
+            previas = base.get(seccion, {}).get(clave)
+            if not previas:
+                continue
+            for metrica, mayor_es_mejor in METRICAS.items():
+                if metrica not in metricas or not previas.get(metrica):
+                    continue
+                cambio = (metricas[metrica] - previas[metrica]) / previas[metrica]
+                regresion = -cambio > umbral if mayor_es_mejor else cambio > umbral
+                filas.append((f"{seccion}.{clave}", metrica, previas[metrica], metricas[metrica], cambio, regresion))
+    return filas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks de analizar_url y ejecutar_analisis')
+    parser.add_argument('--repeticiones', type=int, default=20, help='llamadas medidas por escenario')
+    parser.add_argument('--escenarios', nargs='*', choices=list(ESCENARIOS), help='solo estos escenarios')
+    parser.add_argument('--rapido', action='store_true', help='menos repeticiones y sin las páginas de 5 MB')
+    parser.add_argument('--sin-e2e', action='store_true', help='omitir ejecutar_analisis')
+    parser.add_argument('--urls-e2e', type=int, default=200)
+    parser.add_argument('--concurrencias', type=int, nargs='*', default=list(CONCURRENCIAS_E2E))
+    parser.add_argument('--procesos', type=int, default=None, help='procesos de parseo para el e2e')
+    parser.add_argument('--guardar', help='escribir los resultados (baseline) en este JSON')
+    parser.add_argument('--comparar', help='baseline JSON contra el que comparar')
+    parser.add_argument('--umbral', type=float, default=UMBRAL_REGRESION_DEFAULT,
+                        help='cambio relativo que cuenta como regresión (0.15 = 15%%)')
+    args = parser.parse_args(argv)
+
+    repeticiones = max(args.repeticiones // 4, 3) if args.rapido else args.repeticiones
+    nombres = args.escenarios or [
+        nombre for nombre in ESCENARIOS if not (args.rapido and nombre in ESCENARIOS_LENTOS)
+    ]
+    resultados = {
+        'version': VERSION_BASELINE,
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'repeticiones': repeticiones,
+        'escenarios': {},
+        'e2e': {}
+    }
+
+    with ServidorFixture() as servidor:
+        for nombre in nombres:
+            medicion = medir_analizar_url(servidor.url(**ESCENARIOS[nombre]), repeticiones)
+            resultados['escenarios'][nombre] = medicion
+            print(f"{nombre:24} {medicion['tamano_kb']:>9.1f} KB  {medicion['llamadas_por_s']:>8.2f}/s  "
+                  f"mediana {medicion['ms_mediana']:>8.2f} ms  CPU {medicion['cpu_ms_mediana']:>8.2f} ms  "
+                  f"pico {medicion['memoria_pico_kb']:>9.1f} KB", flush=True)
+        if not args.sin_e2e:
+            urls_e2e = max(args.urls_e2e // 4, 10) if args.rapido else args.urls_e2e
+            resultados['e2e'] = medir_ejecutar_analisis(servidor, args.concurrencias, urls_e2e, args.procesos)
+            for concurrencia, medicion in resultados['e2e'].items():
+                print(f"e2e concurrencia {concurrencia:>4}   {medicion['resultados_por_s']:>8.2f} resultados/s  "
+                      f"mediana {medicion['ms_mediana']:>8.2f} ms  p95 {medicion['ms_p95']:>8.2f} ms", flush=True)
+
+    if args.guardar:
+        carpeta = os.path.dirname(args.guardar)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        with open(args.guardar, 'w') as f:
+            json.dump(resultados, f, indent=2)
+        print(f"Baseline guardado en {args.guardar}")
+
+    if args.comparar:
+        with open(args.comparar) as f:
+            base = json.load(f)
+        filas = comparar(base, resultados, args.umbral)
+        regresiones = [fila for fila in filas if fila[5]]
+        for clave, metrica, previo, actual, cambio, regresion in filas:
+            marca = 'REGRESIÓN' if regresion else ''
+            print(f"{clave:36} {metrica:16} {previo:>10} -> {actual:>10} ({cambio:+.1%}) {marca}")
+        if regresiones:
+            print(f"{len(regresiones)} métricas empeoraron más de {args.umbral:.0%} respecto de {args.comparar}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
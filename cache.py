@@ -0,0 +1,61 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from multiprocessing.managers import BaseManager
+
+MAX_ENTRADAS_DEFAULT = 256
+
+
+def hash_contenido(contenido):
+    """Hash corto y rápido del cuerpo de la respuesta"""
+    return hashlib.blake2b(contenido, digest_size=16).hexdigest()
+
+
+class CacheMetricas:
+    """
+    LRU acotado de métricas estáticas (las que solo dependen del HTML) indexado
+    por el hash del cuerpo. Lleva la cuenta de aciertos y fallos.
+    """
+
+    def __init__(self, max_entradas=MAX_ENTRADAS_DEFAULT):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        """Retorna las métricas guardadas para la clave o None, contando el acierto o fallo"""
+        with self._lock:
+            valor = self._entradas.get(clave)
+            if valor is None:
+                self._misses += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self._hits += 1
+            return valor
+
+    def guardar(self, clave, valor):
+        """Guarda las métricas de una clave, descartando la menos usada si se llena"""
+        with self._lock:
+            self._entradas[clave] = valor
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def estadisticas(self):
+        """Retorna aciertos, fallos y ocupación de la cache"""
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'entradas': len(self._entradas),
+                'max_entradas': self.max_entradas
+            }
+
+
+class GestorCache(BaseManager):
+    """Manager que aloja una CacheMetricas en su propio proceso para compartirla entre workers"""
+
+
+GestorCache.register('CacheMetricas', CacheMetricas)
@@ -0,0 +1,374 @@
+"""
+Ejecuta un análisis desde la línea de comandos, sin el servidor web.
+
+    python cli.py jsons/prod_urls.json -o resultados.ndjson -r 3 -c 50
+
+Los resultados se escriben en NDJSON ({"url", "indice", "resultado"} por línea,
+el mismo formato que acepta /procesar-resultados) a medida que terminan. Cada
+tantos segundos se guarda un checkpoint junto a la salida; si la corrida se
+interrumpe, volver a ejecutar el mismo comando continúa donde quedó sin volver a
+descargar lo que ya estaba escrito.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import sys
+import time
+import zlib
+
+from async_engine import MotorAnalisis, MAX_EN_VUELO_DEFAULT
+from cache import GestorCache, MAX_ENTRADAS_DEFAULT
+from extractor import PARSERS_VALIDOS
+from fetcher import MODOS_VALIDOS, MODO_DEFAULT
+from profiling import ETAPAS_DEFAULT, PerfilTarea
+from scheduler import ESTRATEGIAS_VALIDAS, ESTRATEGIA_DEFAULT
+from subresources import METODOS_VALIDOS
+
+VERSION_CHECKPOINT = 1
+INTERVALO_CHECKPOINT_DEFAULT = 10
+# Las URLs se ejecutan por lotes para no crear de una vez las corrutinas de toda la lista
+LOTE_URLS_DEFAULT = 1000
+INTERVALO_PROGRESO = 1.0
+
+
+def leer_entrada(stream):
+    """
+    Lee la lista de URLs: un JSON con un array (de URLs o de {"url", "repeticiones"})
+    como los de jsons/, o una URL por línea (texto plano o NDJSON con esos mismos
+    valores). Retorna [(url, repeticiones o None)] sin URLs repetidas.
+    """
+    texto = stream.read()
+    if isinstance(texto, bytes):
+        texto = texto.decode('utf-8')
+
+    if texto.lstrip().startswith('['):
+        items = json.loads(texto)
+    else:
+        items = []
+        for linea in texto.splitlines():
+            linea = linea.strip()
+            if not linea or linea.startswith('#'):
+                continue
+            items.append(json.loads(linea) if linea[0] in '{"' else linea)
+
+    urls = {}
+    for item in items:
+        if isinstance(item, str):
+            url, repeticiones = item, None
+        elif isinstance(item, dict) and isinstance(item.get('url'), str):
+            url, repeticiones = item['url'], item.get('repeticiones')
+        else:
+            raise ValueError(f"Entrada no válida: {item!r}")
+        urls.setdefault(url.strip(), repeticiones)
+    return list(urls.items())
+
+
+class Corrida:
+    """
+    Numera los trabajos (URL × repetición) en el orden de la entrada y lleva un
+    mapa de bits de los completados. La huella identifica la lista de trabajos
+    para no reanudar un checkpoint con otra entrada.
+    """
+
+    def __init__(self, urls, repeticiones):
+        self.urls = [(url, reps or repeticiones) for url, reps in urls]
+        self._inicio = {}
+        total = 0
+        for url, reps in self.urls:
+            self._inicio[url] = (total, reps)
+            total += reps
+        self.total = total
+        self.completados = bytearray((total + 7) // 8)
+        self.hechos = 0
+
+        huella = hashlib.blake2b(digest_size=16)
+        for url, reps in self.urls:
+            huella.update(f"{url}\t{reps}\n".encode('utf-8'))
+        self.huella = huella.hexdigest()
+
+    def numero(self, url, indice):
+        inicio, reps = self._inicio.get(url, (None, 0))
+        if inicio is None or not 0 <= indice < reps:
+            return None
+        return inicio + indice
+
+    def hecho(self, numero):
+        return bool(self.completados[numero >> 3] & (1 << (numero & 7)))
+
+    def marcar(self, url, indice):
+        numero = self.numero(url, indice)
+        if numero is not None and not self.hecho(numero):
+            self.completados[numero >> 3] |= 1 << (numero & 7)
+            self.hechos += 1
+
+    def a_medias(self):
+        """URLs con la primera repetición completada y alguna otra pendiente"""
+        return {
+            url for url, (inicio, reps) in self._inicio.items()
+            if self.hecho(inicio) and not all(self.hecho(inicio + indice) for indice in range(1, reps))
+        }
+
+    def lotes(self, tamano, base_trabajo):
+        """Listas de trabajos pendientes, tamano URLs por lote"""
+        for i in range(0, len(self.urls), tamano):
+            lote = []
+            for url, reps in self.urls[i:i + tamano]:
+                inicio, _ = self._inicio[url]
+                for indice in range(reps):
+                    if not self.hecho(inicio + indice):
+                        lote.append(dict(base_trabajo, url=url, indice=indice))
+            if lote:
+                yield lote
+
+
+def leer_checkpoint(ruta, corrida):
+    """Carga los completados de un checkpoint y retorna hasta qué byte de la salida cubre (0 si no hay)"""
+    if not os.path.exists(ruta):
+        return 0
+    with open(ruta) as f:
+        datos = json.load(f)
+    if datos.get('version') != VERSION_CHECKPOINT or datos.get('huella') != corrida.huella:
+        raise ValueError(f"El checkpoint {ruta} es de otra lista de URLs; usar --reiniciar para empezar de cero")
+    completados = zlib.decompress(base64.b64decode(datos['completados']))
+    if len(completados) != len(corrida.completados):
+        raise ValueError(f"El checkpoint {ruta} está dañado")
+    corrida.completados[:] = completados
+    corrida.hechos = datos['hechos']
+    return datos['bytes_salida']
+
+
+def recuperar_salida(ruta, corrida, desde):
+    """
+    Marca como completados los resultados escritos después del checkpoint y
+    corta la salida al final de la última línea completa (una corrida
+    interrumpida puede dejar la última a medias).
+    """
+    if not os.path.exists(ruta):
+        return
+    with open(ruta, 'rb+') as f:
+        f.seek(desde)
+        valido = desde
+        for linea in f:
+            if not linea.endswith(b'\n'):
+                break
+            try:
+                item = json.loads(linea)
+            except ValueError:
+                break
+            corrida.marcar(item['url'], item['indice'])
+            valido += len(linea)
+        f.truncate(valido)
+
+
+def leer_bases(ruta, urls):
+    """
+    Resultados de la primera repetición (índice 0) de urls, leídos de la
+    salida. Al reanudar con --revalidar son la base de las solicitudes
+    condicionales de las repeticiones que faltan.
+    """
+    bases = {}
+    if not urls or not os.path.exists(ruta):
+        return bases
+    with open(ruta, 'rb') as f:
+        for linea in f:
+            # Filtro barato antes de decodificar: solo interesan las líneas de índice 0
+            if b'"indice": 0,' not in linea:
+                continue
+            item = json.loads(linea)
+            if item['indice'] == 0 and item['url'] in urls:
+                bases[item['url']] = item['resultado']
+                if len(bases) == len(urls):
+                    break
+    return bases
+
+
+def guardar_checkpoint(ruta, corrida, salida):
+    """Baja la salida a disco y escribe el checkpoint de forma atómica"""
+    salida.flush()
+    os.fsync(salida.fileno())
+    datos = {
+        'version': VERSION_CHECKPOINT,
+        'huella': corrida.huella,
+        'total': corrida.total,
+        'hechos': corrida.hechos,
+        'bytes_salida': salida.tell(),
+        'completados': base64.b64encode(zlib.compress(bytes(corrida.completados))).decode('ascii'),
+        'actualizado': time.time()
+    }
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w') as f:
+        json.dump(datos, f)
+    os.replace(temporal, ruta)
+
+
+def formatear_duracion(segundos):
+    segundos = int(segundos)
+    horas, resto = divmod(segundos, 3600)
+    return f"{horas}:{resto // 60:02d}:{resto % 60:02d}" if horas else f"{resto // 60:02d}:{resto % 60:02d}"
+
+
+class Progreso:
+    """Línea de progreso en stderr con throughput y ETA de la corrida actual"""
+
+    def __init__(self, corrida, stream=sys.stderr):
+        self.corrida = corrida
+        self.stream = stream
+        self.previos = corrida.hechos
+        self.errores = 0
+        self._inicio = time.monotonic()
+        self._ultimo = 0.0
+
+    def mostrar(self, forzar=False):
+        ahora = time.monotonic()
+        if not forzar and ahora - self._ultimo < INTERVALO_PROGRESO:
+            return
+        self._ultimo = ahora
+        nuevos = self.corrida.hechos - self.previos
+        tasa = nuevos / (ahora - self._inicio) if ahora > self._inicio else 0
+        restantes = self.corrida.total - self.corrida.hechos
+        eta = formatear_duracion(restantes / tasa) if tasa else '--:--'
+        porcentaje = self.corrida.hechos / self.corrida.total * 100 if self.corrida.total else 100
+        self.stream.write(
+            f"\r{self.corrida.hechos}/{self.corrida.total} ({porcentaje:.1f}%) · "
+            f"{tasa:.1f} resultados/s · {self.errores} errores · ETA {eta}   "
+        )
+        self.stream.flush()
+
+
+async def correr(corrida, args, salida, ruta_checkpoint, cache, bases=None):
+    motor = MotorAnalisis(args.concurrencia, args.procesos)
+    progreso = Progreso(corrida)
+    ultimo_checkpoint = time.monotonic()
+    programacion = {
+        'estrategia': args.estrategia,
+        'intervalo_ms': args.intervalo_ms,
+        'max_por_host': args.max_por_host
+    }
+    subrecursos = {'metodo': args.subrecursos} if args.subrecursos else None
+    compresion = {} if args.compresion else None
+    perfil = PerfilTarea() if args.perfil else None
+    base_trabajo = {
+        'mode': args.modo,
+        'parser': args.parser,
+        'repeticion': 1,
+        'revalidar': args.revalidar,
+        'max_bytes': args.max_cuerpo_kb * 1024 if args.max_cuerpo_kb else None,
+        'etapas': args.etapas
+    }
+
+    def al_completar(trabajo, resultado):
+        nonlocal ultimo_checkpoint
+        linea = json.dumps({'url': trabajo['url'], 'indice': trabajo['indice'], 'resultado': resultado}) + '\n'
+        salida.write(linea.encode('utf-8'))
+        corrida.marcar(trabajo['url'], trabajo['indice'])
+        if resultado.get('error'):
+            progreso.errores += 1
+        if time.monotonic() - ultimo_checkpoint >= args.intervalo_checkpoint:
+            guardar_checkpoint(ruta_checkpoint, corrida, salida)
+            ultimo_checkpoint = time.monotonic()
+        progreso.mostrar()
+
+    try:
+        for lote in corrida.lotes(args.lote, base_trabajo):
+            await motor.ejecutar(
+                lote, al_completar, max_en_vuelo=args.concurrencia, programacion=programacion,
+                cache=cache, subrecursos=subrecursos, perfil=perfil, compresion=compresion, bases=bases
+            )
+    finally:
+        guardar_checkpoint(ruta_checkpoint, corrida, salida)
+        if perfil is not None:
+            with open(args.perfil, 'w', encoding='utf-8') as f:
+                f.write(perfil.reporte())
+        progreso.mostrar(forzar=True)
+        progreso.stream.write('\n')
+        motor.cerrar(cancelar=corrida.hechos < corrida.total)
+    return progreso
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        description='Analiza una lista de URLs sin el servidor web, con resultados en NDJSON y checkpoints'
+    )
+    parser.add_argument('entrada', help="JSON con la lista de URLs, archivo con una URL por línea o '-' para stdin")
+    parser.add_argument('-o', '--salida', default='resultados.ndjson', help='archivo NDJSON de resultados')
+    parser.add_argument('--checkpoint', help='archivo de checkpoint (por defecto <salida>.checkpoint)')
+    parser.add_argument('--reiniciar', action='store_true', help='ignorar el checkpoint y la salida previa')
+    parser.add_argument('-r', '--repeticiones', type=int, default=1, help='repeticiones por URL')
+    parser.add_argument('-c', '--concurrencia', type=int, default=MAX_EN_VUELO_DEFAULT, help='descargas simultáneas')
+    parser.add_argument('--procesos', type=int, default=None, help='procesos de parseo')
+    parser.add_argument('--modo', choices=MODOS_VALIDOS, default=MODO_DEFAULT)
+    parser.add_argument('--parser', choices=PARSERS_VALIDOS, default=None)
+    parser.add_argument('--estrategia', choices=ESTRATEGIAS_VALIDAS, default=ESTRATEGIA_DEFAULT)
+    parser.add_argument('--intervalo-ms', type=int, default=0)
+    parser.add_argument('--max-por-host', type=int, default=6)
+    parser.add_argument('--revalidar', action='store_true', help='repeticiones condicionales con ETag / Last-Modified')
+    parser.add_argument('--subrecursos', choices=METODOS_VALIDOS, default=None, help='medir subrecursos con GET o HEAD')
+    parser.add_argument('--compresion', action='store_true',
+                        help='medir la compresión real con identity, gzip y br y simular gzip/brotli por nivel')
+    parser.add_argument('--max-cuerpo-kb', type=int, default=None)
+    parser.add_argument('--cache-max-entradas', type=int, default=MAX_ENTRADAS_DEFAULT)
+    parser.add_argument('--etapas', action='store_true', default=ETAPAS_DEFAULT,
+                        help='agregar a cada resultado el tiempo de cada etapa (stage_timings_ms)')
+    parser.add_argument('--perfil', help='perfilar el análisis con cProfile y escribir el reporte en este archivo')
+    parser.add_argument('--intervalo-checkpoint', type=float, default=INTERVALO_CHECKPOINT_DEFAULT,
+                        help='segundos entre checkpoints')
+    parser.add_argument('--lote', type=int, default=LOTE_URLS_DEFAULT, help='URLs por lote')
+    return parser
+
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    if args.repeticiones < 1 or args.concurrencia < 1 or args.lote < 1:
+        print("repeticiones, concurrencia y lote deben ser mayores que 0", file=sys.stderr)
+        return 2
+
+    try:
+        if args.entrada == '-':
+            urls = leer_entrada(sys.stdin)
+        else:
+            with open(args.entrada, encoding='utf-8') as f:
+                urls = leer_entrada(f)
+    except (OSError, ValueError) as e:
+        print(f"No se pudo leer la entrada: {e}", file=sys.stderr)
+        return 2
+
+    corrida = Corrida(urls, args.repeticiones)
+    ruta_checkpoint = args.checkpoint or args.salida + '.checkpoint'
+    if args.reiniciar:
+        for ruta in (args.salida, ruta_checkpoint):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+    try:
+        desde = leer_checkpoint(ruta_checkpoint, corrida)
+    except (ValueError, KeyError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    recuperar_salida(args.salida, corrida, desde)
+    if corrida.hechos:
+        print(f"Reanudando: {corrida.hechos}/{corrida.total} resultados ya estaban en {args.salida}", file=sys.stderr)
+    # Las repeticiones pendientes de una URL revalidan contra su primera repetición ya escrita
+    bases = leer_bases(args.salida, corrida.a_medias()) if args.revalidar else None
+
+    gestor_cache = GestorCache()
+    gestor_cache.start()
+    try:
+        with open(args.salida, 'ab') as salida:
+            cache = gestor_cache.CacheMetricas(args.cache_max_entradas)
+            progreso = asyncio.run(correr(corrida, args, salida, ruta_checkpoint, cache, bases))
+    except KeyboardInterrupt:
+        print(f"Interrumpido: {corrida.hechos}/{corrida.total} guardados, ejecutar de nuevo para continuar",
+              file=sys.stderr)
+        return 130
+    finally:
+        gestor_cache.shutdown()
+
+    print(f"Listo: {corrida.total} resultados en {args.salida} ({progreso.errores} con error en esta corrida)",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
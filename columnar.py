@@ -0,0 +1,402 @@
+import json
+import math
+import struct
+import sys
+import threading
+import zlib
+from array import array
+
+# Archivo columnar: MAGIA seguida de bloques [largo uint32][bloque comprimido con zlib].
+# Cada bloque agrupa hasta FILAS_POR_BLOQUE resultados y se lee por separado,
+# así que ni la escritura ni la lectura necesitan el archivo completo en memoria.
+MAGIA = b'WACR1\n'
+FILAS_POR_BLOQUE = 4096
+VERSION = 1
+
+_LARGO = struct.Struct('<I')
+
+# Tipos de columna: booleano, número, cadena internada u objeto JSON
+BOOLEANO = 'b'
+NUMERO = 'n'
+CADENA = 's'
+OBJETO = 'o'
+
+_NULO_BOOLEANO = -1
+_NULO_CADENA = -1
+
+
+def tipo_de(valor):
+    if isinstance(valor, bool):
+        return BOOLEANO
+    if isinstance(valor, (int, float)):
+        return NUMERO
+    if isinstance(valor, str):
+        return CADENA
+    return OBJETO
+
+
+def _little_endian(datos):
+    # Los arrays se guardan siempre en little-endian
+    if sys.byteorder == 'big':
+        datos.byteswap()
+    return datos
+
+
+class Columna:
+    """
+    Valores de una métrica en un array tipado: booleanos en array('b'),
+    números en array('d') (NaN = None) con una marca por valor de si era
+    entero, cadenas como códigos array('i') de un diccionario de cadenas
+    internadas y el resto como lista de objetos. El tipo se fija con el primer
+    valor no nulo; si después llega un valor de otro tipo la columna pasa a
+    ser de objetos.
+    """
+
+    def __init__(self, filas_previas=0):
+        self.tipo = None
+        self._nulos = filas_previas
+
+    def _inicializar(self, tipo):
+        filas_previas = self._nulos
+        self.tipo = tipo
+        if tipo == BOOLEANO:
+            self.datos = array('b', [_NULO_BOOLEANO]) * filas_previas
+        elif tipo == NUMERO:
+            self.datos = array('d', [math.nan]) * filas_previas
+            self.enteros = array('b', [0]) * filas_previas
+        elif tipo == CADENA:
+            self.datos = array('i', [_NULO_CADENA]) * filas_previas
+            self.diccionario = []
+            self._codigos = {}
+        else:
+            self.datos = [None] * filas_previas
+
+    def __len__(self):
+        return self._nulos if self.tipo is None else len(self.datos)
+
+    def agregar(self, valor):
+        if self.tipo is None:
+            if valor is None:
+                self._nulos += 1
+                return
+            self._inicializar(tipo_de(valor))
+        elif valor is not None and self.tipo != OBJETO and tipo_de(valor) != self.tipo:
+            self._a_objetos()
+
+        if self.tipo == BOOLEANO:
+            self.datos.append(_NULO_BOOLEANO if valor is None else int(valor))
+        elif self.tipo == NUMERO:
+            self.datos.append(math.nan if valor is None else valor)
+            self.enteros.append(isinstance(valor, int))
+        elif self.tipo == CADENA:
+            if valor is None:
+                self.datos.append(_NULO_CADENA)
+            else:
+                codigo = self._codigos.get(valor)
+                if codigo is None:
+                    codigo = self._codigos[valor] = len(self.diccionario)
+                    self.diccionario.append(valor)
+                self.datos.append(codigo)
+        else:
+            self.datos.append(valor)
+
+    def valor(self, i):
+        if self.tipo is None:
+            return None
+        dato = self.datos[i]
+        if self.tipo == BOOLEANO:
+            return None if dato == _NULO_BOOLEANO else bool(dato)
+        if self.tipo == NUMERO:
+            if math.isnan(dato):
+                return None
+            return int(dato) if self.enteros[i] else dato
+        if self.tipo == CADENA:
+            return None if dato == _NULO_CADENA else self.diccionario[dato]
+        return dato
+
+    def _a_objetos(self):
+        self.datos = [self.valor(i) for i in range(len(self.datos))]
+        self.tipo = OBJETO
+        self.enteros = None
+        self.diccionario = None
+        self._codigos = None
+
+
+class TablaResultados:
+    """
+    Resultados de una tarea en forma columnar: una Columna por métrica, la URL
+    internada y, por fila, el índice de su "forma" (la tupla de campos del
+    resultado) para reconstruir cada dict con sus mismas claves y orden.
+    Reemplaza la lista de dicts de ~50 claves por fila. Las filas solo se
+    agregan al final y no cambian, así que filas(cursor) sirve de cursor al
+    progreso incremental y a /stream.
+    """
+
+    def __init__(self):
+        self.columnas = {}
+        self.urls = Columna()
+        self.formas = []
+        self._indice_formas = {}
+        self._forma = array('H')
+        self._filas_por_url = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._forma)
+
+    def agregar(self, url, resultado):
+        with self._lock:
+            self._agregar(url, resultado)
+
+    def _agregar(self, url, resultado):
+        filas = len(self._forma)
+        forma = tuple(resultado)
+        indice_forma = self._indice_formas.get(forma)
+        if indice_forma is None:
+            indice_forma = self._indice_formas[forma] = len(self.formas)
+            self.formas.append(forma)
+            for campo in forma:
+                if campo not in self.columnas:
+                    self.columnas[campo] = Columna(filas)
+
+        for campo, columna in self.columnas.items():
+            columna.agregar(resultado.get(campo))
+        self.urls.agregar(url)
+        self._forma.append(indice_forma)
+        if url not in self._filas_por_url:
+            self._filas_por_url[url] = array('i')
+        self._filas_por_url[url].append(filas)
+
+    def resultado(self, i):
+        with self._lock:
+            return {campo: self.columnas[campo].valor(i) for campo in self.formas[self._forma[i]]}
+
+    def fila(self, i):
+        """(url, resultado) de la fila i"""
+        with self._lock:
+            url = self.urls.valor(i)
+        return url, self.resultado(i)
+
+    def filas(self, inicio=0, fin=None):
+        fin = len(self) if fin is None else min(fin, len(self))
+        for i in range(inicio, fin):
+            yield self.fila(i)
+
+    def lista_urls(self):
+        """URLs en orden de primera llegada"""
+        with self._lock:
+            return list(self._filas_por_url)
+
+    def resultados_de(self, url):
+        """Resultados de una URL en orden de llegada"""
+        with self._lock:
+            filas = list(self._filas_por_url.get(url, ()))
+        return [self.resultado(i) for i in filas]
+
+    def a_bytes(self):
+        """Serializa la tabla en el formato de archivo columnar"""
+        return b''.join(generar_columnar(self.filas()))
+
+    @classmethod
+    def desde_pares(cls, pares):
+        tabla = cls()
+        for url, resultado in pares:
+            tabla.agregar(url, resultado)
+        return tabla
+
+    @classmethod
+    def desde_bytes(cls, datos):
+        return cls.desde_pares(leer_resultados_columnar(_BytesStream(datos)))
+
+
+class _BytesStream:
+    """Stream de solo lectura sobre bytes sin copiarlos"""
+
+    def __init__(self, datos):
+        self._datos = memoryview(datos)
+        self._pos = 0
+
+    def read(self, n=-1):
+        fin = len(self._datos) if n < 0 else self._pos + n
+        trozo = self._datos[self._pos:fin].tobytes()
+        self._pos += len(trozo)
+        return trozo
+
+
+def _columna_de_bloque(nombre, valores, codigos_url, num_urls):
+    """
+    Codifica los valores de una columna para un bloque. Si todas las filas de
+    cada URL tienen el mismo valor (título, servidor, ...) se guarda un valor
+    por URL en lugar de uno por fila.
+    """
+    por_url = [None] * num_urls
+    visto = [False] * num_urls
+    estatico = True
+    for codigo, valor in zip(codigos_url, valores):
+        if not visto[codigo]:
+            visto[codigo] = True
+            por_url[codigo] = valor
+        elif por_url[codigo] != valor or type(por_url[codigo]) is not type(valor):
+            estatico = False
+            break
+    if estatico and num_urls < len(valores):
+        valores = por_url
+
+    tipos = {tipo_de(v) for v in valores if v is not None}
+    tipo = tipos.pop() if len(tipos) == 1 else OBJETO
+    descripcion = {'nombre': nombre, 'tipo': tipo, 'por_url': valores is por_url}
+
+    if tipo == OBJETO:
+        descripcion['valores'] = valores
+        return descripcion, b''
+
+    if tipo == BOOLEANO:
+        datos = array('b', (_NULO_BOOLEANO if v is None else int(v) for v in valores))
+    elif tipo == NUMERO:
+        datos = array('d', (math.nan if v is None else v for v in valores))
+        # Marca de entero por valor, para devolver 3 y no 3.0
+        datos.extend(array('d', (1.0 if isinstance(v, int) else 0.0 for v in valores)))
+    else:
+        diccionario, codigos = [], {}
+        datos = array('i')
+        for v in valores:
+            if v is None:
+                datos.append(_NULO_CADENA)
+                continue
+            if v not in codigos:
+                codigos[v] = len(diccionario)
+                diccionario.append(v)
+            datos.append(codigos[v])
+        descripcion['diccionario'] = diccionario
+
+    contenido = _little_endian(datos).tobytes()
+    descripcion['bytes'] = len(contenido)
+    return descripcion, contenido
+
+
+def _codificar_bloque(filas):
+    urls, indice_urls = [], {}
+    formas, indice_formas = [], {}
+    codigos_url = array('i')
+    codigos_forma = array('H')
+    campos = {}
+    for url, resultado in filas:
+        if url not in indice_urls:
+            indice_urls[url] = len(urls)
+            urls.append(url)
+        codigos_url.append(indice_urls[url])
+        forma = tuple(resultado)
+        if forma not in indice_formas:
+            indice_formas[forma] = len(formas)
+            formas.append(forma)
+            for campo in forma:
+                campos.setdefault(campo, None)
+        codigos_forma.append(indice_formas[forma])
+
+    columnas = []
+    contenidos = [_little_endian(array('i', codigos_url)).tobytes(), _little_endian(array('H', codigos_forma)).tobytes()]
+    for campo in campos:
+        valores = [resultado.get(campo) for _, resultado in filas]
+        descripcion, contenido = _columna_de_bloque(campo, valores, codigos_url, len(urls))
+        columnas.append(descripcion)
+        contenidos.append(contenido)
+
+    cabecera = json.dumps({
+        'version': VERSION,
+        'filas': len(filas),
+        'urls': urls,
+        'formas': formas,
+        'columnas': columnas
+    }, separators=(',', ':')).encode('utf-8')
+    bloque = zlib.compress(_LARGO.pack(len(cabecera)) + cabecera + b''.join(contenidos))
+    return _LARGO.pack(len(bloque)) + bloque
+
+
+def generar_columnar(pares, filas_por_bloque=FILAS_POR_BLOQUE):
+    """Genera los bytes del archivo columnar a partir de (url, resultado), bloque por bloque"""
+    yield MAGIA
+    filas = []
+    for par in pares:
+        filas.append(par)
+        if len(filas) >= filas_por_bloque:
+            yield _codificar_bloque(filas)
+            filas = []
+    if filas:
+        yield _codificar_bloque(filas)
+
+
+def _leer_exacto(stream, n):
+    partes = []
+    while n > 0:
+        trozo = stream.read(n)
+        if not trozo:
+            raise ValueError('Archivo columnar truncado')
+        partes.append(trozo)
+        n -= len(trozo)
+    return b''.join(partes)
+
+
+def _decodificar_array(tipo, contenido):
+    datos = array(tipo)
+    datos.frombytes(contenido)
+    return _little_endian(datos)
+
+
+def _valores_columna(descripcion, contenido):
+    tipo = descripcion['tipo']
+    if tipo == OBJETO:
+        return descripcion['valores']
+    if tipo == BOOLEANO:
+        return [None if v == _NULO_BOOLEANO else bool(v) for v in _decodificar_array('b', contenido)]
+    if tipo == NUMERO:
+        datos = _decodificar_array('d', contenido)
+        n = len(datos) // 2
+        return [
+            None if math.isnan(v) else (int(v) if entero else v)
+            for v, entero in zip(datos[:n], datos[n:])
+        ]
+    diccionario = descripcion['diccionario']
+    return [None if v == _NULO_CADENA else diccionario[v] for v in _decodificar_array('i', contenido)]
+
+
+def _decodificar_bloque(bloque):
+    datos = memoryview(zlib.decompress(bloque))
+    (largo_cabecera,) = _LARGO.unpack_from(datos)
+    pos = _LARGO.size + largo_cabecera
+    cabecera = json.loads(datos[_LARGO.size:pos].tobytes())
+    filas = cabecera['filas']
+
+    codigos_url = _decodificar_array('i', datos[pos:pos + 4 * filas].tobytes())
+    pos += 4 * filas
+    codigos_forma = _decodificar_array('H', datos[pos:pos + 2 * filas].tobytes())
+    pos += 2 * filas
+
+    valores = {}
+    for descripcion in cabecera['columnas']:
+        largo = descripcion.get('bytes', 0)
+        columna = _valores_columna(descripcion, datos[pos:pos + largo].tobytes())
+        pos += largo
+        valores[descripcion['nombre']] = (columna, descripcion['por_url'])
+
+    urls, formas = cabecera['urls'], cabecera['formas']
+    for i in range(filas):
+        codigo_url = codigos_url[i]
+        resultado = {}
+        for campo in formas[codigos_forma[i]]:
+            columna, por_url = valores[campo]
+            resultado[campo] = columna[codigo_url if por_url else i]
+        yield urls[codigo_url], resultado
+
+
+def leer_resultados_columnar(stream):
+    """Entrega (url, resultado) desde un archivo columnar, bloque por bloque"""
+    if _leer_exacto(stream, len(MAGIA)) != MAGIA:
+        raise ValueError('No es un archivo columnar de resultados')
+    while True:
+        prefijo = stream.read(_LARGO.size)
+        if not prefijo:
+            return
+        if len(prefijo) < _LARGO.size:
+            prefijo += _leer_exacto(stream, _LARGO.size - len(prefijo))
+        (largo,) = _LARGO.unpack(prefijo)
+        yield from _decodificar_bloque(_leer_exacto(stream, largo))
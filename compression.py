@@ -0,0 +1,257 @@
+"""
+Compresión real de la transferencia: cada página se pide con Accept-Encoding
+identity, gzip y br y se cuentan los bytes que cruzan la red (sin
+descomprimir), los bytes decodificados y el tiempo de cada descarga. Además se
+calcula localmente, en el pool de procesos, lo que lograrían gzip y brotli con
+distintos niveles sobre el mismo cuerpo, para saber cuántos KB (y cuánto
+tiempo) desperdicia la configuración actual del servidor o del CDN.
+
+brotli es opcional: sin el paquete no se simulan sus niveles ni se decodifican
+las respuestas br. Sus bytes en la red se siguen midiendo, pero si br es la
+mejor codificación servida el ratio de transferencia queda marcado como no
+disponible.
+"""
+import asyncio
+import time
+import zlib
+
+from fetcher import MAX_BYTES_CUERPO_DEFAULT, TAMANO_BLOQUE_DESCARGA, obtener_sesion
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CODIFICACIONES = ('identity', 'gzip', 'br')
+NIVELES_GZIP = (1, 6, 9)
+NIVELES_BROTLI = (1, 5, 11)
+MAX_NIVEL = {'gzip': 9, 'br': 11}
+CONCURRENCIA_DEFAULT = 4
+TIMEOUT_COMPRESION = 30
+
+
+class _Decodificador:
+    """Cuenta los bytes decodificados de un cuerpo comprimido sin guardarlos"""
+
+    def __init__(self, codificacion):
+        self.bytes = 0
+        self._deflate = codificacion == 'deflate'
+        self._primer_bloque = True
+        if codificacion in ('gzip', 'x-gzip', 'deflate'):
+            # 32 + MAX_WBITS detecta la cabecera gzip o zlib
+            self._zlib = zlib.decompressobj(32 + zlib.MAX_WBITS)
+            self._brotli = None
+        elif codificacion == 'br':
+            if brotli is None:
+                raise ValueError('brotli no está instalado: no se pueden decodificar respuestas br')
+            self._zlib = None
+            self._brotli = brotli.Decompressor()
+        elif codificacion in ('', 'identity'):
+            self._zlib = self._brotli = None
+        else:
+            raise ValueError(f"Codificación no soportada: {codificacion}")
+        self._identidad = self._zlib is None and self._brotli is None
+
+    def agregar(self, bloque):
+        if self._identidad:
+            self.bytes += len(bloque)
+        elif self._brotli is not None:
+            self.bytes += len(self._brotli.process(bloque))
+        else:
+            try:
+                self._descomprimir(bloque)
+            except zlib.error:
+                # Muchos servidores mandan deflate crudo, sin la cabecera zlib
+                if not (self._deflate and self._primer_bloque):
+                    raise
+                self._zlib = zlib.decompressobj(-zlib.MAX_WBITS)
+                self.bytes = 0
+                self._descomprimir(bloque)
+        self._primer_bloque = False
+
+    def _descomprimir(self, datos):
+        # Con max_length un cuerpo que se expande mucho no se arma entero en memoria
+        while datos:
+            self.bytes += len(self._zlib.decompress(datos, TAMANO_BLOQUE_DESCARGA))
+            datos = self._zlib.unconsumed_tail
+
+
+def medir_codificacion(url, codificacion, max_bytes=None, timeout=TIMEOUT_COMPRESION):
+    """
+    Pide url con la sesión keep-alive de su host y Accept-Encoding codificacion.
+    Retorna el status, la Content-Encoding que usó el servidor, los bytes en la
+    red (wire_bytes, leídos del stream crudo hasta max_bytes), los
+    decodificados (None si no se pueden decodificar aquí, con el motivo en
+    decode_error), ttfb_ms y ms hasta el último byte.
+    """
+    max_bytes = max_bytes or MAX_BYTES_CUERPO_DEFAULT
+    inicio = time.perf_counter()
+    medicion = {
+        'status': 0,
+        'content_encoding': None,
+        'wire_bytes': 0,
+        'decoded_bytes': None,
+        'decode_error': None,
+        'ttfb_ms': None,
+        'ms': None,
+        'truncated': False,
+        'error': None
+    }
+    try:
+        sesion = obtener_sesion(url)
+        with sesion.get(url, headers={'Accept-Encoding': codificacion}, timeout=timeout, stream=True) as response:
+            medicion['ttfb_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+            medicion['status'] = response.status_code
+            servida = response.headers.get('Content-Encoding', '').strip().lower() or 'identity'
+            medicion['content_encoding'] = servida
+            try:
+                decodificador = _Decodificador(servida)
+            except ValueError as e:
+                decodificador = None
+                medicion['decode_error'] = str(e)
+            for bloque in response.raw.stream(TAMANO_BLOQUE_DESCARGA, decode_content=False):
+                restante = max_bytes - medicion['wire_bytes']
+                if len(bloque) > restante:
+                    bloque = bloque[:restante]
+                    medicion['truncated'] = True
+                medicion['wire_bytes'] += len(bloque)
+                if decodificador is not None:
+                    try:
+                        decodificador.agregar(bloque)
+                    except Exception as e:
+                        decodificador = None
+                        medicion['decode_error'] = f"Cuerpo {servida} no decodificable: {e}"
+                if medicion['truncated']:
+                    break
+            if decodificador is not None:
+                medicion['decoded_bytes'] = decodificador.bytes
+            if not response.ok:
+                medicion['error'] = f"HTTP {response.status_code}"
+    except Exception as e:
+        medicion['error'] = str(e)
+    medicion['ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+    return medicion
+
+
+def medir_codificaciones(url, codificaciones=CODIFICACIONES, max_bytes=None):
+    """
+    Mide url con cada codificación, una después de la otra para que las
+    descargas no compitan por el ancho de banda y sus tiempos sean comparables.
+    """
+    return {codificacion: medir_codificacion(url, codificacion, max_bytes) for codificacion in codificaciones}
+
+
+def simular_compresion(contenido, niveles_gzip=NIVELES_GZIP, niveles_brotli=NIVELES_BROTLI):
+    """
+    Comprime el cuerpo decodificado con gzip y brotli en cada nivel y retorna
+    {'gzip-6': {'bytes', 'ratio', 'ms'}, ...}; ratio es el porcentaje del
+    tamaño original. Sin el paquete brotli sus niveles no aparecen. Es
+    CPU pura: se ejecuta en el pool de procesos.
+    """
+    simulados = {}
+    original = len(contenido) or 1
+    for nivel in niveles_gzip:
+        inicio = time.perf_counter()
+        # wbits 31: contenedor gzip, el mismo que viaja con Content-Encoding: gzip
+        compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+        tamano = len(compresor.compress(contenido)) + len(compresor.flush())
+        simulados[f'gzip-{nivel}'] = {
+            'bytes': tamano,
+            'ratio': round(tamano / original * 100, 2),
+            'ms': round((time.perf_counter() - inicio) * 1000, 3)
+        }
+    if brotli is not None:
+        for nivel in niveles_brotli:
+            inicio = time.perf_counter()
+            tamano = len(brotli.compress(contenido, quality=nivel))
+            simulados[f'br-{nivel}'] = {
+                'bytes': tamano,
+                'ratio': round(tamano / original * 100, 2),
+                'ms': round((time.perf_counter() - inicio) * 1000, 3)
+            }
+    return simulados
+
+
+def resumir_compresion(mediciones, simulados, truncado=False):
+    """
+    Campos de compresión de una página a partir de las mediciones por
+    codificación y la simulación local. La mejor codificación servida es la
+    de menos bytes en la red entre las que respondieron bien, y su ratio son
+    sus bytes en la red sobre sus bytes decodificados (de la misma descarga).
+    Lo desperdiciado es la diferencia con la mejor simulada, y su costo en ms
+    se estima con el throughput de la descarga identity (la que no depende de
+    la compresión). Si el cuerpo simulado estaba truncado no se compara con
+    la página entera y el desperdicio queda en None. Si la mejor no se pudo
+    decodificar (por ejemplo br sin el paquete brotli) el ratio queda en None
+    y el motivo en transfer_compression_ratio_error.
+    """
+    validas = {
+        codificacion: medicion for codificacion, medicion in mediciones.items()
+        if not medicion['error'] and not medicion['truncated']
+    }
+    servidas = {medicion['content_encoding'] for medicion in validas.values()}
+    mejor = min(validas, key=lambda codificacion: validas[codificacion]['wire_bytes'], default=None)
+    mejor_simulada = min(simulados, key=lambda clave: simulados[clave]['bytes'], default=None)
+
+    campos = {
+        'transfer_encodings': mediciones,
+        'compression_simulated': simulados,
+        'compression_served': validas[mejor]['content_encoding'] if mejor else None,
+        'compression_wire_kb': round(validas[mejor]['wire_bytes'] / 1024, 2) if mejor else None,
+        'transfer_compression_ratio': None,
+        'transfer_compression_ratio_error': None,
+        'compression_best_simulated': mejor_simulada,
+        'compression_waste_kb': None,
+        'compression_waste_ms': None
+    }
+    if mejor is None:
+        return campos
+
+    # Medido con cada codificación: reemplaza al gzip_enabled que solo mira la respuesta original
+    campos['gzip_enabled'] = bool(servidas & {'gzip', 'x-gzip'})
+    campos['brotli_enabled'] = 'br' in servidas
+    bytes_red = validas[mejor]['wire_bytes']
+    decodificados = validas[mejor]['decoded_bytes']
+    if decodificados:
+        campos['transfer_compression_ratio'] = round(bytes_red / decodificados * 100, 2)
+    elif decodificados is None:
+        campos['transfer_compression_ratio_error'] = validas[mejor]['decode_error']
+    if mejor_simulada is not None and not truncado:
+        desperdicio = max(bytes_red - simulados[mejor_simulada]['bytes'], 0)
+        campos['compression_waste_kb'] = round(desperdicio / 1024, 2)
+        identidad = validas.get('identity')
+        if identidad and identidad['content_encoding'] == 'identity':
+            lectura_ms = identidad['ms'] - identidad['ttfb_ms']
+            if lectura_ms > 0 and identidad['wire_bytes']:
+                campos['compression_waste_ms'] = round(desperdicio / (identidad['wire_bytes'] / lectura_ms), 2)
+    return campos
+
+
+class MedidorCompresion:
+    """
+    Mide la compresión de las páginas de una tarea. Se usa desde el loop de la
+    tarea; las descargas van al pool de hilos y la simulación al de procesos
+    que se le pasen, en paralelo, con a lo sumo `concurrencia` páginas a la vez.
+    """
+
+    def __init__(self, niveles_gzip=NIVELES_GZIP, niveles_brotli=NIVELES_BROTLI,
+                 concurrencia=CONCURRENCIA_DEFAULT):
+        for codificacion, niveles in (('gzip', niveles_gzip), ('br', niveles_brotli)):
+            if any(not 0 <= nivel <= MAX_NIVEL[codificacion] for nivel in niveles):
+                raise ValueError(f"Niveles de {codificacion} no válidos")
+        self.niveles_gzip = tuple(niveles_gzip)
+        self.niveles_brotli = tuple(niveles_brotli)
+        self._limite = asyncio.Semaphore(concurrencia)
+
+    async def medir_pagina(self, url, contenido, hilos, procesos, max_bytes=None, truncado=False):
+        """
+        Mide una página con su cuerpo decodificado (truncado si la descarga
+        original se cortó en max_bytes) y retorna sus campos (ver resumir_compresion)
+        """
+        loop = asyncio.get_running_loop()
+        async with self._limite:
+            mediciones, simulados = await asyncio.gather(
+                loop.run_in_executor(hilos, medir_codificaciones, url, CODIFICACIONES, max_bytes),
+                loop.run_in_executor(procesos, simular_compresion, contenido, self.niveles_gzip, self.niveles_brotli)
+            )
+        return resumir_compresion(mediciones, simulados, truncado)
@@ -0,0 +1,312 @@
+"""
+Rastreo de un sitio: a partir de URLs semilla o de un sitemap.xml (también
+índices de sitemaps) se descubren los enlaces del mismo sitio y se analizan
+mientras el rastreo sigue. La memoria queda acotada aunque el sitio tenga
+cientos de miles de páginas: las URLs ya vistas se recuerdan en un filtro de
+Bloom de tamaño fijo y la frontera (URLs por visitar) tiene un máximo.
+"""
+import gzip
+import hashlib
+import io
+import math
+import time
+from collections import deque
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+from xml.etree.ElementTree import ParseError, iterparse
+
+from fetcher import descargar
+
+PROFUNDIDAD_DEFAULT = 2
+MAX_PROFUNDIDAD = 50
+MAX_PAGINAS_DEFAULT = 1000
+MAX_PAGINAS = 1_000_000
+MAX_FRONTERA_DEFAULT = 50_000
+RETRASO_HOST_MS_DEFAULT = 100
+# Dimensionado del filtro de URLs vistas: con 1M de URLs y 0.1% de falsos
+# positivos ocupa ~1.8 MB, y no crece aunque se descubran más
+CAPACIDAD_VISTOS_DEFAULT = 1_000_000
+TASA_FALSOS_POSITIVOS = 0.001
+MAX_SITEMAPS = 1000
+MAX_BYTES_SITEMAP = 50 * 1024 * 1024
+TIMEOUT_SITEMAP = 30
+
+PUERTOS_DEFAULT = {'http': 80, 'https': 443}
+# Parámetros que solo rastrean campañas: dos URLs que difieren en ellos son la misma página
+PARAMETROS_SEGUIMIENTO = frozenset(['gclid', 'fbclid', 'msclkid', 'mc_cid', 'mc_eid'])
+# Enlaces a archivos que no son páginas HTML
+EXTENSIONES_IGNORADAS = frozenset([
+    'pdf', 'zip', 'gz', 'tar', 'rar', '7z', 'exe', 'dmg', 'msi', 'apk',
+    'jpg', 'jpeg', 'png', 'gif', 'webp', 'svg', 'ico', 'bmp', 'tif', 'tiff', 'avif',
+    'mp3', 'mp4', 'avi', 'mov', 'webm', 'ogg', 'wav', 'css', 'js', 'json', 'xml',
+    'woff', 'woff2', 'ttf', 'eot', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'csv'
+])
+
+
+def canonicalizar_url(url, base=None):
+    """
+    Forma canónica de una URL para deduplicar: absoluta (resuelta contra base),
+    solo http(s), esquema y host en minúsculas, sin puerto por defecto, sin
+    fragmento, ruta vacía como "/" y parámetros de la query ordenados sin los
+    de seguimiento (utm_*, gclid...). Retorna None si no es una página http(s).
+    """
+    try:
+        if base is not None:
+            url = urljoin(base, url.strip())
+        partes = urlsplit(url.strip())
+        esquema = partes.scheme.lower()
+        if esquema not in PUERTOS_DEFAULT or not partes.hostname:
+            return None
+        host = partes.hostname.rstrip('.')
+        if ':' in host:
+            host = f"[{host}]"
+        if partes.port and partes.port != PUERTOS_DEFAULT[esquema]:
+            host = f"{host}:{partes.port}"
+    except ValueError:
+        return None
+
+    ruta = partes.path or '/'
+    if '/.' in ruta:
+        # Resolver los segmentos . y .. (urljoin los quita de la ruta)
+        ruta = urlsplit(urljoin('http://h/', ruta)).path
+    archivo = ruta.rsplit('/', 1)[-1]
+    if '.' in archivo and archivo.rpartition('.')[2].lower() in EXTENSIONES_IGNORADAS:
+        return None
+
+    query = ''
+    if partes.query:
+        parametros = [
+            (clave, valor) for clave, valor in parse_qsl(partes.query, keep_blank_values=True)
+            if not clave.startswith('utm_') and clave not in PARAMETROS_SEGUIMIENTO
+        ]
+        query = urlencode(sorted(parametros))
+    return urlunsplit((esquema, host, ruta, query, ''))
+
+
+def host_canonico(url):
+    """Host (con puerto si no es el de por defecto) de una URL canónica"""
+    return urlsplit(url).netloc
+
+
+def enlaces_de_pagina(url_pagina, metricas_dom, headers=None):
+    """
+    Enlaces <a>/<area> de una página ya parseada (metricas_dom de
+    extractor.extraer_metricas) en forma canónica y sin repetidos. Se respetan
+    <base href>, rel="nofollow" (ya descartados por el extractor) y el nofollow
+    de <meta name="robots"> o de la cabecera X-Robots-Tag.
+    """
+    robots = f"{metricas_dom.get('robots_meta') or ''} {(headers or {}).get('X-Robots-Tag', '')}".lower()
+    if 'nofollow' in robots or 'none' in robots.split():
+        return []
+    base = urljoin(url_pagina, metricas_dom['base_href']) if metricas_dom.get('base_href') else url_pagina
+    enlaces = {}
+    for href in metricas_dom.get('enlaces', ()):
+        canonica = canonicalizar_url(href, base)
+        if canonica is not None:
+            enlaces[canonica] = None
+    return list(enlaces)
+
+
+class FiltroBloom:
+    """
+    Conjunto aproximado de cadenas en un bytearray de tamaño fijo. Puede dar
+    falsos positivos (una URL nueva que parece vista, con probabilidad
+    tasa_error mientras no se supere la capacidad) pero nunca falsos negativos.
+    Las k posiciones salen de un solo hash BLAKE2b por doble hashing.
+    """
+
+    def __init__(self, capacidad=CAPACIDAD_VISTOS_DEFAULT, tasa_error=TASA_FALSOS_POSITIVOS):
+        if capacidad < 1 or not 0 < tasa_error < 1:
+            raise ValueError('capacidad debe ser mayor que 0 y tasa_error estar entre 0 y 1')
+        self.capacidad = capacidad
+        self.tasa_error = tasa_error
+        self.num_bits = max(8, math.ceil(-capacidad * math.log(tasa_error) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacidad * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.elementos = 0
+
+    def _posiciones(self, clave):
+        digest = hashlib.blake2b(clave.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, clave):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._posiciones(clave))
+
+    def agregar(self, clave):
+        """Agrega la clave y retorna True si no estaba (o False si ya parecía estar)"""
+        bits = self.bits
+        nueva = False
+        for p in self._posiciones(clave):
+            mascara = 1 << (p & 7)
+            if not bits[p >> 3] & mascara:
+                bits[p >> 3] |= mascara
+                nueva = True
+        if nueva:
+            self.elementos += 1
+        return nueva
+
+    def __len__(self):
+        return self.elementos
+
+    @property
+    def bytes(self):
+        return len(self.bits)
+
+
+class FronteraRastreo:
+    """
+    URLs por visitar de un rastreo, con una cola por host que se recorre en
+    round-robin y un retraso mínimo entre dos descargas que empiezan en el
+    mismo host (cortesía con el servidor). Solo se admiten URLs de los hosts
+    del sitio (los de las semillas y sitemaps), hasta max_profundidad saltos
+    desde una semilla y hasta max_paginas en total; si la frontera ya tiene
+    max_frontera URLs las nuevas se descartan sin marcarlas como vistas, así
+    pueden volver a entrar cuando otra página las enlace.
+    """
+
+    def __init__(self, max_profundidad=PROFUNDIDAD_DEFAULT, max_paginas=MAX_PAGINAS_DEFAULT,
+                 max_frontera=MAX_FRONTERA_DEFAULT, retraso_ms=RETRASO_HOST_MS_DEFAULT,
+                 capacidad_vistos=CAPACIDAD_VISTOS_DEFAULT):
+        self.max_profundidad = max_profundidad
+        self.max_paginas = max_paginas
+        self.max_frontera = max_frontera
+        self.retraso = max(retraso_ms, 0) / 1000
+        self.vistos = FiltroBloom(max(capacidad_vistos, max_paginas))
+        self.hosts = set()
+        self._colas = {}
+        self._turno = deque()
+        self._siguiente_host = {}
+        self.pendientes = 0
+        self.admitidas = 0
+        self.entregadas = 0
+        self.repetidas = 0
+        self.externas = 0
+        self.descartadas = 0
+        self.errores_sitemap = []
+
+    def __len__(self):
+        return self.pendientes
+
+    def agregar_host(self, url):
+        """Suma el host de url a los del sitio"""
+        # Se canonicaliza la raíz: la URL de un sitemap (.xml) no pasaría como página
+        canonica = canonicalizar_url('/', url)
+        if canonica is not None:
+            self.hosts.add(host_canonico(canonica))
+
+    def completa(self):
+        """True si ya no se van a admitir más URLs (se llegó a max_paginas)"""
+        return self.admitidas >= self.max_paginas
+
+    def hay_lugar(self):
+        return not self.completa() and self.pendientes < self.max_frontera
+
+    def agregar(self, url, profundidad):
+        """Admite una URL canónica si es del sitio, nueva y entra en los límites. Retorna True si la admitió"""
+        if profundidad > self.max_profundidad or self.completa():
+            return False
+        host = host_canonico(url)
+        if host not in self.hosts:
+            self.externas += 1
+            return False
+        if self.pendientes >= self.max_frontera:
+            if url in self.vistos:
+                self.repetidas += 1
+            else:
+                self.descartadas += 1
+            return False
+        # Un solo cálculo de hashes para consultar y marcar
+        if not self.vistos.agregar(url):
+            self.repetidas += 1
+            return False
+        if host not in self._colas:
+            self._colas[host] = deque()
+            self._turno.append(host)
+        self._colas[host].append((url, profundidad))
+        self.pendientes += 1
+        self.admitidas += 1
+        return True
+
+    def agregar_semilla(self, url):
+        """Admite una URL de las semillas o de un sitemap (sin canonicalizar, profundidad 0)"""
+        canonica = canonicalizar_url(url)
+        return canonica is not None and self.agregar(canonica, 0)
+
+    def siguiente(self, ahora=None):
+        """
+        Retorna (url, profundidad) del próximo host al que ya se le puede pedir,
+        o los segundos que faltan para que alguno esté listo, o None si la
+        frontera está vacía.
+        """
+        if not self.pendientes:
+            return None
+        ahora = time.perf_counter() if ahora is None else ahora
+        espera = None
+        for _ in range(len(self._turno)):
+            host = self._turno[0]
+            self._turno.rotate(-1)
+            listo = self._siguiente_host.get(host, 0)
+            if listo > ahora:
+                espera = listo - ahora if espera is None else min(espera, listo - ahora)
+                continue
+            cola = self._colas[host]
+            url, profundidad = cola.popleft()
+            if not cola:
+                # Sin URLs pendientes el host no ocupa lugar en la frontera
+                del self._colas[host]
+                self._turno.remove(host)
+            if self.retraso:
+                self._siguiente_host[host] = ahora + self.retraso
+            self.pendientes -= 1
+            self.entregadas += 1
+            return url, profundidad
+        return espera
+
+    def estadisticas(self):
+        return {
+            'admitidas': self.admitidas,
+            'visitadas': self.entregadas,
+            'en_frontera': self.pendientes,
+            'repetidas': self.repetidas,
+            'externas': self.externas,
+            'descartadas': self.descartadas,
+            'hosts': sorted(self.hosts),
+            'vistas': len(self.vistos),
+            'vistos_kb': round(self.vistos.bytes / 1024, 1),
+            'errores_sitemap': self.errores_sitemap
+        }
+
+
+def leer_sitemap(contenido):
+    """
+    Lee un sitemap (urlset) o un índice de sitemaps (sitemapindex), comprimido
+    con gzip o no. Retorna (es_indice, locs) con las URLs de sus <loc>. Se lee
+    con iterparse liberando cada elemento, sin armar el árbol completo.
+    """
+    if contenido[:2] == b'\x1f\x8b':
+        contenido = gzip.decompress(contenido)
+    es_indice = None
+    locs = []
+    try:
+        for evento, elemento in iterparse(io.BytesIO(contenido), events=('start', 'end')):
+            etiqueta = elemento.tag.rsplit('}', 1)[-1]
+            if evento == 'start':
+                if es_indice is None:
+                    es_indice = etiqueta == 'sitemapindex'
+                continue
+            if etiqueta == 'loc' and elemento.text and elemento.text.strip():
+                locs.append(elemento.text.strip())
+            elif etiqueta in ('url', 'sitemap'):
+                elemento.clear()
+    except ParseError as e:
+        raise ValueError(f"Sitemap no válido: {e}")
+    return bool(es_indice), locs
+
+
+def descargar_sitemap(url, modo):
+    """Descarga y lee un sitemap (ver leer_sitemap). Pensada para el pool de hilos del motor"""
+    response, _ = descargar(url, modo, TIMEOUT_SITEMAP, max_bytes=MAX_BYTES_SITEMAP)
+    response.raise_for_status()
+    return leer_sitemap(response.content)
@@ -0,0 +1,385 @@
+import argparse
+import asyncio
+import itertools
+import os
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing.managers import BaseManager
+
+from analyzer import resultado_error
+from async_engine import MotorAnalisis, MAX_EN_VUELO_DEFAULT
+from cache import GestorCache, MAX_ENTRADAS_DEFAULT
+
+# Dirección en la que el coordinador (la app) publica la cola y clave compartida con los workers
+# (obligatoria: sin clave el coordinador no arranca)
+DIRECCION_DEFAULT = os.environ.get('WEB_ANALYZER_COORDINADOR', '127.0.0.1:5002')
+CLAVE_DEFAULT = os.environ.get('WEB_ANALYZER_CLAVE_COORDINADOR') or None
+# Segundos que un worker tiene para entregar o renovar un lease antes de que sus trabajos se reasignen
+DURACION_LEASE_DEFAULT = int(os.environ.get('WEB_ANALYZER_DURACION_LEASE', 30))
+MAX_INTENTOS_DEFAULT = 3
+TRABAJOS_POR_LEASE_DEFAULT = 20
+INTERVALO_REVISION = 1.0
+ESPERA_SIN_TRABAJO = 0.5
+
+
+def parsear_direccion(direccion):
+    host, _, puerto = direccion.rpartition(':')
+    return host or '127.0.0.1', int(puerto)
+
+
+def clave_coordinador(direccion, clave=None):
+    """
+    Clave con la que el coordinador autentica a los workers. La cola viaja
+    con pickle, así que quien tenga la clave puede ejecutar código en el
+    coordinador: siempre tiene que configurarse, nunca se genera ni se muestra.
+    """
+    if not clave:
+        raise ValueError(
+            f"Configurar WEB_ANALYZER_CLAVE_COORDINADOR con una clave propia para publicar la cola en {direccion}"
+        )
+    return clave
+
+
+class ColaTrabajos:
+    """
+    Cola de trabajos del coordinador. Los workers piden leases (un grupo de
+    trabajos de una misma tarea), entregan cada resultado apenas lo tienen y
+    renuevan el lease mientras trabajan. Un lease que vence sin renovarse
+    devuelve sus trabajos sin entregar a la cola; un trabajo que ya salió en
+    max_intentos leases se da por fallido en lugar de volver a asignarse. Si
+    un trabajo llega dos veces (un worker lento cuyo lease ya se había
+    reasignado) vale el primer resultado.
+    """
+
+    def __init__(self, duracion_lease=DURACION_LEASE_DEFAULT, max_intentos=MAX_INTENTOS_DEFAULT):
+        self.duracion_lease = duracion_lease
+        self.max_intentos = max_intentos
+        self._lock = threading.Lock()
+        self._tareas = {}
+        self._pendientes = deque()  # (tarea_id, numero)
+        self._leases = {}
+        self._workers = {}
+        self._secuencia = itertools.count(1)
+
+    def agregar(self, tarea_id, trabajos, al_entregar, opciones=None):
+        """
+        Encola los trabajos de una tarea. al_entregar(trabajo, resultado) se llama
+        (desde los hilos del servidor) una vez por trabajo, con su resultado o con
+        el error si se agotaron los intentos.
+        """
+        with self._lock:
+            self._tareas[tarea_id] = {
+                'trabajos': trabajos,
+                'al_entregar': al_entregar,
+                'opciones': opciones or {},
+                'intentos': [0] * len(trabajos),
+                'completados': set()
+            }
+            self._pendientes.extend((tarea_id, numero) for numero in range(len(trabajos)))
+
+    def cancelar_tarea(self, tarea_id):
+        """Descarta los trabajos pendientes y los leases de la tarea"""
+        with self._lock:
+            self._tareas.pop(tarea_id, None)
+            for lease_id in [l for l, lease in self._leases.items() if lease['tarea'] == tarea_id]:
+                del self._leases[lease_id]
+
+    def pedir(self, worker, max_trabajos=TRABAJOS_POR_LEASE_DEFAULT):
+        """Retorna un lease {'lease', 'trabajos', 'duracion', 'opciones'} o None si no hay trabajo"""
+        with self._lock:
+            self._workers[worker] = time.time()
+            fallidos = self._vencer()
+            tarea_id = None
+            numeros = []
+            while self._pendientes and len(numeros) < max_trabajos:
+                siguiente, numero = self._pendientes[0]
+                tarea = self._tareas.get(siguiente)
+                if tarea is None or numero in tarea['completados']:
+                    self._pendientes.popleft()
+                    continue
+                if tarea['intentos'][numero] >= self.max_intentos:
+                    # Volvió a la cola (por ejemplo con liberar) sin intentos restantes
+                    self._pendientes.popleft()
+                    fallidos.append(self._fallar(tarea, numero))
+                    continue
+                if tarea_id is not None and siguiente != tarea_id:
+                    break
+                self._pendientes.popleft()
+                tarea_id = siguiente
+                tarea['intentos'][numero] += 1
+                numeros.append(numero)
+
+            lease = None
+            if numeros:
+                lease_id = f"{worker}#{next(self._secuencia)}"
+                self._leases[lease_id] = {
+                    'tarea': tarea_id,
+                    'worker': worker,
+                    'numeros': set(numeros),
+                    'vence': time.monotonic() + self.duracion_lease
+                }
+                tarea = self._tareas[tarea_id]
+                lease = {
+                    'lease': lease_id,
+                    'trabajos': [dict(tarea['trabajos'][n], clave=(tarea_id, n)) for n in numeros],
+                    'duracion': self.duracion_lease,
+                    'opciones': tarea['opciones']
+                }
+        self._notificar(fallidos)
+        return lease
+
+    def entregar(self, lease_id, clave, resultado):
+        """
+        Registra el resultado de un trabajo. Retorna False si el lease ya no es
+        válido (venció o la tarea se canceló): el worker debe abandonarlo.
+        """
+        tarea_id, numero = clave
+        with self._lock:
+            lease = self._leases.get(lease_id)
+            if lease is not None:
+                lease['numeros'].discard(numero)
+            tarea = self._tareas.get(tarea_id)
+            if tarea is None or numero in tarea['completados']:
+                return lease is not None
+            tarea['completados'].add(numero)
+            resultado['intentos'] = tarea['intentos'][numero]
+            entrega = (tarea['al_entregar'], tarea['trabajos'][numero], resultado)
+        self._notificar([entrega])
+        return lease is not None
+
+    def renovar(self, lease_id):
+        """Extiende el lease; False si ya no existe"""
+        with self._lock:
+            lease = self._leases.get(lease_id)
+            if lease is None:
+                return False
+            lease['vence'] = time.monotonic() + self.duracion_lease
+            self._workers[lease['worker']] = time.time()
+            return True
+
+    def liberar(self, lease_id):
+        """El worker terminó el lease: lo que no entregó vuelve a la cola"""
+        with self._lock:
+            lease = self._leases.pop(lease_id, None)
+            if lease is not None:
+                self._pendientes.extendleft((lease['tarea'], n) for n in lease['numeros'])
+
+    def revisar(self):
+        """Reasigna o da por fallidos los trabajos de los leases vencidos"""
+        with self._lock:
+            fallidos = self._vencer()
+        self._notificar(fallidos)
+
+    def estado(self):
+        with self._lock:
+            ahora = time.time()
+            return {
+                'tareas': len(self._tareas),
+                'pendientes': len(self._pendientes),
+                'leases': len(self._leases),
+                'workers': {worker: round(ahora - visto, 1) for worker, visto in self._workers.items()}
+            }
+
+    def _vencer(self):
+        """Se llama con el lock tomado; retorna las entregas de error a notificar fuera del lock"""
+        ahora = time.monotonic()
+        fallidos = []
+        for lease_id in [l for l, lease in self._leases.items() if lease['vence'] < ahora]:
+            lease = self._leases.pop(lease_id)
+            tarea = self._tareas.get(lease['tarea'])
+            if tarea is None:
+                continue
+            for numero in sorted(lease['numeros']):
+                if numero in tarea['completados']:
+                    continue
+                if tarea['intentos'][numero] < self.max_intentos:
+                    self._pendientes.appendleft((lease['tarea'], numero))
+                    continue
+                fallidos.append(self._fallar(tarea, numero))
+        return fallidos
+
+    @staticmethod
+    def _fallar(tarea, numero):
+        """Da el trabajo por fallido (con el lock tomado) y retorna su entrega de error"""
+        tarea['completados'].add(numero)
+        trabajo = tarea['trabajos'][numero]
+        resultado = resultado_error(
+            f"Ningún worker entregó el resultado tras {tarea['intentos'][numero]} intentos",
+            trabajo.get('mode')
+        )
+        resultado['intentos'] = tarea['intentos'][numero]
+        return tarea['al_entregar'], trabajo, resultado
+
+    @staticmethod
+    def _notificar(entregas):
+        for al_entregar, trabajo, resultado in entregas:
+            al_entregar(trabajo, resultado)
+
+
+class GestorCola(BaseManager):
+    """Manager que publica la ColaTrabajos del coordinador en la red para los workers"""
+
+
+_cola = None
+_cola_lock = threading.Lock()
+
+
+def _cola_local():
+    return _cola
+
+
+GestorCola.register('cola', callable=_cola_local)
+
+
+def obtener_cola(direccion=DIRECCION_DEFAULT, clave=CLAVE_DEFAULT):
+    """
+    Retorna la cola del coordinador, publicándola en direccion la primera vez.
+    Lanza ValueError si no hay clave (ver clave_coordinador).
+    """
+    global _cola
+    with _cola_lock:
+        if _cola is None:
+            clave = clave_coordinador(direccion, clave)
+            servidor = GestorCola(address=parsear_direccion(direccion), authkey=clave.encode()).get_server()
+            _cola = ColaTrabajos()
+            threading.Thread(target=servidor.serve_forever, name='coordinador', daemon=True).start()
+        return _cola
+
+
+async def ejecutar_distribuido(cola, tarea_id, trabajos, al_completar, opciones=None):
+    """
+    Coordinador: encola los trabajos para los workers remotos y llama
+    al_completar(trabajo, resultado) en este loop a medida que llegan. Revisa
+    los leases vencidos mientras espera; si se cancela, retira la tarea de la cola.
+    """
+    loop = asyncio.get_running_loop()
+    terminado = asyncio.Event()
+    restantes = len(trabajos)
+
+    def completar(trabajo, resultado):
+        nonlocal restantes
+        al_completar(trabajo, resultado)
+        restantes -= 1
+        if restantes <= 0:
+            terminado.set()
+
+    def al_entregar(trabajo, resultado):
+        loop.call_soon_threadsafe(completar, trabajo, resultado)
+
+    if not trabajos:
+        return
+    cola.agregar(tarea_id, trabajos, al_entregar, opciones)
+    try:
+        while not terminado.is_set():
+            try:
+                await asyncio.wait_for(terminado.wait(), INTERVALO_REVISION)
+            except asyncio.TimeoutError:
+                cola.revisar()
+    finally:
+        cola.cancelar_tarea(tarea_id)
+
+
+class LeasePerdido(Exception):
+    """El coordinador rechazó una entrega: el lease venció o la tarea se canceló"""
+
+
+class Worker:
+    """
+    Proceso worker: pide leases al coordinador, los ejecuta con un
+    MotorAnalisis propio y devuelve cada resultado en cuanto termina. Un hilo
+    renueva el lease mientras se ejecuta.
+    """
+
+    def __init__(self, direccion=DIRECCION_DEFAULT, clave=CLAVE_DEFAULT, nombre=None,
+                 trabajos_por_lease=TRABAJOS_POR_LEASE_DEFAULT, concurrencia=MAX_EN_VUELO_DEFAULT,
+                 procesos_parseo=None):
+        self.nombre = nombre or f"{socket.gethostname()}-{os.getpid()}"
+        self.trabajos_por_lease = trabajos_por_lease
+        self.concurrencia = concurrencia
+        if not clave:
+            raise ValueError('El worker necesita la clave del coordinador')
+        gestor = GestorCola(address=parsear_direccion(direccion), authkey=clave.encode())
+        gestor.connect()
+        self.cola = gestor.cola()
+        self.motor = MotorAnalisis(concurrencia, procesos_parseo)
+        self.loop = asyncio.new_event_loop()
+        self._gestor_cache = GestorCache()
+        self._gestor_cache.start()
+        self.cache = self._gestor_cache.CacheMetricas(MAX_ENTRADAS_DEFAULT)
+
+    def ejecutar_lease(self, lease):
+        detener = threading.Event()
+
+        def renovar():
+            while not detener.wait(lease['duracion'] / 3):
+                if not self.cola.renovar(lease['lease']):
+                    return
+
+        def al_completar(trabajo, resultado):
+            resultado['worker'] = self.nombre
+            if not self.cola.entregar(lease['lease'], trabajo['clave'], resultado):
+                raise LeasePerdido(lease['lease'])
+
+        threading.Thread(target=renovar, daemon=True).start()
+        opciones = lease['opciones']
+        try:
+            self.loop.run_until_complete(self.motor.ejecutar(
+                lease['trabajos'], al_completar, max_en_vuelo=self.concurrencia,
+                programacion=opciones.get('programacion'), cache=self.cache,
+                subrecursos=opciones.get('subrecursos'), compresion=opciones.get('compresion')
+            ))
+            self.cola.liberar(lease['lease'])
+        except LeasePerdido:
+            pass
+        finally:
+            detener.set()
+
+    def correr(self, max_leases=None):
+        """Atiende leases hasta que se corte la conexión (o hasta max_leases)"""
+        atendidos = 0
+        try:
+            while max_leases is None or atendidos < max_leases:
+                lease = self.cola.pedir(self.nombre, self.trabajos_por_lease)
+                if lease is None:
+                    time.sleep(ESPERA_SIN_TRABAJO)
+                    continue
+                self.ejecutar_lease(lease)
+                atendidos += 1
+        except (EOFError, ConnectionError):
+            print(f"{self.nombre}: se perdió la conexión con el coordinador", file=sys.stderr)
+        finally:
+            self.cerrar()
+
+    def cerrar(self):
+        self.motor.cerrar(cancelar=True)
+        self._gestor_cache.shutdown()
+        self.loop.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Worker remoto de web-analyzer')
+    parser.add_argument('--coordinador', default=DIRECCION_DEFAULT, help='host:puerto de la app coordinadora')
+    parser.add_argument('--clave', default=CLAVE_DEFAULT,
+                        help='clave compartida con el coordinador (o WEB_ANALYZER_CLAVE_COORDINADOR)')
+    parser.add_argument('--nombre', default=None)
+    parser.add_argument('--trabajos-por-lease', type=int, default=TRABAJOS_POR_LEASE_DEFAULT)
+    parser.add_argument('-c', '--concurrencia', type=int, default=MAX_EN_VUELO_DEFAULT)
+    parser.add_argument('--procesos', type=int, default=None)
+    args = parser.parse_args(argv)
+    if not args.clave:
+        parser.error('falta la clave del coordinador: --clave o WEB_ANALYZER_CLAVE_COORDINADOR')
+
+    worker = Worker(args.coordinador, args.clave, args.nombre, args.trabajos_por_lease, args.concurrencia,
+                    args.procesos)
+    try:
+        worker.correr()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
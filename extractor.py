@@ -0,0 +1,229 @@
+import os
+import re
+
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
+from bs4.builder import builder_registry
+
+# Backends de parseo soportados por BeautifulSoup, del más rápido al más tolerante.
+# "auto" usa lxml (parser en C) si está instalado y si no html.parser.
+PARSERS_VALIDOS = ('auto', 'html.parser', 'lxml', 'html5lib')
+PARSER_DEFAULT = os.environ.get('WEB_ANALYZER_PARSER', 'html.parser')
+
+ELEMENTOS_SEMANTICOS = frozenset(['nav', 'main', 'article', 'section', 'aside', 'header', 'footer'])
+
+_PATRON_OG = re.compile(r'^og:')
+_PATRON_TWITTER = re.compile(r'^twitter:')
+_PATRON_COLOR = re.compile(r'color:')
+
+
+def elegir_parser(parser=None):
+    """Retorna el nombre del parser a usar, cayendo a html.parser si no está instalado"""
+    parser = parser or PARSER_DEFAULT
+    if parser not in PARSERS_VALIDOS:
+        raise ValueError(f"Parser no válido: {parser}")
+    if parser == 'auto':
+        parser = 'lxml'
+    if builder_registry.lookup(parser) is None:
+        return 'html.parser'
+    return parser
+
+
+def parsear_html(contenido, parser=None):
+    """Construye el árbol de BeautifulSoup con el backend elegido"""
+    return BeautifulSoup(contenido, elegir_parser(parser))
+
+
+def _coincide(valor, prueba):
+    """
+    Evalúa un atributo igual que find_all de BeautifulSoup: en atributos con
+    varios valores (rel, class) basta con que coincida uno, y si no, se prueba
+    la cadena completa unida por espacios.
+    """
+    if not isinstance(valor, list):
+        return prueba(valor)
+    if any(prueba(v) for v in valor):
+        return True
+    return len(valor) != 1 and prueba(' '.join(valor))
+
+
+def _igual(esperado):
+    return lambda valor: valor == esperado
+
+
+def _busca(patron):
+    return lambda valor: valor is not None and patron.search(valor) is not None
+
+
+_ES_STYLESHEET = _igual('stylesheet')
+_ES_CANONICAL = _igual('canonical')
+_ES_DESCRIPTION = _igual('description')
+_ES_KEYWORDS = _igual('keywords')
+_ES_ROBOTS = _igual('robots')
+_ES_NOFOLLOW = _igual('nofollow')
+_ES_OG = _busca(_PATRON_OG)
+_ES_TWITTER = _busca(_PATRON_TWITTER)
+_TIENE_COLOR = _busca(_PATRON_COLOR)
+
+
+def _es_externo(src):
+    return src.startswith('http') or src.startswith('//')
+
+
+def _tipos_texto(soup):
+    """Tipos de NavigableString que cuenta soup.get_text() en esta versión de bs4"""
+    tipos = getattr(soup, 'interesting_string_types', None)
+    if tipos is None:
+        tipos = getattr(soup, 'MAIN_CONTENT_STRING_TYPES', None) or {NavigableString, CData}
+    if isinstance(tipos, type):
+        tipos = {tipos}
+    return tipos
+
+
+def extraer_metricas(soup):
+    """
+    Recorre el árbol una sola vez y retorna todas las métricas que dependen del
+    DOM. Los valores son idénticos a los de las búsquedas con find/find_all que
+    hacían calcular_metricas_rendimiento, calcular_metricas_seo y
+    calcular_metricas_accesibilidad.
+    """
+    tipos_texto = _tipos_texto(soup)
+
+    text_size = 0
+    num_tags = 0
+    title_tag = None
+    images = 0
+    images_with_alt = 0
+    scripts = 0
+    inline_scripts = 0
+    css_links = 0
+    external_resources = 0
+    inline_styles = 0
+    meta_description = None
+    meta_keywords = None
+    robots = None
+    canonical = None
+    og_tags = 0
+    twitter_cards = 0
+    headings = {'h1': 0, 'h2': 0, 'h3': 0}
+    form_labels = 0
+    aria_labels = 0
+    semantic_elements = 0
+    inline_colors = 0
+    # Subrecursos (tipo, src, bloqueante) en orden de aparición, sin repetir
+    recursos = {}
+    # href de los enlaces que se pueden seguir (sin rel="nofollow"), sin repetir
+    enlaces = {}
+    base_href = None
+
+    for nodo in soup.descendants:
+        if not isinstance(nodo, Tag):
+            if isinstance(nodo, NavigableString) and type(nodo) in tipos_texto:
+                text_size += len(nodo)
+            continue
+
+        num_tags += 1
+        nombre = nodo.name
+        attrs = nodo.attrs
+
+        if 'aria-label' in attrs and attrs['aria-label'] is not None:
+            aria_labels += 1
+        if 'style' in attrs and _coincide(attrs['style'], _TIENE_COLOR):
+            inline_colors += 1
+
+        if nombre == 'img':
+            images += 1
+            src = attrs.get('src')
+            if src and _es_externo(src):
+                external_resources += 1
+            if src:
+                recursos.setdefault(src, ('img', src, False))
+            if attrs.get('alt'):
+                images_with_alt += 1
+        elif nombre == 'script':
+            scripts += 1
+            src = attrs.get('src')
+            if src:
+                if _es_externo(src):
+                    external_resources += 1
+                # Sin async ni defer el script detiene el parseo hasta descargarse
+                bloqueante = 'async' not in attrs and 'defer' not in attrs and attrs.get('type') != 'module'
+                recursos.setdefault(src, ('script', src, bloqueante))
+            else:
+                inline_scripts += 1
+        elif nombre == 'link':
+            rel = attrs.get('rel')
+            if _coincide(rel, _ES_STYLESHEET):
+                css_links += 1
+                href = attrs.get('href')
+                if href:
+                    recursos.setdefault(href, ('css', href, attrs.get('media') != 'print'))
+            if canonical is None and _coincide(rel, _ES_CANONICAL):
+                canonical = nodo
+        elif nombre == 'meta':
+            name = attrs.get('name')
+            if meta_description is None and _coincide(name, _ES_DESCRIPTION):
+                meta_description = nodo
+            if meta_keywords is None and _coincide(name, _ES_KEYWORDS):
+                meta_keywords = nodo
+            if robots is None and _coincide(name, _ES_ROBOTS):
+                robots = nodo
+            if _coincide(attrs.get('property'), _ES_OG):
+                og_tags += 1
+            if _coincide(name, _ES_TWITTER):
+                twitter_cards += 1
+        elif nombre == 'a' or nombre == 'area':
+            href = attrs.get('href')
+            if href and not _coincide(attrs.get('rel'), _ES_NOFOLLOW):
+                enlaces[href] = None
+        elif nombre == 'base':
+            if base_href is None and attrs.get('href'):
+                base_href = attrs['href']
+        elif nombre == 'style':
+            inline_styles += 1
+        elif nombre in headings:
+            headings[nombre] += 1
+        elif nombre == 'label':
+            form_labels += 1
+        elif nombre == 'title':
+            if title_tag is None:
+                title_tag = nodo
+
+        if nombre in ELEMENTOS_SEMANTICOS:
+            semantic_elements += 1
+
+    # El título se convierte a str: un NavigableString arrastra todo el árbol al
+    # serializarse para devolverlo desde el worker o guardarlo en la cache
+    title = "Sin título"
+    if title_tag:
+        title = title_tag.string
+        if title is not None:
+            title = str(title)
+
+    return {
+        'text_size': text_size,
+        'title': title,
+        'num_tags': num_tags,
+        'image_count': images,
+        'images_with_alt': images_with_alt,
+        'script_count': scripts,
+        'inline_scripts': inline_scripts,
+        'css_count': css_links,
+        'external_resources': external_resources,
+        'inline_styles': inline_styles,
+        'meta_description': meta_description.get('content') if meta_description else None,
+        'meta_keywords': meta_keywords.get('content') if meta_keywords else None,
+        'canonical_url': canonical.get('href') if canonical else None,
+        'robots_meta': robots.get('content') if robots else None,
+        'og_tags': og_tags,
+        'twitter_cards': twitter_cards,
+        'h1_count': headings['h1'],
+        'h2_count': headings['h2'],
+        'h3_count': headings['h3'],
+        'form_labels': form_labels,
+        'aria_labels': aria_labels,
+        'semantic_html': semantic_elements,
+        'color_contrast_issues': inline_colors,
+        'recursos': list(recursos.values()),
+        'enlaces': list(enlaces),
+        'base_href': base_href
+    }
@@ -0,0 +1,233 @@
+import os
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+MODOS_VALIDOS = ('cold', 'warm')
+MODO_DEFAULT = 'cold'
+
+# Conexiones keep-alive que se conservan por host (el motor async puede tener
+# muchas descargas simultáneas contra el mismo host)
+CONEXIONES_POR_HOST = 100
+
+# Fases de la descarga reportadas en cada resultado (milisegundos)
+FASES = ('dns_ms', 'connect_ms', 'tls_ms', 'ttfb_ms', 'download_ms')
+
+# El cuerpo se lee en bloques y se corta al superar el máximo (un endpoint que
+# transmite sin fin o una página enorme no deben agotar la memoria del worker)
+TAMANO_BLOQUE_DESCARGA = 64 * 1024
+MAX_BYTES_CUERPO_DEFAULT = int(os.environ.get('WEB_ANALYZER_MAX_CUERPO_KB', 10 * 1024)) * 1024
+
+# Bytes de continuación de UTF-8 (10xxxxxx): no empiezan un carácter
+_CONTINUACION_UTF8 = bytes(range(0x80, 0xC0))
+
+HEADERS_DEFAULT = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Estado de la medición en curso (uno por hilo del worker)
+_estado = threading.local()
+
+# Sesiones persistentes por host, viven mientras viva el proceso worker
+_sesiones = {}
+_sesiones_lock = threading.Lock()
+
+
+def _medicion_actual():
+    return getattr(_estado, 'medicion', None)
+
+
+class _ConexionMedida:
+    """
+    Mixin para conexiones de urllib3 que registra en la medición en curso la
+    apertura de sockets nuevos y el tiempo de resolución DNS y de conexión TCP.
+    """
+
+    def _new_conn(self):
+        medicion = _medicion_actual()
+        if medicion is None:
+            return super()._new_conn()
+
+        medicion['conexiones_nuevas'] += 1
+
+        # Resolver DNS por separado para poder medirlo
+        inicio = time.perf_counter()
+        try:
+            direcciones = socket.getaddrinfo(self._dns_host, self.port, 0, socket.SOCK_STREAM)
+        except socket.gaierror:
+            # Dejar que urllib3 genere su propio error de resolución
+            return super()._new_conn()
+        fin_dns = time.perf_counter()
+        medicion['dns'] += fin_dns - inicio
+
+        host_original = self._dns_host
+        self._dns_host = direcciones[0][4][0]
+        try:
+            sock = super()._new_conn()
+        finally:
+            self._dns_host = host_original
+        medicion['connect'] += time.perf_counter() - fin_dns
+        return sock
+
+
+class ConexionHTTP(_ConexionMedida, HTTPConnection):
+    """Conexión HTTP instrumentada"""
+
+
+class ConexionHTTPS(_ConexionMedida, HTTPSConnection):
+    """Conexión HTTPS instrumentada, además mide el handshake TLS"""
+
+    def connect(self):
+        medicion = _medicion_actual()
+        if medicion is None:
+            return super().connect()
+
+        previo = medicion['dns'] + medicion['connect']
+        inicio = time.perf_counter()
+        super().connect()
+        total = time.perf_counter() - inicio
+        # Lo que no fue DNS ni TCP dentro de connect() es el handshake TLS
+        medicion['tls'] += max(total - (medicion['dns'] + medicion['connect'] - previo), 0)
+
+
+class PoolHTTP(HTTPConnectionPool):
+    ConnectionCls = ConexionHTTP
+
+
+class PoolHTTPS(HTTPSConnectionPool):
+    ConnectionCls = ConexionHTTPS
+
+
+class AdaptadorMedido(HTTPAdapter):
+    """HTTPAdapter cuyos pools usan las conexiones instrumentadas"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': PoolHTTP, 'https': PoolHTTPS}
+
+
+def crear_sesion():
+    """Crea una sesión de requests con el adaptador instrumentado"""
+    sesion = requests.Session()
+    sesion.headers.update(HEADERS_DEFAULT)
+    adaptador = AdaptadorMedido(pool_connections=10, pool_maxsize=CONEXIONES_POR_HOST)
+    sesion.mount('http://', adaptador)
+    sesion.mount('https://', adaptador)
+    return sesion
+
+
+def _clave_host(url):
+    partes = urlparse(url)
+    return f"{partes.scheme}://{partes.netloc}"
+
+
+def obtener_sesion(url):
+    """Retorna la sesión keep-alive del host de la URL, creándola si no existe"""
+    clave = _clave_host(url)
+    with _sesiones_lock:
+        sesion = _sesiones.get(clave)
+        if sesion is None:
+            sesion = crear_sesion()
+            _sesiones[clave] = sesion
+        return sesion
+
+
+def cerrar_sesiones():
+    """Cierra todas las sesiones persistentes del proceso"""
+    with _sesiones_lock:
+        for sesion in _sesiones.values():
+            sesion.close()
+        _sesiones.clear()
+
+
+def _nueva_medicion():
+    return {'conexiones_nuevas': 0, 'dns': 0.0, 'connect': 0.0, 'tls': 0.0}
+
+
+def leer_cuerpo(response, max_bytes):
+    """
+    Lee el cuerpo por bloques hasta max_bytes y lo deja en response.content.
+    Cuenta al vuelo las líneas y los caracteres (UTF-8) del cuerpo leído, sin
+    decodificarlo ni volver a serializar el HTML. Retorna (lineas, caracteres, truncado).
+    """
+    cuerpo = bytearray()
+    saltos = 0
+    continuaciones = 0
+    truncado = False
+    for bloque in response.iter_content(TAMANO_BLOQUE_DESCARGA):
+        restante = max_bytes - len(cuerpo)
+        if len(bloque) > restante:
+            bloque = bloque[:restante]
+            truncado = True
+        cuerpo += bloque
+        saltos += bloque.count(b'\n')
+        continuaciones += len(bloque) - len(bloque.translate(None, _CONTINUACION_UTF8))
+        if truncado:
+            # Cerrar descarta el resto y la conexión, que no se puede reutilizar a medias
+            response.close()
+            break
+
+    response._content = bytes(cuerpo)
+    response._content_consumed = True
+    return (saltos + 1 if cuerpo else 0), len(cuerpo) - continuaciones, truncado
+
+
+def descargar(url, modo=MODO_DEFAULT, timeout=30, headers=None, max_bytes=None):
+    """
+    Descarga una URL y retorna (response, info_conexion).
+
+    En modo "cold" se usa una sesión nueva que se cierra al terminar, así que cada
+    llamada paga DNS, TCP y TLS. En modo "warm" se reutiliza la sesión keep-alive
+    del host, por lo que las repeticiones aprovechan las conexiones ya abiertas.
+
+    info_conexion incluye la duración de cada fase en milisegundos, medida con
+    time.perf_counter(): dns_ms, connect_ms, tls_ms, ttfb_ms (espera del primer
+    byte una vez abierta la conexión) y download_ms (lectura del cuerpo). Las fases
+    suman el tiempo total; si hubo redirecciones se acumulan todos los saltos.
+    headers se agregan a los de la sesión (por ejemplo los condicionales).
+
+    El cuerpo se lee en bloques hasta max_bytes (MAX_BYTES_CUERPO_DEFAULT si no
+    se indica); si el servidor envía más, se corta y truncated es True. También se
+    reportan ttlb_ms (hasta el último byte), bytes_per_second durante la lectura
+    del cuerpo y body_lines / body_chars contados mientras se descarga.
+    """
+    if modo not in MODOS_VALIDOS:
+        raise ValueError(f"Modo no válido: {modo}")
+
+    medicion = _nueva_medicion()
+    _estado.medicion = medicion
+    sesion = obtener_sesion(url) if modo == 'warm' else crear_sesion()
+    try:
+        inicio = time.perf_counter()
+        response = sesion.get(url, timeout=timeout, stream=True, headers=headers)
+        fin_headers = time.perf_counter()
+        lineas, caracteres, truncado = leer_cuerpo(response, max_bytes or MAX_BYTES_CUERPO_DEFAULT)
+        fin = time.perf_counter()
+    finally:
+        _estado.medicion = None
+        if modo == 'cold':
+            sesion.close()
+
+    establecimiento = medicion['dns'] + medicion['connect'] + medicion['tls']
+    info_conexion = {
+        'mode': modo,
+        'connection_reused': medicion['conexiones_nuevas'] == 0,
+        'total_time': fin - inicio,
+        'dns_ms': round(medicion['dns'] * 1000, 2),
+        'connect_ms': round(medicion['connect'] * 1000, 2),
+        'tls_ms': round(medicion['tls'] * 1000, 2),
+        'ttfb_ms': round(max(fin_headers - inicio - establecimiento, 0) * 1000, 2),
+        'download_ms': round((fin - fin_headers) * 1000, 2),
+        'ttlb_ms': round((fin - inicio) * 1000, 2),
+        'bytes_per_second': round(len(response.content) / (fin - fin_headers), 0) if fin > fin_headers else 0,
+        'truncated': truncado,
+        'body_lines': lineas,
+        'body_chars': caracteres
+    }
+    return response, info_conexion
@@ -0,0 +1,193 @@
+import argparse
+import gzip
+import multiprocessing
+import random
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Parámetros de /pagina y sus valores por defecto
+PARAMETROS_DEFAULT = {
+    'kb': 10,              # tamaño aproximado del HTML
+    'densidad': 10,        # etiquetas por KB de relleno
+    'imagenes': 0,
+    'scripts': 0,
+    'css': 0,
+    'latencia_ms': 0,      # espera antes de responder
+    'gzip': 0,             # comprimir si el cliente lo acepta
+    'redirecciones': 0,    # saltos 302 antes de la página
+    'seguridad': 0,        # agregar los headers de seguridad
+    'semilla': 0           # varía el contenido con la misma estructura
+}
+
+PALABRAS = (
+    'rendimiento', 'análisis', 'servidor', 'página', 'contenido', 'latencia', 'navegador', 'recurso',
+    'métrica', 'respuesta', 'conexión', 'documento', 'estructura', 'prueba', 'noticia', 'sección'
+)
+
+HEADERS_SEGURIDAD = {
+    'Strict-Transport-Security': 'max-age=31536000',
+    'Content-Security-Policy': "default-src 'self'",
+    'X-Frame-Options': 'DENY',
+    'X-Content-Type-Options': 'nosniff',
+    'X-XSS-Protection': '1; mode=block'
+}
+
+
+@lru_cache(maxsize=64)
+def generar_pagina(kb, densidad, imagenes, scripts, css, semilla):
+    """
+    HTML sintético y determinista de unos kb KB: head con title, meta SEO, css
+    hojas de estilo y scripts, y un body de bloques con encabezados, párrafos,
+    enlaces e imágenes hasta llegar al tamaño pedido. densidad controla cuántas
+    etiquetas hay por KB (más etiquetas cortas o menos y más largas).
+    """
+    azar = random.Random(semilla)
+    partes = [
+        '<!DOCTYPE html>\n<html lang="es">\n<head>\n<meta charset="utf-8">\n',
+        f'<title>Página de prueba {semilla}</title>\n',
+        '<meta name="description" content="Página sintética para benchmarks">\n',
+        '<meta property="og:title" content="Benchmark">\n<link rel="canonical" href="/pagina">\n'
+    ]
+    partes.extend(f'<link rel="stylesheet" href="/recurso/estilo{i}.css">\n' for i in range(css))
+    partes.extend(f'<script src="/recurso/script{i}.js"></script>\n' for i in range(scripts))
+    partes.append('</head>\n<body>\n<header><nav><a href="/">Inicio</a></nav></header>\n<main>\n')
+    partes.extend(f'<img src="/recurso/imagen{i}.jpg" alt="imagen {i}">\n' for i in range(imagenes))
+
+    objetivo = kb * 1024
+    tamano = sum(len(p) for p in partes)
+    # Cada bloque tiene 5 etiquetas y ~110 bytes de marcado; el texto completa
+    # el tamaño de bloque que corresponde a la densidad pedida
+    largo_texto = max(5 * 1024 // max(densidad, 1) - 110, 8)
+    bloque = 0
+    while tamano < objetivo:
+        texto = ' '.join(azar.choice(PALABRAS) for _ in range(max(largo_texto // 10, 1)))
+        html = (
+            f'<section><h2>Sección {bloque}</h2><p>{texto}</p>'
+            f'<p><a href="/pagina?semilla={bloque}">más</a></p></section>\n'
+        )
+        partes.append(html)
+        tamano += len(html)
+        bloque += 1
+    partes.append('</main>\n<footer>Fin</footer>\n</body>\n</html>\n')
+    return ''.join(partes).encode('utf-8')
+
+
+def leer_parametros(query):
+    valores = parse_qs(query)
+    parametros = dict(PARAMETROS_DEFAULT)
+    for nombre in parametros:
+        if nombre in valores:
+            parametros[nombre] = int(valores[nombre][0])
+    return parametros
+
+
+class ManejadorFixture(BaseHTTPRequestHandler):
+    """Sirve /pagina?<parámetros> y subrecursos /recurso/<nombre> de tamaño fijo"""
+
+    protocol_version = 'HTTP/1.1'
+    # headers y cuerpo van en escrituras separadas: sin esto Nagle + delayed ACK suman ~40 ms
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/pagina':
+            self._pagina(url.query)
+        elif url.path.startswith('/recurso/'):
+            self._responder(200, b'/* recurso */' + b' ' * 2048, 'text/plain')
+        else:
+            self._responder(404, b'No encontrado', 'text/plain')
+
+    def _pagina(self, query):
+        parametros = leer_parametros(query)
+        if parametros['latencia_ms']:
+            time.sleep(parametros['latencia_ms'] / 1000)
+        if parametros['redirecciones'] > 0:
+            siguiente = dict(parametros, redirecciones=parametros['redirecciones'] - 1)
+            destino = '/pagina?' + '&'.join(f"{k}={v}" for k, v in siguiente.items())
+            self._responder(302, b'', 'text/plain', {'Location': destino})
+            return
+
+        cuerpo = generar_pagina(
+            parametros['kb'], parametros['densidad'], parametros['imagenes'], parametros['scripts'],
+            parametros['css'], parametros['semilla']
+        )
+        headers = {'Cache-Control': 'max-age=60', 'ETag': f'"{parametros["semilla"]}-{len(cuerpo)}"'}
+        if parametros['seguridad']:
+            headers.update(HEADERS_SEGURIDAD)
+        if parametros['gzip'] and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            cuerpo = _comprimir(cuerpo)
+            headers['Content-Encoding'] = 'gzip'
+        self._responder(200, cuerpo, 'text/html; charset=utf-8', headers)
+
+    def _responder(self, status, cuerpo, tipo, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.send_header('Server', 'fixture')
+        for nombre, valor in (headers or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+@lru_cache(maxsize=16)
+def _comprimir(cuerpo):
+    return gzip.compress(cuerpo, compresslevel=6, mtime=0)
+
+
+def _servir(host, puerto, cola):
+    servidor = ThreadingHTTPServer((host, puerto), ManejadorFixture)
+    servidor.daemon_threads = True
+    cola.put(servidor.server_address[1])
+    servidor.serve_forever()
+
+
+class ServidorFixture:
+    """
+    Servidor de páginas sintéticas en un proceso aparte (su CPU no se mezcla
+    con la del código medido). Se usa como context manager y expone url(**parametros).
+    """
+
+    def __init__(self, host='127.0.0.1', puerto=0):
+        self.host = host
+        self.puerto = puerto
+        self._proceso = None
+
+    def iniciar(self):
+        cola = multiprocessing.Queue()
+        self._proceso = multiprocessing.Process(target=_servir, args=(self.host, self.puerto, cola), daemon=True)
+        self._proceso.start()
+        self.puerto = cola.get(timeout=10)
+        return self
+
+    def detener(self):
+        if self._proceso is not None:
+            self._proceso.terminate()
+            self._proceso.join()
+            self._proceso = None
+
+    def url(self, **parametros):
+        query = '&'.join(f"{k}={v}" for k, v in parametros.items())
+        return f"http://{self.host}:{self.puerto}/pagina" + (f"?{query}" if query else '')
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *excepcion):
+        self.detener()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor de páginas sintéticas para benchmarks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8800)
+    args = parser.parse_args()
+    print(f"Sirviendo en http://{args.host}:{args.puerto}/pagina?kb=100&imagenes=20")
+    servidor = ThreadingHTTPServer((args.host, args.puerto), ManejadorFixture)
+    servidor.daemon_threads = True
+    servidor.serve_forever()
@@ -0,0 +1,397 @@
+"""
+Historial de resultados: cada tarea terminada se agrega a una base SQLite
+indexada por URL y fecha, con una fila por URL y corrida y un resumen diario
+por URL pre-agregado (percentiles ya calculados más el sketch para
+combinarlo), así las series de un año para cientos de URLs salen del índice
+sin releer resultados. Las líneas base son ventanas móviles de días
+anteriores a la corrida y una corrida se marca como regresión si su
+percentil supera el de la línea base en más del umbral.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from latency_sketch import HistogramaLatencias
+
+RUTA_HISTORIAL_DEFAULT = os.environ.get(
+    'WEB_ANALYZER_HISTORIAL', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'historial.db')
+)
+# "0" desactiva el registro de las tareas terminadas
+HISTORIAL_ACTIVO = os.environ.get('WEB_ANALYZER_HISTORIAL_ACTIVO', '1') == '1'
+
+PERCENTILES_HISTORIAL = (50, 90, 95, 99)
+PERCENTIL_DEFAULT = 95
+DIAS_BASE_DEFAULT = 30
+MAX_DIAS_BASE = 366
+UMBRAL_REGRESION_DEFAULT = 0.2
+# Aumento de la tasa de errores (en puntos) que se marca como regresión
+MARGEN_ERRORES = 0.05
+# Tiempos de carga mínimos en la línea base para poder compararla
+MIN_MUESTRAS_BASE = 5
+GRANULARIDADES = ('dia', 'corrida')
+SEGUNDOS_DIA = 86400
+# Líneas base de días completos que se mantienen calculadas (url, día, días)
+MAX_BASES_EN_MEMORIA = 4096
+
+_COLUMNAS_PERCENTILES = ', '.join(f'p{p}' for p in PERCENTILES_HISTORIAL)
+# Marcadores de los percentiles, el promedio, el máximo y el sketch
+_MARCAS_METRICAS = ', '.join('?' * (len(PERCENTILES_HISTORIAL) + 3))
+
+
+def dia_de(ts):
+    """Día UTC (AAAA-MM-DD) de un epoch en segundos"""
+    return time.strftime('%Y-%m-%d', time.gmtime(ts))
+
+
+def leer_fecha(valor):
+    """Epoch en segundos a partir de un número o de una fecha ISO 8601 (UTC si no trae zona)"""
+    if valor is None or valor == '':
+        return None
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        pass
+    fecha = datetime.fromisoformat(str(valor).replace('Z', '+00:00'))
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=timezone.utc)
+    return fecha.timestamp()
+
+
+def _valores_sketch(sketch):
+    """Percentiles, promedio y máximo de un sketch en el orden de las columnas"""
+    return [
+        round(sketch.percentil(p), 2) if sketch.cuenta else None for p in PERCENTILES_HISTORIAL
+    ] + [
+        round(sketch.promedio, 2) if sketch.cuenta else None,
+        sketch.maximo
+    ]
+
+
+def _fila_a_dict(columnas, fila):
+    return dict(zip(columnas, fila))
+
+
+def resumir_por_url(pares):
+    """
+    Agrupa (url, resultado) por URL: resultados, errores, KB sumados y un
+    HistogramaLatencias con los load_time_ms.
+    """
+    por_url = {}
+    for url, resultado in pares:
+        datos = por_url.get(url)
+        if datos is None:
+            datos = por_url[url] = {'resultados': 0, 'errores': 0, 'kb': 0.0, 'sketch': HistogramaLatencias()}
+        datos['resultados'] += 1
+        if resultado.get('error'):
+            datos['errores'] += 1
+        datos['kb'] += resultado.get('size_kb') or 0
+        if resultado.get('load_time_ms'):
+            datos['sketch'].agregar(resultado['load_time_ms'])
+    return por_url
+
+
+class HistorialResultados:
+    """
+    Historial en SQLite. Tablas:
+    - corridas: una fila por tarea (o archivo importado) agregada.
+    - mediciones: una fila por URL y corrida, con clave (url, ts, corrida).
+    - diarios: una fila por URL y día UTC, con clave (url, dia).
+    - urls: primera y última corrida de cada URL.
+    La parte de días completos de cada línea base se guarda en un LRU que se
+    vacía cuando se agrega una corrida. Se escribe desde el loop de las tareas y se consulta desde los pedidos
+    HTTP, por eso usa una sola conexión con lock.
+    """
+
+    def __init__(self, ruta=RUTA_HISTORIAL_DEFAULT):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self._bases = OrderedDict()
+        self._crear_tablas()
+
+    def _crear_tablas(self):
+        percentiles = ', '.join(f'p{p} REAL' for p in PERCENTILES_HISTORIAL)
+        with self._lock, self._conexion:
+            self._conexion.execute("""
+                CREATE TABLE IF NOT EXISTS corridas (
+                    corrida TEXT PRIMARY KEY,
+                    ts REAL NOT NULL,
+                    tipo TEXT NOT NULL,
+                    urls INTEGER NOT NULL,
+                    resultados INTEGER NOT NULL,
+                    errores INTEGER NOT NULL
+                )
+            """)
+            self._conexion.execute(f"""
+                CREATE TABLE IF NOT EXISTS mediciones (
+                    url TEXT NOT NULL,
+                    ts REAL NOT NULL,
+                    corrida TEXT NOT NULL,
+                    resultados INTEGER NOT NULL,
+                    errores INTEGER NOT NULL,
+                    size_kb REAL,
+                    {percentiles},
+                    promedio REAL,
+                    maximo REAL,
+                    sketch TEXT NOT NULL,
+                    PRIMARY KEY (url, ts, corrida)
+                ) WITHOUT ROWID
+            """)
+            self._conexion.execute("CREATE INDEX IF NOT EXISTS mediciones_corrida ON mediciones (corrida)")
+            self._conexion.execute("""
+                CREATE TABLE IF NOT EXISTS urls (
+                    url TEXT PRIMARY KEY,
+                    primera REAL NOT NULL,
+                    ultima REAL NOT NULL,
+                    corrida TEXT NOT NULL,
+                    corridas INTEGER NOT NULL
+                ) WITHOUT ROWID
+            """)
+            self._conexion.execute(f"""
+                CREATE TABLE IF NOT EXISTS diarios (
+                    url TEXT NOT NULL,
+                    dia TEXT NOT NULL,
+                    corridas INTEGER NOT NULL,
+                    resultados INTEGER NOT NULL,
+                    errores INTEGER NOT NULL,
+                    {percentiles},
+                    promedio REAL,
+                    maximo REAL,
+                    sketch TEXT NOT NULL,
+                    PRIMARY KEY (url, dia)
+                ) WITHOUT ROWID
+            """)
+
+    def agregar(self, corrida, pares, ts=None, tipo='analisis'):
+        """
+        Agrega una corrida a partir de sus (url, resultado) y actualiza los
+        resúmenes diarios de sus URLs. Una corrida ya agregada se ignora.
+        Retorna la cantidad de URLs registradas.
+        """
+        ts = time.time() if ts is None else ts
+        dia = dia_de(ts)
+        por_url = resumir_por_url(pares)
+        with self._lock, self._conexion:
+            existe = self._conexion.execute("SELECT 1 FROM corridas WHERE corrida = ?", (corrida,)).fetchone()
+            if existe or not por_url:
+                return 0
+            self._conexion.execute(
+                "INSERT INTO corridas VALUES (?, ?, ?, ?, ?, ?)",
+                (corrida, ts, tipo, len(por_url), sum(d['resultados'] for d in por_url.values()),
+                 sum(d['errores'] for d in por_url.values()))
+            )
+            for url, datos in por_url.items():
+                sketch = datos['sketch']
+                self._conexion.execute(
+                    f"INSERT INTO mediciones VALUES (?, ?, ?, ?, ?, ?, {_MARCAS_METRICAS})",
+                    [url, ts, corrida, datos['resultados'], datos['errores'],
+                     round(datos['kb'] / datos['resultados'], 2)] + _valores_sketch(sketch) +
+                    [json.dumps(sketch.a_dict())]
+                )
+                self._sumar_al_dia(url, dia, datos, sketch)
+                # Los valores de la derecha de SET son los previos a la actualización
+                self._conexion.execute(
+                    "INSERT INTO urls VALUES (?, ?, ?, ?, 1) ON CONFLICT (url) DO UPDATE SET "
+                    "primera = MIN(primera, excluded.primera), corridas = corridas + 1, "
+                    "corrida = CASE WHEN excluded.ultima >= ultima THEN excluded.corrida ELSE corrida END, "
+                    "ultima = MAX(ultima, excluded.ultima)",
+                    (url, ts, ts, corrida)
+                )
+            self._bases.clear()
+        return len(por_url)
+
+    def _sumar_al_dia(self, url, dia, datos, sketch):
+        fila = self._conexion.execute(
+            "SELECT corridas, resultados, errores, sketch FROM diarios WHERE url = ? AND dia = ?", (url, dia)
+        ).fetchone()
+        corridas, resultados, errores = 1, datos['resultados'], datos['errores']
+        if fila is not None:
+            corridas += fila[0]
+            resultados += fila[1]
+            errores += fila[2]
+            sketch = HistogramaLatencias.desde_dict(json.loads(fila[3])).fusionar(sketch)
+        self._conexion.execute(
+            f"INSERT OR REPLACE INTO diarios VALUES (?, ?, ?, ?, ?, {_MARCAS_METRICAS})",
+            [url, dia, corridas, resultados, errores] + _valores_sketch(sketch) + [json.dumps(sketch.a_dict())]
+        )
+
+    def urls(self):
+        """URLs con historial: corridas, primera y última (epoch) y la última corrida"""
+        with self._lock:
+            filas = self._conexion.execute(
+                "SELECT url, corridas, primera, ultima, corrida FROM urls ORDER BY url"
+            ).fetchall()
+        return [_fila_a_dict(('url', 'corridas', 'desde', 'hasta', 'ultima_corrida'), fila) for fila in filas]
+
+    def serie(self, url, desde=None, hasta=None, granularidad='dia'):
+        """
+        Serie de una URL entre desde y hasta (epoch, inclusive): una fila por día
+        desde los resúmenes diarios o una por corrida.
+        """
+        if granularidad not in GRANULARIDADES:
+            raise ValueError(f"Granularidad no válida, usar una de: {', '.join(GRANULARIDADES)}")
+        metricas = f"resultados, errores, {_COLUMNAS_PERCENTILES}, promedio, maximo"
+        if granularidad == 'dia':
+            columnas = ['dia', 'corridas'] + metricas.split(', ')
+            consulta = (f"SELECT dia, corridas, {metricas} FROM diarios "
+                        "WHERE url = ? AND dia >= ? AND dia <= ? ORDER BY dia")
+            limites = (dia_de(desde) if desde is not None else '', dia_de(hasta) if hasta is not None else '9999')
+        else:
+            columnas = ['ts', 'corrida', 'size_kb'] + metricas.split(', ')
+            consulta = (f"SELECT ts, corrida, size_kb, {metricas} FROM mediciones "
+                        "WHERE url = ? AND ts >= ? AND ts <= ? ORDER BY ts")
+            limites = (desde if desde is not None else 0, hasta if hasta is not None else float('inf'))
+        with self._lock:
+            filas = self._conexion.execute(consulta, (url,) + limites).fetchall()
+        return [_fila_a_dict(columnas, fila) for fila in filas]
+
+    def _linea_base(self, url, ts, dias):
+        """
+        Sketch y conteos de la URL en los `dias` días anteriores a ts: los
+        resúmenes diarios de los días completos más las corridas del mismo
+        día que terminaron antes.
+        """
+        dia = dia_de(ts)
+        clave = (url, dia, dias)
+        base = self._bases.get(clave)
+        if base is None:
+            base = self._bases[clave] = self._sumar_filas(self._conexion.execute(
+                "SELECT resultados, errores, sketch FROM diarios WHERE url = ? AND dia >= ? AND dia < ?",
+                (url, dia_de(ts - dias * SEGUNDOS_DIA), dia)
+            ))
+            if len(self._bases) > MAX_BASES_EN_MEMORIA:
+                self._bases.popitem(last=False)
+        else:
+            self._bases.move_to_end(clave)
+        sketch, resultados, errores = self._sumar_filas(self._conexion.execute(
+            "SELECT resultados, errores, sketch FROM mediciones WHERE url = ? AND ts >= ? AND ts < ?",
+            (url, leer_fecha(dia + 'T00:00:00'), ts)
+        ))
+        return sketch.fusionar(base[0]), resultados + base[1], errores + base[2]
+
+    @staticmethod
+    def _sumar_filas(filas):
+        """Fusiona filas (resultados, errores, sketch JSON) en (sketch, resultados, errores)"""
+        sketch = HistogramaLatencias()
+        resultados = errores = 0
+        for filas_resultados, filas_errores, sketch_fila in filas:
+            resultados += filas_resultados
+            errores += filas_errores
+            sketch.fusionar(HistogramaLatencias.desde_dict(json.loads(sketch_fila)))
+        return sketch, resultados, errores
+
+    def _comparar_url(self, url, ts, medicion, dias, percentil, umbral):
+        """Compara una fila de mediciones (resultados, errores, sketch) con la línea base de la URL"""
+        resultados_actual, errores_actual, sketch = medicion
+        valor_actual = HistogramaLatencias.desde_dict(json.loads(sketch)).percentil(percentil)
+        tasa_actual = errores_actual / resultados_actual if resultados_actual else 0
+        base, resultados, errores = self._linea_base(url, ts, dias)
+        comparacion = {
+            'url': url,
+            'actual': {
+                f'p{percentil}': round(valor_actual, 2) if valor_actual is not None else None,
+                'resultados': resultados_actual,
+                'tasa_errores': round(tasa_actual, 4)
+            },
+            'base': None,
+            'cambio': None,
+            'motivos': []
+        }
+        if base.cuenta < MIN_MUESTRAS_BASE:
+            return comparacion
+        valor_base = base.percentil(percentil)
+        tasa_base = errores / resultados if resultados else 0
+        comparacion['base'] = {
+            f'p{percentil}': round(valor_base, 2),
+            'resultados': resultados,
+            'muestras': base.cuenta,
+            'tasa_errores': round(tasa_base, 4)
+        }
+        if valor_actual is not None and valor_base:
+            comparacion['cambio'] = round(valor_actual / valor_base - 1, 4)
+            if valor_actual > valor_base * (1 + umbral):
+                comparacion['motivos'].append('latencia')
+        if tasa_actual > tasa_base + MARGEN_ERRORES:
+            comparacion['motivos'].append('errores')
+        return comparacion
+
+    def comparar_corrida(self, corrida, dias=DIAS_BASE_DEFAULT, percentil=PERCENTIL_DEFAULT,
+                         umbral=UMBRAL_REGRESION_DEFAULT):
+        """
+        Compara cada URL de una corrida contra su línea base de los `dias` días
+        anteriores. Una URL es regresión si su percentil supera el de la base
+        en más de umbral (0.2 = 20%) o si su tasa de errores sube más de
+        MARGEN_ERRORES. Retorna None si la corrida no está en el historial.
+        """
+        with self._lock:
+            fila = self._conexion.execute("SELECT ts, tipo FROM corridas WHERE corrida = ?", (corrida,)).fetchone()
+            if fila is None:
+                return None
+            ts, tipo = fila
+            mediciones = self._conexion.execute(
+                "SELECT url, resultados, errores, sketch FROM mediciones WHERE corrida = ? ORDER BY url", (corrida,)
+            ).fetchall()
+            urls = [
+                self._comparar_url(url, ts, medicion, dias, percentil, umbral) for url, *medicion in mediciones
+            ]
+        return {
+            'corrida': corrida,
+            'ts': ts,
+            'tipo': tipo,
+            'dias_base': dias,
+            'percentil': percentil,
+            'umbral': umbral,
+            'regresiones': sum(1 for url in urls if url['motivos']),
+            'urls': urls
+        }
+
+    def regresiones(self, dias=DIAS_BASE_DEFAULT, percentil=PERCENTIL_DEFAULT, umbral=UMBRAL_REGRESION_DEFAULT,
+                    desde=None):
+        """
+        Última corrida de cada URL (desde `desde`, epoch) contra su línea base.
+        Retorna solo las URLs marcadas como regresión, de mayor a menor cambio.
+        """
+        with self._lock:
+            # CROSS JOIN fija el orden: recorrer urls y buscar cada medición por su clave
+            ultimas = self._conexion.execute(
+                "SELECT u.url, u.ultima, u.corrida, m.resultados, m.errores, m.sketch FROM urls u "
+                "CROSS JOIN mediciones m ON m.url = u.url AND m.ts = u.ultima AND m.corrida = u.corrida "
+                "WHERE u.ultima >= ?",
+                (desde if desde is not None else 0,)
+            ).fetchall()
+            comparaciones = []
+            for url, ts, corrida, *medicion in ultimas:
+                comparacion = self._comparar_url(url, ts, medicion, dias, percentil, umbral)
+                if comparacion['motivos']:
+                    comparacion['corrida'] = corrida
+                    comparacion['ts'] = ts
+                    comparaciones.append(comparacion)
+        comparaciones.sort(key=lambda c: c['cambio'] or 0, reverse=True)
+        return {
+            'dias_base': dias,
+            'percentil': percentil,
+            'umbral': umbral,
+            'urls_revisadas': len(ultimas),
+            'regresiones': comparaciones
+        }
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.close()
+
+
+_historial = None
+_historial_lock = threading.Lock()
+
+
+def obtener_historial():
+    """Historial de la aplicación (se abre la primera vez que se usa)"""
+    global _historial
+    with _historial_lock:
+        if _historial is None:
+            _historial = HistorialResultados()
+        return _historial
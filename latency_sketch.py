@@ -0,0 +1,203 @@
+import math
+import threading
+
+# Error relativo máximo de los percentiles (1%)
+PRECISION_DEFAULT = 0.01
+# Valores menores a esto (ms) se cuentan como cero
+VALOR_MINIMO = 1e-3
+NUM_BARRAS_DEFAULT = 10
+PERCENTILES = (50, 90, 95, 99)
+
+
+class HistogramaLatencias:
+    """
+    Sketch de cuantiles con buckets logarítmicos (estilo HDR/DDSketch): cada
+    valor cae en el bucket ceil(log_gamma(v)), así que cualquier percentil se
+    obtiene con un error relativo de a lo sumo `precision` guardando solo un
+    contador por bucket. Dos histogramas con la misma precisión se fusionan
+    sumando sus contadores, sin importar de qué tareas o archivos vengan.
+    """
+
+    def __init__(self, precision=PRECISION_DEFAULT):
+        self.precision = precision
+        self._gamma = (1 + precision) / (1 - precision)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets = {}
+        self.ceros = 0
+        self.cuenta = 0
+        self.suma = 0.0
+        self.minimo = None
+        self.maximo = None
+
+    def _indice(self, valor):
+        return math.ceil(math.log(valor) / self._log_gamma)
+
+    def _valor_bucket(self, indice):
+        """Valor representativo del bucket (equidistante en error relativo de sus bordes)"""
+        return 2 * self._gamma ** indice / (self._gamma + 1)
+
+    def agregar(self, valor, veces=1):
+        if valor <= VALOR_MINIMO:
+            self.ceros += veces
+        else:
+            indice = self._indice(valor)
+            self.buckets[indice] = self.buckets.get(indice, 0) + veces
+        self.cuenta += veces
+        self.suma += valor * veces
+        if self.minimo is None or valor < self.minimo:
+            self.minimo = valor
+        if self.maximo is None or valor > self.maximo:
+            self.maximo = valor
+
+    def fusionar(self, otro):
+        """Suma en este histograma los contadores de otro con la misma precisión"""
+        if otro.precision != self.precision:
+            raise ValueError(f"No se pueden fusionar precisiones distintas ({self.precision} y {otro.precision})")
+        for indice, conteo in otro.buckets.items():
+            self.buckets[indice] = self.buckets.get(indice, 0) + conteo
+        self.ceros += otro.ceros
+        self.cuenta += otro.cuenta
+        self.suma += otro.suma
+        if otro.minimo is not None and (self.minimo is None or otro.minimo < self.minimo):
+            self.minimo = otro.minimo
+        if otro.maximo is not None and (self.maximo is None or otro.maximo > self.maximo):
+            self.maximo = otro.maximo
+        return self
+
+    @property
+    def promedio(self):
+        return self.suma / self.cuenta if self.cuenta else None
+
+    def _recorrer(self):
+        """(valor representativo, conteo) en orden creciente"""
+        if self.ceros:
+            yield 0.0, self.ceros
+        for indice in sorted(self.buckets):
+            yield self._valor_bucket(indice), self.buckets[indice]
+
+    def percentil(self, p):
+        """Percentil p (0-100), acotado al mínimo y máximo reales"""
+        if not self.cuenta:
+            return None
+        rango = p / 100 * (self.cuenta - 1)
+        acumulado = 0
+        for valor, conteo in self._recorrer():
+            acumulado += conteo
+            if acumulado > rango:
+                return min(max(valor, self.minimo), self.maximo)
+        return self.maximo
+
+    def percentiles(self, ps=PERCENTILES):
+        if not self.cuenta:
+            return {}
+        return {f'p{p}': round(self.percentil(p), 2) for p in ps}
+
+    def histograma(self, num_barras=NUM_BARRAS_DEFAULT):
+        """Conteos en num_barras barras de igual ancho entre el mínimo y el máximo"""
+        if not self.cuenta:
+            return {'limites': [], 'conteos': []}
+        ancho = (self.maximo - self.minimo) / num_barras
+        conteos = [0] * num_barras
+        for valor, conteo in self._recorrer():
+            valor = min(max(valor, self.minimo), self.maximo)
+            barra = int((valor - self.minimo) / ancho) if ancho else 0
+            conteos[min(barra, num_barras - 1)] += conteo
+        limites = [round(self.minimo + i * ancho, 2) for i in range(num_barras + 1)]
+        return {'limites': limites, 'conteos': conteos}
+
+    def resumen(self):
+        """Cuenta, promedio, mínimo, máximo y percentiles"""
+        if not self.cuenta:
+            return {}
+        resumen = {
+            'total': self.cuenta,
+            'promedio': round(self.promedio, 2),
+            'minimo': self.minimo,
+            'maximo': self.maximo
+        }
+        resumen.update(self.percentiles())
+        return resumen
+
+    def a_dict(self):
+        """Forma serializable (JSON) del sketch"""
+        return {
+            'precision': self.precision,
+            'cuenta': self.cuenta,
+            'suma': self.suma,
+            'minimo': self.minimo,
+            'maximo': self.maximo,
+            'ceros': self.ceros,
+            'buckets': sorted(self.buckets.items())
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        histograma = cls(datos.get('precision', PRECISION_DEFAULT))
+        histograma.cuenta = datos['cuenta']
+        histograma.suma = datos['suma']
+        histograma.minimo = datos['minimo']
+        histograma.maximo = datos['maximo']
+        histograma.ceros = datos.get('ceros', 0)
+        histograma.buckets = {int(indice): conteo for indice, conteo in datos['buckets']}
+        return histograma
+
+
+class LatenciasPorUrl:
+    """
+    Un HistogramaLatencias global y uno por URL. fusionar suma otra instancia
+    URL por URL, así se combinan los sketches de varias tareas o corridas.
+    """
+
+    def __init__(self, precision=PRECISION_DEFAULT):
+        self.precision = precision
+        self.total = HistogramaLatencias(precision)
+        self.por_url = {}
+        self._lock = threading.Lock()
+
+    def agregar(self, url, valor):
+        with self._lock:
+            self.total.agregar(valor)
+            if url not in self.por_url:
+                self.por_url[url] = HistogramaLatencias(self.precision)
+            self.por_url[url].agregar(valor)
+
+    def fusionar(self, otro):
+        with self._lock:
+            self.total.fusionar(otro.total)
+            for url, histograma in otro.por_url.items():
+                if url not in self.por_url:
+                    self.por_url[url] = HistogramaLatencias(self.precision)
+                self.por_url[url].fusionar(histograma)
+        return self
+
+    def resumen(self, num_barras=NUM_BARRAS_DEFAULT, incluir_sketch=False):
+        """Percentiles e histograma global, percentiles por URL y opcionalmente los sketches"""
+        with self._lock:
+            resumen = {
+                'total': self.total.resumen(),
+                'histograma': self.total.histograma(num_barras),
+                'por_url': {url: histograma.resumen() for url, histograma in self.por_url.items()}
+            }
+            if incluir_sketch:
+                resumen['sketch'] = self._a_dict()
+            return resumen
+
+    def _a_dict(self):
+        return {
+            'total': self.total.a_dict(),
+            'por_url': {url: histograma.a_dict() for url, histograma in self.por_url.items()}
+        }
+
+    def a_dict(self):
+        with self._lock:
+            return self._a_dict()
+
+    @classmethod
+    def desde_dict(cls, datos):
+        total = HistogramaLatencias.desde_dict(datos['total'])
+        latencias = cls(total.precision)
+        latencias.total = total
+        latencias.por_url = {
+            url: HistogramaLatencias.desde_dict(histograma) for url, histograma in datos.get('por_url', {}).items()
+        }
+        return latencias
@@ -0,0 +1,324 @@
+"""
+Pruebas de carga open-loop: las solicitudes salen según un programa fijo de
+envíos (tasa objetivo, duración y rampa) sin esperar a que terminen las
+anteriores, y la latencia se mide desde la hora en que cada una debía salir.
+Así un servidor lento no frena al generador ni esconde sus propias demoras
+(coordinated omission): si una solicitud espera porque el generador está
+saturado, esa espera cuenta en su latencia.
+"""
+import math
+import os
+import threading
+import time
+
+import requests
+
+from analyzer import clasificar_velocidad
+from fetcher import descargar
+from latency_sketch import HistogramaLatencias
+
+RAMPAS_VALIDAS = ('constante', 'lineal', 'escalones')
+RAMPA_DEFAULT = 'constante'
+ESCALONES_DEFAULT = 5
+MAX_RPS = 2000
+MAX_DURACION_S = 3600
+TIMEOUT_CARGA = 30
+PERCENTILES_CARGA = (50, 90, 99)
+# Envíos pendientes (esperando cupo o en curso) por cada cupo de descarga de la
+# tarea; por encima el envío se descarta en lugar de crear otra corrutina
+FACTOR_PENDIENTES = int(os.environ.get('WEB_ANALYZER_FACTOR_PENDIENTES_CARGA', 4))
+ERROR_SOBRECARGA = 'overload'
+# Resultados individuales que guarda la tabla de una prueba de carga; los
+# demás solo cuentan en la SerieCarga y en los sketches de latencia
+MAX_FILAS_CARGA = int(os.environ.get('WEB_ANALYZER_MAX_FILAS_CARGA', 10000))
+
+
+class ProgramaCarga:
+    """
+    Instantes de envío (segundos desde el inicio) para una tasa objetivo rps
+    durante duracion_s. La rampa lleva la tasa de 0 a rps en rampa_s segundos:
+    'lineal' la sube de forma continua y 'escalones' en `escalones` saltos
+    iguales; 'constante' arranca directamente en rps.
+    """
+
+    def __init__(self, rps, duracion_s, rampa=RAMPA_DEFAULT, rampa_s=0, escalones=ESCALONES_DEFAULT):
+        if rampa not in RAMPAS_VALIDAS:
+            raise ValueError(f"Rampa no válida, usar una de: {', '.join(RAMPAS_VALIDAS)}")
+        if not 0 < rps <= MAX_RPS:
+            raise ValueError(f"rps debe estar entre 0 y {MAX_RPS}")
+        if not 0 < duracion_s <= MAX_DURACION_S:
+            raise ValueError(f"duracion_s debe estar entre 0 y {MAX_DURACION_S}")
+        if rampa_s < 0 or (rampa == 'escalones' and (not isinstance(escalones, int) or escalones < 1)):
+            raise ValueError('rampa_s no puede ser negativo y escalones debe ser un entero mayor que 0')
+        self.rps = rps
+        self.duracion_s = duracion_s
+        self.rampa = rampa
+        self.rampa_s = min(rampa_s, duracion_s) if rampa != 'constante' else 0
+        self.escalones = escalones
+        self._tramos = self._calcular_tramos()
+
+    def _calcular_tramos(self):
+        """[(inicio, fin, tasa al inicio, tasa al final, envíos antes del tramo)]"""
+        tramos = []
+        if self.rampa == 'lineal' and self.rampa_s:
+            tramos.append((0, self.rampa_s, 0, self.rps))
+        elif self.rampa == 'escalones' and self.rampa_s:
+            largo = self.rampa_s / self.escalones
+            for i in range(self.escalones):
+                tasa = self.rps * (i + 1) / self.escalones
+                tramos.append((i * largo, (i + 1) * largo, tasa, tasa))
+        if self.rampa_s < self.duracion_s:
+            tramos.append((self.rampa_s, self.duracion_s, self.rps, self.rps))
+
+        acumulados = []
+        previos = 0.0
+        for inicio, fin, tasa_inicio, tasa_fin in tramos:
+            acumulados.append((inicio, fin, tasa_inicio, tasa_fin, previos))
+            previos += (tasa_inicio + tasa_fin) / 2 * (fin - inicio)
+        return acumulados
+
+    def enviados_hasta(self, t):
+        """Cantidad (continua) de envíos programados antes del instante t"""
+        for inicio, fin, tasa_inicio, tasa_fin, previos in self._tramos:
+            if t <= fin:
+                u = max(t - inicio, 0)
+                pendiente = (tasa_fin - tasa_inicio) / (fin - inicio)
+                return previos + tasa_inicio * u + pendiente * u * u / 2
+        inicio, fin, tasa_inicio, tasa_fin, previos = self._tramos[-1]
+        return previos + (tasa_inicio + tasa_fin) / 2 * (fin - inicio)
+
+    def __len__(self):
+        return math.ceil(self.enviados_hasta(self.duracion_s) - 1e-9)
+
+    def por_segundo(self):
+        """Envíos programados en cada segundo de la prueba"""
+        segundos = math.ceil(self.duracion_s)
+        return [
+            math.ceil(self.enviados_hasta(min(s + 1, self.duracion_s)) - 1e-9)
+            - math.ceil(self.enviados_hasta(s) - 1e-9)
+            for s in range(segundos)
+        ]
+
+    def instantes(self):
+        """Genera el instante (segundos desde el inicio) del envío k, para k = 0, 1, 2..."""
+        total = len(self)
+        k = 0
+        for inicio, fin, tasa_inicio, tasa_fin, previos in self._tramos:
+            pendiente = (tasa_fin - tasa_inicio) / (fin - inicio)
+            tramo = previos + (tasa_inicio + tasa_fin) / 2 * (fin - inicio)
+            while k < total and k < tramo:
+                # Se invierte N(u) = tasa_inicio * u + pendiente * u² / 2 = k - previos
+                x = k - previos
+                if pendiente:
+                    u = (-tasa_inicio + math.sqrt(tasa_inicio ** 2 + 2 * pendiente * x)) / pendiente
+                else:
+                    u = x / tasa_inicio
+                yield inicio + min(u, fin - inicio)
+                k += 1
+
+    def a_dict(self):
+        return {
+            'rps': self.rps,
+            'duracion_s': self.duracion_s,
+            'rampa': self.rampa,
+            'rampa_s': self.rampa_s,
+            'escalones': self.escalones
+        }
+
+
+def enviar_sin_analizar(url, modo, max_bytes=None):
+    """
+    Descarga una URL sin parsear el cuerpo (el generador no debe quedar limitado
+    por CPU). Retorna (status, bytes, error, inicio, fin) con inicio y fin
+    tomados con perf_counter en el hilo que hizo la descarga.
+    """
+    inicio = time.perf_counter()
+    try:
+        response, _ = descargar(url, modo, TIMEOUT_CARGA, max_bytes=max_bytes)
+        status, tamano = response.status_code, len(response.content)
+        error = None if response.ok else f"HTTP {response.status_code}"
+    except requests.exceptions.Timeout:
+        status, tamano, error = 0, 0, f'Timeout - La solicitud tardó más de {TIMEOUT_CARGA} segundos'
+    except Exception as e:
+        status, tamano, error = 0, 0, str(e)
+    return status, tamano, error, inicio, time.perf_counter()
+
+
+def resultado_carga(status, tamano, error, modo, programado, inicio, fin, inicio_prueba, epoch_prueba):
+    """
+    Resultado de una solicitud de la prueba. load_time_ms se mide desde la hora
+    programada (corregido por coordinated omission) y service_time_ms desde que
+    la solicitud salió de verdad; la diferencia es queue_delay_ms.
+    """
+    return {
+        'status': status,
+        'error': error,
+        'mode': modo,
+        'response_time': round(fin - programado, 3),
+        'load_time_ms': round((fin - programado) * 1000, 2),
+        'service_time_ms': round((fin - inicio) * 1000, 2),
+        'queue_delay_ms': round(max(inicio - programado, 0) * 1000, 2),
+        'speed_rating': clasificar_velocidad(fin - programado) if not error else 'ERROR',
+        'size_bytes': tamano,
+        'size_kb': round(tamano / 1024, 2),
+        'scheduled_start': round(epoch_prueba + (programado - inicio_prueba), 3),
+        'actual_start': round(epoch_prueba + (inicio - inicio_prueba), 3),
+        'load_offset_ms': round((programado - inicio_prueba) * 1000, 2)
+    }
+
+
+def resultado_descartado(modo, programado, inicio_prueba, epoch_prueba):
+    """
+    Resultado de un envío que no salió porque el generador ya tenía demasiados
+    pendientes: cuenta como error 'overload' en su segundo programado, sin
+    latencia (no la tiene y un 0 bajaría los percentiles).
+    """
+    return {
+        'status': 0,
+        'error': ERROR_SOBRECARGA,
+        'mode': modo,
+        'response_time': None,
+        'load_time_ms': None,
+        'service_time_ms': None,
+        'queue_delay_ms': None,
+        'speed_rating': 'ERROR',
+        'size_bytes': 0,
+        'size_kb': 0,
+        'dropped': True,
+        'scheduled_start': round(epoch_prueba + (programado - inicio_prueba), 3),
+        'actual_start': None,
+        'load_offset_ms': round((programado - inicio_prueba) * 1000, 2)
+    }
+
+
+class SerieCarga:
+    """
+    Estadísticas por segundo de una prueba de carga. Las latencias se agrupan
+    por el segundo en que la solicitud debía salir (un segundo queda completo
+    cuando terminaron todas las programadas en él) y el throughput logrado por
+    el segundo en que terminaron. Los envíos descartados por sobrecarga solo
+    cuentan como errores de su segundo programado.
+    """
+
+    def __init__(self, programa, objetivo):
+        self.programa = programa  # ProgramaCarga.a_dict()
+        self.objetivo = objetivo  # envíos programados por segundo
+        self._lock = threading.Lock()
+        self._segundos = {}
+        self.latencias = HistogramaLatencias()
+        self.servicio = HistogramaLatencias()
+        self.completados = 0
+        self.errores = 0
+        self.descartados = 0
+        self.ultimo_fin_ms = 0.0
+
+    @classmethod
+    def para(cls, programa):
+        return cls(programa.a_dict(), programa.por_segundo())
+
+    def _segundo(self, s):
+        if s not in self._segundos:
+            self._segundos[s] = {
+                'latencias': HistogramaLatencias(),
+                'registrados': 0,
+                'enviados': 0,
+                'completados': 0,
+                'errores': 0,
+                'descartados': 0
+            }
+        return self._segundos[s]
+
+    def registrar(self, resultado):
+        programado_ms = resultado['load_offset_ms']
+        with self._lock:
+            segundo = self._segundo(int(programado_ms // 1000))
+            if resultado.get('dropped'):
+                segundo['registrados'] += 1
+                segundo['errores'] += 1
+                segundo['descartados'] += 1
+                self.errores += 1
+                self.descartados += 1
+                return
+            segundo['latencias'].agregar(resultado['load_time_ms'])
+            segundo['registrados'] += 1
+            if resultado.get('error'):
+                segundo['errores'] += 1
+                self.errores += 1
+            self._segundo(int((programado_ms + resultado['queue_delay_ms']) // 1000))['enviados'] += 1
+            fin_ms = programado_ms + resultado['load_time_ms']
+            self._segundo(int(fin_ms // 1000))['completados'] += 1
+            self.latencias.agregar(resultado['load_time_ms'])
+            self.servicio.agregar(resultado['service_time_ms'])
+            self.completados += 1
+            self.ultimo_fin_ms = max(self.ultimo_fin_ms, fin_ms)
+
+    def segundos(self, desde=0):
+        """Series por segundo desde el segundo `desde`: objetivo vs logrado y percentiles de latencia"""
+        with self._lock:
+            ultimo = max(list(self._segundos) + [len(self.objetivo) - 1], default=-1)
+            filas = []
+            for s in range(desde, ultimo + 1):
+                datos = self._segundos.get(s)
+                objetivo = self.objetivo[s] if s < len(self.objetivo) else 0
+                fila = {
+                    'segundo': s,
+                    'objetivo_rps': objetivo,
+                    'enviados_rps': datos['enviados'] if datos else 0,
+                    'logrado_rps': datos['completados'] if datos else 0,
+                    'errores': datos['errores'] if datos else 0,
+                    'descartados': datos.get('descartados', 0) if datos else 0,
+                    'completo': (datos['registrados'] if datos else 0) >= objetivo
+                }
+                if datos and datos['latencias'].cuenta:
+                    for p in PERCENTILES_CARGA:
+                        fila[f'p{p}'] = round(datos['latencias'].percentil(p), 2)
+                    fila['max'] = round(datos['latencias'].maximo, 2)
+                filas.append(fila)
+            return filas
+
+    def resumen(self):
+        """Totales de la prueba: throughput objetivo vs logrado y latencia corregida vs tiempo de servicio"""
+        with self._lock:
+            duracion = max(self.ultimo_fin_ms / 1000, self.programa['duracion_s'])
+            return {
+                'programa': self.programa,
+                'programados': sum(self.objetivo),
+                'completados': self.completados,
+                'errores': self.errores,
+                'descartados': self.descartados,
+                'objetivo_rps': self.programa['rps'],
+                'logrado_rps': round(self.completados / duracion, 2) if self.completados else 0,
+                'latencia': self.latencias.resumen(),
+                'tiempo_servicio': self.servicio.resumen()
+            }
+
+    def a_dict(self):
+        with self._lock:
+            return {
+                'programa': self.programa,
+                'objetivo': self.objetivo,
+                'segundos': {
+                    s: dict(datos, latencias=datos['latencias'].a_dict()) for s, datos in self._segundos.items()
+                },
+                'latencias': self.latencias.a_dict(),
+                'servicio': self.servicio.a_dict(),
+                'completados': self.completados,
+                'errores': self.errores,
+                'descartados': self.descartados,
+                'ultimo_fin_ms': self.ultimo_fin_ms
+            }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        serie = cls(datos['programa'], datos['objetivo'])
+        serie._segundos = {
+            int(s): dict(fila, latencias=HistogramaLatencias.desde_dict(fila['latencias']))
+            for s, fila in datos['segundos'].items()
+        }
+        serie.latencias = HistogramaLatencias.desde_dict(datos['latencias'])
+        serie.servicio = HistogramaLatencias.desde_dict(datos['servicio'])
+        serie.completados = datos['completados']
+        serie.errores = datos['errores']
+        serie.descartados = datos.get('descartados', 0)
+        serie.ultimo_fin_ms = datos['ultimo_fin_ms']
+        return serie
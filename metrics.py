@@ -0,0 +1,183 @@
+"""
+Métricas de la aplicación en el formato de texto de Prometheus (0.0.4), sin
+depender de prometheus_client. /metrics expone el REGISTRO del proceso.
+"""
+import math
+import threading
+from abc import ABC, abstractmethod
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_TAREAS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+def _formatear(valor):
+    if valor == math.inf:
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(nombres, valores, extra=None):
+    pares = list(zip(nombres, valores)) + (extra or [])
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in pares) + '}'
+
+
+class _Metrica(ABC):
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _clave(self, etiquetas):
+        return tuple(str(etiquetas.get(nombre, '')) for nombre in self.etiquetas)
+
+    @abstractmethod
+    def _lineas(self):
+        """Líneas de las series de la métrica, sin HELP ni TYPE"""
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        with self._lock:
+            lineas.extend(self._lineas())
+        return '\n'.join(lineas)
+
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def incrementar(self, valor=1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._series[clave] = self._series.get(clave, 0) + valor
+
+    def _lineas(self):
+        return [
+            f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_formatear(valor)}"
+            for clave, valor in sorted(self._series.items())
+        ]
+
+
+class Medidor(_Metrica):
+    tipo = 'gauge'
+
+    def fijar(self, valor, **etiquetas):
+        with self._lock:
+            self._series[self._clave(etiquetas)] = valor
+
+    def incrementar(self, valor=1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._series[clave] = self._series.get(clave, 0) + valor
+
+    def decrementar(self, valor=1, **etiquetas):
+        self.incrementar(-valor, **etiquetas)
+
+    def valor(self, **etiquetas):
+        with self._lock:
+            return self._series.get(self._clave(etiquetas), 0)
+
+    def _lineas(self):
+        return [
+            f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_formatear(valor)}"
+            for clave, valor in sorted(self._series.items())
+        ]
+
+
+class Histograma(_Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observar(self, valor, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                # [cuentas por bucket (no acumuladas), suma, cuenta]
+                serie = self._series[clave] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += valor
+            serie[2] += 1
+
+    def _lineas(self):
+        lineas = []
+        for clave, (cuentas, suma, cuenta) in sorted(self._series.items()):
+            acumulado = 0
+            for limite, cuenta_bucket in zip(self.buckets, cuentas):
+                acumulado += cuenta_bucket
+                etiquetas = _etiquetas(self.etiquetas, clave, [('le', _formatear(limite))])
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_formatear(round(suma, 6))}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {cuenta}")
+        return lineas
+
+
+class RegistroMetricas:
+    """Métricas de un proceso en orden de registro"""
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica):
+        with self._lock:
+            return self._metricas.setdefault(metrica.nombre, metrica)
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def medidor(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Medidor(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def exponer(self):
+        with self._lock:
+            metricas = list(self._metricas.values())
+        return '\n'.join(metrica.exponer() for metrica in metricas) + '\n'
+
+
+REGISTRO = RegistroMetricas()
+
+DESCARGA_SEGUNDOS = REGISTRO.histograma(
+    'web_analyzer_fetch_seconds', 'Tiempo de descarga hasta el último byte, redirecciones incluidas', ('mode',)
+)
+PARSEO_SEGUNDOS = REGISTRO.histograma(
+    'web_analyzer_parse_seconds', 'Tiempo de parseo y métricas en el pool de procesos (con la espera del pool)'
+)
+RESULTADOS = REGISTRO.contador('web_analyzer_results_total', 'Resultados registrados por desenlace', ('outcome',))
+BYTES_DESCARGADOS = REGISTRO.contador('web_analyzer_downloaded_bytes_total', 'Bytes de HTML descargados')
+TAREA_SEGUNDOS = REGISTRO.histograma(
+    'web_analyzer_task_duration_seconds', 'Duración de las tareas desde que salen de la cola', ('status',),
+    BUCKETS_TAREAS
+)
+TAREAS = REGISTRO.medidor('web_analyzer_tasks', 'Tareas por estado en el pool', ('state',))
+EN_VUELO = REGISTRO.medidor(
+    'web_analyzer_inflight', 'Descargas o parseos en curso (los parseos incluyen los que esperan un proceso)', ('pool',)
+)
+CAPACIDAD = REGISTRO.medidor('web_analyzer_workers', 'Workers de cada pool', ('pool',))
+UTILIZACION = REGISTRO.medidor('web_analyzer_worker_utilization', 'Fracción de workers ocupados por pool', ('pool',))
+
+
+def desenlace(resultado):
+    """Etiqueta outcome de un resultado: ok, not_modified, timeout o error"""
+    if resultado.get('not_modified'):
+        return 'not_modified'
+    if resultado.get('error'):
+        return 'timeout' if resultado.get('title') == 'Timeout' else 'error'
+    return 'ok'
@@ -0,0 +1,97 @@
+import cProfile
+import io
+import os
+import pstats
+import time
+from contextlib import contextmanager, nullcontext
+
+# Tiempos por etapa en cada resultado (se activan por tarea con "etapas": true)
+ETAPAS_DEFAULT = os.environ.get('WEB_ANALYZER_ETAPAS', '0') == '1'
+LINEAS_PERFIL = 40
+
+
+class Cronometro:
+    """
+    Acumula en ms el tiempo de cada etapa de un análisis. Es lo bastante
+    barato para dejarlo activo en producción: dos perf_counter por etapa.
+    """
+
+    def __init__(self):
+        self.etapas = {}
+
+    @contextmanager
+    def etapa(self, nombre):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.agregar(nombre, (time.perf_counter() - inicio) * 1000)
+
+    def agregar(self, nombre, ms):
+        self.etapas[nombre] = round(self.etapas.get(nombre, 0) + ms, 3)
+
+
+class CronometroNulo:
+    """Cronómetro desactivado: no mide nada"""
+
+    etapas = None
+
+    def etapa(self, nombre):
+        return nullcontext()
+
+    def agregar(self, nombre, ms):
+        pass
+
+
+CRONOMETRO_NULO = CronometroNulo()
+
+
+def crear_cronometro(activo):
+    return Cronometro() if activo else CRONOMETRO_NULO
+
+
+def perfilar_llamada(funcion, *args):
+    """
+    Ejecuta funcion(*args) bajo cProfile y retorna (resultado, estadísticas).
+    Las estadísticas son el dict de pstats, que se puede enviar entre procesos.
+    """
+    perfil = cProfile.Profile()
+    resultado = perfil.runcall(funcion, *args)
+    perfil.create_stats()
+    return resultado, perfil.stats
+
+
+class _Estadisticas:
+    """Adaptador para cargar en pstats.Stats un dict de estadísticas ya creado"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class PerfilTarea:
+    """Suma los perfiles de cProfile de todas las llamadas perfiladas de una tarea"""
+
+    def __init__(self):
+        self.llamadas = 0
+        self._stats = None
+
+    def agregar(self, stats):
+        self.llamadas += 1
+        if self._stats is None:
+            self._stats = pstats.Stats(_Estadisticas(stats))
+        else:
+            self._stats.add(_Estadisticas(stats))
+
+    def reporte(self, lineas=LINEAS_PERFIL):
+        """Texto de pstats con las funciones de más tiempo acumulado y de más tiempo propio"""
+        if self._stats is None:
+            return ''
+        salida = io.StringIO()
+        self._stats.stream = salida
+        salida.write(f"{self.llamadas} llamadas perfiladas\n\n")
+        self._stats.sort_stats('cumulative').print_stats(lineas)
+        self._stats.sort_stats('tottime').print_stats(lineas)
+        return salida.getvalue()
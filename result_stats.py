@@ -0,0 +1,237 @@
+import codecs
+import json
+import math
+import random
+
+from latency_sketch import HistogramaLatencias
+
+TAMANO_BLOQUE = 64 * 1024
+# Tamaño máximo de un valor suelto (un resultado); más que esto es un JSON inválido
+MAX_TAMANO_VALOR = 16 * 1024 * 1024
+# Máximo de puntos individuales que se devuelven para los gráficos de series
+MAX_PUNTOS_SERIE = 5000
+
+_decodificador = json.JSONDecoder()
+
+
+class StreamConPrefijo:
+    """
+    Envuelve un stream leyendo por adelantado sus primeros bytes (para
+    detectar el formato) sin perderlos para el lector que venga después.
+    """
+
+    def __init__(self, stream, largo):
+        self._stream = stream
+        self.prefijo = stream.read(largo)
+        self._pendiente = self.prefijo
+
+    def read(self, n=-1):
+        if not self._pendiente:
+            return self._stream.read(n)
+        if n is None or n < 0:
+            datos, self._pendiente = self._pendiente + self._stream.read(), b''
+            return datos
+        datos, self._pendiente = self._pendiente[:n], self._pendiente[n:]
+        if len(datos) < n:
+            datos += self._stream.read(n - len(datos))
+        return datos
+
+
+class LectorJSON:
+    """
+    Lee un JSON desde un stream binario por bloques, sin cargarlo completo.
+    Permite consumir caracteres sueltos y decodificar valores uno a uno con
+    raw_decode, pidiendo más bloques cuando el valor quedó cortado.
+    """
+
+    def __init__(self, stream, tamano_bloque=TAMANO_BLOQUE):
+        self._stream = stream
+        self._tamano_bloque = tamano_bloque
+        self._decodificador = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._fin = False
+
+    def _leer_bloque(self):
+        if self._fin:
+            return False
+        bloque = self._stream.read(self._tamano_bloque)
+        if not bloque:
+            self._fin = True
+            self._buffer = self._buffer[self._pos:] + self._decodificador.decode(b'', final=True)
+        else:
+            self._buffer = self._buffer[self._pos:] + self._decodificador.decode(bloque)
+        self._pos = 0
+        return True
+
+    def _saltar_espacios(self):
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buffer) or not self._leer_bloque():
+                return
+
+    def ver(self):
+        """Siguiente carácter significativo sin consumirlo ('' al final)"""
+        self._saltar_espacios()
+        return self._buffer[self._pos] if self._pos < len(self._buffer) else ''
+
+    def esperar(self, caracter):
+        if self.ver() != caracter:
+            raise json.JSONDecodeError(f"Se esperaba '{caracter}'", self._buffer, self._pos)
+        self._pos += 1
+
+    def valor(self):
+        """Decodifica el siguiente valor JSON completo"""
+        self._saltar_espacios()
+        while True:
+            try:
+                valor, fin = _decodificador.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # Puede ser un valor cortado al final del buffer: leer más y reintentar
+                if len(self._buffer) - self._pos > MAX_TAMANO_VALOR or not self._leer_bloque():
+                    raise
+                continue
+            # Un número al final del buffer puede seguir en el próximo bloque
+            if fin == len(self._buffer) and not self._fin:
+                self._leer_bloque()
+                continue
+            self._pos = fin
+            return valor
+
+
+def leer_resultados_json(stream):
+    """
+    Recorre un archivo con la forma {"url": [resultado, ...], ...} y entrega
+    (url, resultado) de a uno, leyendo el stream por bloques.
+    """
+    lector = LectorJSON(stream)
+    lector.esperar('{')
+    if lector.ver() == '}':
+        return
+    while True:
+        url = lector.valor()
+        lector.esperar(':')
+        lector.esperar('[')
+        if lector.ver() != ']':
+            while True:
+                yield url, lector.valor()
+                if lector.ver() != ',':
+                    break
+                lector.esperar(',')
+        lector.esperar(']')
+        if lector.ver() != ',':
+            break
+        lector.esperar(',')
+    lector.esperar('}')
+
+
+def leer_resultados_ndjson(stream):
+    """
+    Recorre un archivo NDJSON con una línea por resultado, ya sea como
+    {"url": ..., "resultado": {...}} (el formato de /progreso) o como el
+    resultado plano con su campo "url".
+    """
+    decodificador = codecs.getincrementaldecoder('utf-8')()
+    pendiente = ''
+    while True:
+        bloque = stream.read(TAMANO_BLOQUE)
+        texto = pendiente + decodificador.decode(bloque, final=not bloque)
+        lineas = texto.split('\n')
+        pendiente = lineas.pop() if bloque else ''
+        for linea in lineas:
+            linea = linea.strip()
+            if not linea:
+                continue
+            item = json.loads(linea)
+            if 'resultado' in item:
+                yield item['url'], item['resultado']
+            else:
+                yield item.get('url'), item
+        if not bloque:
+            return
+
+
+class AcumuladorValores:
+    """
+    Acumula una serie numérica: cuenta, mínimo, máximo, promedio y varianza se
+    actualizan al vuelo (Welford); con_percentiles además alimenta un
+    HistogramaLatencias para los percentiles y el histograma, sin guardar los
+    valores.
+    """
+
+    def __init__(self, con_percentiles=True):
+        self.cuenta = 0
+        self.minimo = None
+        self.maximo = None
+        self._media = 0.0
+        self._m2 = 0.0
+        self.sketch = HistogramaLatencias() if con_percentiles else None
+
+    def agregar(self, valor):
+        self.cuenta += 1
+        if self.minimo is None or valor < self.minimo:
+            self.minimo = valor
+        if self.maximo is None or valor > self.maximo:
+            self.maximo = valor
+        delta = valor - self._media
+        self._media += delta / self.cuenta
+        self._m2 += delta * (valor - self._media)
+        if self.sketch is not None:
+            self.sketch.agregar(valor)
+
+    @property
+    def promedio(self):
+        return self._media if self.cuenta else None
+
+    @property
+    def desviacion(self):
+        """Desviación estándar poblacional"""
+        return math.sqrt(self._m2 / self.cuenta) if self.cuenta else None
+
+    def percentiles(self):
+        return self.sketch.percentiles() if self.sketch is not None else {}
+
+    def resumen(self):
+        """Promedio, mínimo, máximo, desviación y percentiles (si se calculan)"""
+        if not self.cuenta:
+            return {}
+        resumen = {
+            'promedio': round(self.promedio, 2),
+            'minimo': self.minimo,
+            'maximo': self.maximo,
+            'desviacion': round(self.desviacion, 2),
+            'total': self.cuenta
+        }
+        resumen.update(self.percentiles())
+        return resumen
+
+
+class MuestraSerie:
+    """
+    Muestreo de reservorio de tamaño fijo que conserva el orden original: con
+    menos de max_puntos elementos guarda todos, con más guarda una muestra
+    uniforme.
+    """
+
+    def __init__(self, max_puntos=MAX_PUNTOS_SERIE, semilla=0):
+        self.max_puntos = max_puntos
+        self.vistos = 0
+        self._puntos = []
+        self._azar = random.Random(semilla)
+
+    def agregar(self, punto):
+        if len(self._puntos) < self.max_puntos:
+            self._puntos.append((self.vistos, punto))
+        else:
+            j = self._azar.randrange(self.vistos + 1)
+            if j < self.max_puntos:
+                self._puntos[j] = (self.vistos, punto)
+        self.vistos += 1
+
+    @property
+    def muestreada(self):
+        return self.vistos > self.max_puntos
+
+    def puntos(self):
+        return [punto for _, punto in sorted(self._puntos, key=lambda p: p[0])]
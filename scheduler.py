@@ -0,0 +1,109 @@
+import asyncio
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+# burst: todas las repeticiones de una URL pueden salir a la vez
+# sequential: cada repetición espera a que termine la anterior (más intervalo_ms)
+# spaced: la repetición k se programa en inicio + k * intervalo_ms
+ESTRATEGIAS_VALIDAS = ('burst', 'sequential', 'spaced')
+ESTRATEGIA_DEFAULT = 'burst'
+MAX_POR_HOST_DEFAULT = 6
+
+
+def host_de(url):
+    return urlparse(url).netloc.lower()
+
+
+def _round_robin(colas):
+    colas = [deque(cola) for cola in colas if cola]
+    intercalados = []
+    while colas:
+        for cola in colas:
+            intercalados.append(cola.popleft())
+        colas = [cola for cola in colas if cola]
+    return intercalados
+
+
+def intercalar_por_host(trabajos):
+    """
+    Reordena los trabajos en round-robin por host, y dentro de cada host por URL,
+    para que los cupos se repartan entre orígenes distintos y las repeticiones de
+    una misma URL no salgan todas juntas.
+    """
+    por_host = defaultdict(lambda: defaultdict(list))
+    for trabajo in trabajos:
+        por_host[host_de(trabajo['url'])][trabajo['url']].append(trabajo)
+
+    return _round_robin(_round_robin(por_url.values()) for por_url in por_host.values())
+
+
+class PlanificadorHosts:
+    """
+    Controla cuándo puede empezar cada descarga: limita las descargas
+    simultáneas por host y espacia las repeticiones de una misma URL según la
+    estrategia elegida.
+    """
+
+    def __init__(self, estrategia=ESTRATEGIA_DEFAULT, intervalo_ms=0, max_por_host=MAX_POR_HOST_DEFAULT):
+        if estrategia not in ESTRATEGIAS_VALIDAS:
+            raise ValueError(f"Estrategia no válida: {estrategia}")
+        self.estrategia = estrategia
+        self.intervalo = max(intervalo_ms, 0) / 1000
+        self.max_por_host = max_por_host
+        self._inicio_mono = time.perf_counter()
+        self._inicio_wall = time.time()
+        self._hosts = {}
+        self._urls = {}
+
+    def _semaforo_host(self, url):
+        host = host_de(url)
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.max_por_host) if self.max_por_host else None
+        return self._hosts[host]
+
+    def _estado_url(self, url):
+        if url not in self._urls:
+            self._urls[url] = {'lock': asyncio.Lock(), 'siguiente': self._inicio_mono}
+        return self._urls[url]
+
+    def a_epoch(self, instante):
+        """Convierte un instante de perf_counter a segundos epoch"""
+        return self._inicio_wall + (instante - self._inicio_mono)
+
+    @asynccontextmanager
+    async def turno(self, trabajo):
+        """
+        Espera hasta la hora programada del trabajo y hasta tener cupo en su host.
+        Entrega la hora programada (epoch) para registrar el retraso de cola.
+        """
+        url = trabajo['url']
+        secuencial = self.estrategia == 'sequential'
+        # Solo la estrategia secuencial guarda estado por URL (un rastreo pasa por cientos de miles)
+        estado = self._estado_url(url) if secuencial else None
+
+        if secuencial:
+            await estado['lock'].acquire()
+        try:
+            if self.estrategia == 'spaced':
+                programado = self._inicio_mono + trabajo.get('indice', 0) * self.intervalo
+            elif secuencial:
+                programado = estado['siguiente']
+            else:
+                programado = self._inicio_mono
+
+            espera = programado - time.perf_counter()
+            if espera > 0:
+                await asyncio.sleep(espera)
+
+            semaforo = self._semaforo_host(url)
+            if semaforo is None:
+                yield self.a_epoch(programado)
+            else:
+                async with semaforo:
+                    yield self.a_epoch(programado)
+        finally:
+            if secuencial:
+                estado['siguiente'] = time.perf_counter() + self.intervalo
+                estado['lock'].release()
@@ -1,5 +1,9 @@
 let resultadosGlobales = {};
+let tareaActual = null;
+let ultimaTarea = null;
 let urlsPreview = [];
+let tarjetasEnVivo = new Map();
+let estadisticasPendientes = false;
 
 function previewData() {
   const fileInput = document.getElementById('fileInput');
@@ -150,6 +154,11 @@ function enviar() {
       }
 
       const payload = {
+        mode: document.getElementById('modo').value,
+        revalidar: document.getElementById('revalidar').value === 'si',
+        subrecursos: document.getElementById('subrecursos').value
+          ? { metodo: document.getElementById('subrecursos').value }
+          : false,
         urls: urls.map(url => ({ url, repeticiones }))
       };
 
@@ -166,7 +175,7 @@ function enviar() {
       })
       .then(data => {
         const taskId = data.task_id;
-        consultarProgreso(taskId);
+        escucharResultados(taskId);
       })
       .catch(error => {
         console.error('Error:', error);
@@ -188,21 +197,131 @@ function enviar() {
   reader.readAsText(fileInput.files[0]);
 }
 
+function escucharResultados(taskId) {
+  // Sin soporte de EventSource se vuelve a consultar el progreso periódicamente
+  if (!window.EventSource) {
+    return consultarProgreso(taskId);
+  }
+
+  tareaActual = taskId;
+  ultimaTarea = taskId;
+  resultadosGlobales = {};
+  prepararResultadosEnVivo();
+  document.getElementById('cancelBtn').style.display = 'inline-flex';
+
+  const fuente = new EventSource(`/stream/${taskId}`);
+
+  fuente.addEventListener('estado', e => {
+    const data = JSON.parse(e.data);
+    if (data.status === 'queued') {
+      actualizarBarra(0);
+      document.getElementById('progressText').textContent = `En cola (posición ${data.posicion_cola || '-'})`;
+    }
+  });
+
+  fuente.addEventListener('resultado', e => {
+    const data = JSON.parse(e.data);
+    agregarResultadoEnVivo(data.url, data.resultado);
+    actualizarBarra(data.progress);
+  });
+
+  fuente.addEventListener('fin', e => {
+    const data = JSON.parse(e.data);
+    fuente.close();
+    tareaActual = null;
+    renderizarEstadisticas(resultadosGlobales);
+    resetearInterfaz();
+    habilitarBotonesExportacion();
+    if (data.status === 'done') {
+      mostrarNotificacion('Análisis completado exitosamente', 'success');
+    } else {
+      mostrarNotificacion('Análisis cancelado', 'error');
+    }
+  });
+
+  fuente.onerror = () => {
+    // EventSource reintenta solo (con Last-Event-ID); si se rinde, pasar a consultas
+    if (fuente.readyState === EventSource.CLOSED && tareaActual === taskId) {
+      console.error('Se cerró el stream de resultados');
+      consultarProgreso(taskId);
+    }
+  };
+}
+
+function prepararResultadosEnVivo() {
+  tarjetasEnVivo = new Map();
+  document.getElementById('tablaResultados').innerHTML = '';
+  document.getElementById('resultsStats').innerHTML = '';
+  document.getElementById('resultsCard').style.display = 'block';
+}
+
+function agregarResultadoEnVivo(url, resultado) {
+  if (!resultadosGlobales[url]) {
+    resultadosGlobales[url] = [];
+  }
+  resultadosGlobales[url].push(resultado);
+
+  let urlCard = tarjetasEnVivo.get(url);
+  if (!urlCard) {
+    urlCard = crearUrlCard(url, resultado);
+    tarjetasEnVivo.set(url, urlCard);
+    document.getElementById('tablaResultados').appendChild(urlCard);
+  }
+  urlCard.querySelector('.url-content').appendChild(crearRepeticionCard(resultado, resultadosGlobales[url].length - 1));
+  programarEstadisticas();
+}
+
+function programarEstadisticas() {
+  // Recalcular las estadísticas como mucho una vez por frame
+  if (estadisticasPendientes) {
+    return;
+  }
+  estadisticasPendientes = true;
+  requestAnimationFrame(() => {
+    estadisticasPendientes = false;
+    renderizarEstadisticas(resultadosGlobales);
+  });
+}
+
 function consultarProgreso(taskId) {
+  tareaActual = taskId;
+  ultimaTarea = taskId;
+  resultadosGlobales = {};
+  let cursor = 0;
+  let consultando = false;
+  document.getElementById('cancelBtn').style.display = 'inline-flex';
+
   const intervalo = setInterval(() => {
-    fetch(`/progreso/${taskId}`)
+    // Evitar consultas solapadas si el servidor tarda más que el intervalo
+    if (consultando) {
+      return;
+    }
+    consultando = true;
+
+    fetch(`/progreso/${taskId}?cursor=${cursor}`)
       .then(res => res.json())
       .then(data => {
-        const progreso = data.progress;
-        actualizarBarra(progreso);
+        if (data.status === 'queued') {
+          actualizarBarra(0);
+          document.getElementById('progressText').textContent = `En cola (posición ${data.posicion_cola || '-'})`;
+          return;
+        }
+
+        // Solo llegan los resultados nuevos desde el último cursor
+        agregarResultados(data.nuevos);
+        cursor = data.cursor;
+        actualizarBarra(data.progress);
 
-        if (data.status === 'done') {
+        if (data.status === 'done' || data.status === 'cancelled') {
           clearInterval(intervalo);
-          resultadosGlobales = data.result;
-          mostrarResultadosTabla(resultadosGlobales);
-          resetearInterfaz();
-          habilitarBotonesExportacion();
-          mostrarNotificacion('Análisis completado exitosamente', 'success');
+          tareaActual = null;
+          return cargarResultadosCompletos(taskId).then(() => {
+            if (data.status === 'done') {
+              mostrarNotificacion('Análisis completado exitosamente', 'success');
+            } else {
+              mostrarNotificacion('Análisis cancelado', 'error');
+            }
+          });
         }
       })
       .catch(error => {
@@ -210,10 +329,52 @@ function consultarProgreso(taskId) {
         clearInterval(intervalo);
         mostrarNotificacion('Error al consultar el progreso', 'error');
         resetearInterfaz();
+      })
+      .finally(() => {
+        consultando = false;
       });
   }, 1000);
 }
 
+function agregarResultados(nuevos) {
+  (nuevos || []).forEach(({ url, resultado }) => {
+    if (!resultadosGlobales[url]) {
+      resultadosGlobales[url] = [];
+    }
+    resultadosGlobales[url].push(resultado);
+  });
+}
+
+function cargarResultadosCompletos(taskId) {
+  // El resultado completo se descarga una sola vez al terminar
+  return fetch(`/resultados/${taskId}`)
+    .then(res => res.json())
+    .then(result => {
+      resultadosGlobales = result;
+      mostrarResultadosTabla(resultadosGlobales);
+      resetearInterfaz();
+      habilitarBotonesExportacion();
+    });
+}
+
+function cancelarAnalisis() {
+  if (!tareaActual) {
+    return;
+  }
+
+  fetch(`/cancelar/${tareaActual}`, { method: 'POST' })
+    .then(res => res.json())
+    .then(data => {
+      if (data.error) {
+        mostrarNotificacion(data.error, 'error');
+      }
+    })
+    .catch(error => {
+      console.error('Error cancelando análisis:', error);
+      mostrarNotificacion('Error al cancelar el análisis', 'error');
+    });
+}
+
 function actualizarBarra(valor) {
   const progressBar = document.getElementById('progressBar');
   const progressText = document.getElementById('progressText');
@@ -225,7 +386,6 @@ function actualizarBarra(valor) {
 function mostrarResultadosTabla(data) {
   const div = document.getElementById('tablaResultados');
   const resultsCard = document.getElementById('resultsCard');
-  const resultsStats = document.getElementById('resultsStats');
   
   div.innerHTML = '';
 
@@ -235,10 +395,30 @@ function mostrarResultadosTabla(data) {
     return;
   }
 
+  renderizarEstadisticas(data);
+
+  // Crear cards desplegables para cada URL
+  for (const url in data) {
+    const urlCard = crearUrlCard(url, data[url][0]);
+    const urlContent = urlCard.querySelector('.url-content');
+    
+    // Crear cards para cada repetición
+    data[url].forEach((result, index) => {
+      urlContent.appendChild(crearRepeticionCard(result, index));
+    });
+    
+    div.appendChild(urlCard);
+  }
+
+  resultsCard.style.display = 'block';
+}
+
+function renderizarEstadisticas(data) {
+  const resultsStats = document.getElementById('resultsStats');
+  
   // Calcular estadísticas
   const stats = calcularEstadisticas(data);
   
-  // Mostrar estadísticas
   resultsStats.innerHTML = `
     <div class="stat-card">
       <div class="stat-number">${stats.totalUrls}</div>
@@ -265,168 +445,235 @@ function mostrarResultadosTabla(data) {
       <div class="stat-label">HTTPS habilitado</div>
     </div>
   `;
+}
 
-  // Crear cards desplegables para cada URL
-  for (const url in data) {
-    const urlCard = document.createElement('div');
-    urlCard.className = 'url-card';
-    
-    // Header del card con información básica
-    const urlHeader = document.createElement('div');
-    urlHeader.className = 'url-header';
-    urlHeader.onclick = () => toggleUrlCard(urlCard);
-    
-    const urlTitle = document.createElement('h4');
-    urlTitle.className = 'url-title';
-    urlTitle.textContent = url;
-    
-    const urlBadges = document.createElement('div');
-    urlBadges.className = 'url-badges';
-    
-    const firstResult = data[url][0];
-    if (firstResult.speed_rating) {
-      const speedBadge = document.createElement('span');
-      speedBadge.className = `status-badge speed-${firstResult.speed_rating.toLowerCase().replace(' ', '-')}`;
-      speedBadge.textContent = firstResult.speed_rating;
-      urlBadges.appendChild(speedBadge);
-    }
-    
-    if (firstResult.status) {
-      const statusBadge = document.createElement('span');
-      statusBadge.className = `status-badge ${firstResult.status >= 200 && firstResult.status < 300 ? 'status-success' : 'status-error'}`;
-      statusBadge.textContent = firstResult.status;
-      urlBadges.appendChild(statusBadge);
-    }
-    
-    const toggleIcon = document.createElement('i');
-    toggleIcon.className = 'fas fa-chevron-down toggle-icon';
-    
-    urlHeader.appendChild(urlTitle);
-    urlHeader.appendChild(urlBadges);
-    urlHeader.appendChild(toggleIcon);
-    urlCard.appendChild(urlHeader);
-    
-    // Contenido desplegable
-    const urlContent = document.createElement('div');
-    urlContent.className = 'url-content';
-    
-    // Crear cards para cada repetición
-    data[url].forEach((result, index) => {
-      const repetitionCard = document.createElement('div');
-      repetitionCard.className = 'repetition-card';
-      
-      const repetitionHeader = document.createElement('div');
-      repetitionHeader.className = 'repetition-header';
-      
-      const repetitionTitle = document.createElement('h5');
-      repetitionTitle.className = 'repetition-title';
-      repetitionTitle.textContent = `Repetición ${index + 1}`;
-      
-      const repetitionToggle = document.createElement('button');
-      repetitionToggle.className = 'repetition-toggle';
-      repetitionToggle.innerHTML = '<i class="fas fa-chevron-down"></i>';
-      repetitionToggle.onclick = () => toggleRepetitionCard(repetitionContent, repetitionToggle);
-      
-      repetitionHeader.appendChild(repetitionTitle);
-      repetitionHeader.appendChild(repetitionToggle);
-      repetitionCard.appendChild(repetitionHeader);
-      
-      // Contenido de la repetición
-      const repetitionContent = document.createElement('div');
-      repetitionContent.className = 'repetition-content';
-      
-      // Contenedor con scroll horizontal para las métricas
-      const metricsContainer = document.createElement('div');
-      metricsContainer.className = 'metrics-container';
-      
-      const metricsGrid = document.createElement('div');
-      metricsGrid.className = 'metrics-grid';
-      
-      // Métricas básicas
-      const basicMetrics = crearSeccionMetricas('Métricas Básicas', {
-        'Status': result.status || 'N/A',
-        'Tiempo de carga': result.load_time_ms ? `${result.load_time_ms}ms` : 'N/A',
-        'Tamaño': result.size_kb ? `${result.size_kb} KB` : 'N/A',
-        'Compresión': result.compression_ratio ? `${result.compression_ratio}%` : 'N/A',
-        'GZIP': result.gzip_enabled ? 'Sí' : 'No',
-        'Redirects': result.redirect_count || 0
-      });
-      metricsGrid.appendChild(basicMetrics);
-      
-      // Métricas de rendimiento
-      const performanceMetrics = crearSeccionMetricas('Rendimiento', {
-        'Imágenes': result.image_count || 0,
-        'Scripts': result.script_count || 0,
-        'CSS': result.css_count || 0,
-        'Recursos externos': result.external_resources || 0,
-        'Estilos inline': result.inline_styles || 0,
-        'Scripts inline': result.inline_scripts || 0
-      });
-      metricsGrid.appendChild(performanceMetrics);
-      
-      // Métricas de SEO
-      const seoMetrics = crearSeccionMetricas('SEO', {
-        'Meta descripción': result.meta_description ? 'Sí' : 'No',
-        'Meta keywords': result.meta_keywords ? 'Sí' : 'No',
-        'URL canónica': result.canonical_url ? 'Sí' : 'No',
-        'H1': result.h1_count || 0,
-        'H2': result.h2_count || 0,
-        'H3': result.h3_count || 0,
-        'Open Graph': result.og_tags || 0,
-        'Twitter Cards': result.twitter_cards || 0
-      });
-      metricsGrid.appendChild(seoMetrics);
-      
-      // Métricas de seguridad
-      const securityMetrics = crearSeccionMetricas('Seguridad', {
-        'HTTPS': result.https_enabled ? 'Sí' : 'No',
-        'Headers de seguridad': result.security_headers || 0,
-        'Grado SSL': result.ssl_grade || 'N/A',
-        'Protección XSS': result.xss_protection ? 'Sí' : 'No',
-        'CSP': result.content_security_policy ? 'Sí' : 'No'
-      });
-      metricsGrid.appendChild(securityMetrics);
-      
-      // Métricas de accesibilidad
-      const accessibilityMetrics = crearSeccionMetricas('Accesibilidad', {
-        'Alt text imágenes': result.alt_text_images || 'N/A',
-        'Labels de formularios': result.form_labels || 0,
-        'ARIA labels': result.aria_labels || 0,
-        'HTML semántico': result.semantic_html || 0,
-        'Problemas de contraste': result.color_contrast_issues || 0
-      });
-      metricsGrid.appendChild(accessibilityMetrics);
-      
-      // Información adicional
-      const additionalMetrics = crearSeccionMetricas('Información Adicional', {
-        'Servidor': result.server || 'N/A',
-        'Tipo de contenido': result.content_type || 'N/A',
-        'Headers de cache': result.cache_headers || 0,
-        'Última modificación': result.last_modified || 'N/A',
-        'ETag': result.etag ? 'Sí' : 'No'
-      });
-      metricsGrid.appendChild(additionalMetrics);
-      
-      // Agregar métricas de HTML si están disponibles
-      if (result.html_lines && result.html_lines > 0) {
-        const htmlMetrics = crearSeccionMetricas('Código HTML', {
-          'Líneas de código': result.html_lines || 0,
-          'Caracteres': result.html_chars ? result.html_chars.toLocaleString() : 0
-        });
-        metricsGrid.appendChild(htmlMetrics);
-      }
-      
-      metricsContainer.appendChild(metricsGrid);
-      repetitionContent.appendChild(metricsContainer);
-      repetitionCard.appendChild(repetitionContent);
-      urlContent.appendChild(repetitionCard);
-    });
-    
-    urlCard.appendChild(urlContent);
-    div.appendChild(urlCard);
+function crearUrlCard(url, firstResult) {
+  const urlCard = document.createElement('div');
+  urlCard.className = 'url-card';
+  
+  // Header del card con información básica
+  const urlHeader = document.createElement('div');
+  urlHeader.className = 'url-header';
+  urlHeader.onclick = () => toggleUrlCard(urlCard);
+  
+  const urlTitle = document.createElement('h4');
+  urlTitle.className = 'url-title';
+  urlTitle.textContent = url;
+  
+  const urlBadges = document.createElement('div');
+  urlBadges.className = 'url-badges';
+  
+  if (firstResult.speed_rating) {
+    const speedBadge = document.createElement('span');
+    speedBadge.className = `status-badge speed-${firstResult.speed_rating.toLowerCase().replace(' ', '-')}`;
+    speedBadge.textContent = firstResult.speed_rating;
+    urlBadges.appendChild(speedBadge);
+  }
+  
+  if (firstResult.status) {
+    const statusBadge = document.createElement('span');
+    statusBadge.className = `status-badge ${firstResult.status >= 200 && firstResult.status < 300 ? 'status-success' : 'status-error'}`;
+    statusBadge.textContent = firstResult.status;
+    urlBadges.appendChild(statusBadge);
   }
+  
+  const toggleIcon = document.createElement('i');
+  toggleIcon.className = 'fas fa-chevron-down toggle-icon';
+  
+  urlHeader.appendChild(urlTitle);
+  urlHeader.appendChild(urlBadges);
+  urlHeader.appendChild(toggleIcon);
+  urlCard.appendChild(urlHeader);
+  
+  // Contenido desplegable
+  const urlContent = document.createElement('div');
+  urlContent.className = 'url-content';
+  urlCard.appendChild(urlContent);
+  
+  return urlCard;
+}
 
-  resultsCard.style.display = 'block';
+function crearRepeticionCard(result, index) {
+  const repetitionCard = document.createElement('div');
+  repetitionCard.className = 'repetition-card';
+  
+  const repetitionHeader = document.createElement('div');
+  repetitionHeader.className = 'repetition-header';
+  
+  const repetitionTitle = document.createElement('h5');
+  repetitionTitle.className = 'repetition-title';
+  repetitionTitle.textContent = `Repetición ${index + 1}`;
+  
+  const repetitionToggle = document.createElement('button');
+  repetitionToggle.className = 'repetition-toggle';
+  repetitionToggle.innerHTML = '<i class="fas fa-chevron-down"></i>';
+  repetitionToggle.onclick = () => toggleRepetitionCard(repetitionContent, repetitionToggle);
+  
+  repetitionHeader.appendChild(repetitionTitle);
+  repetitionHeader.appendChild(repetitionToggle);
+  repetitionCard.appendChild(repetitionHeader);
+  
+  // Contenido de la repetición
+  const repetitionContent = document.createElement('div');
+  repetitionContent.className = 'repetition-content';
+  
+  // Contenedor con scroll horizontal para las métricas
+  const metricsContainer = document.createElement('div');
+  metricsContainer.className = 'metrics-container';
+  
+  const metricsGrid = document.createElement('div');
+  metricsGrid.className = 'metrics-grid';
+  
+  // Métricas básicas
+  const basicMetrics = crearSeccionMetricas('Métricas Básicas', {
+    'Status': result.status || 'N/A',
+    'Tiempo de carga': result.load_time_ms ? `${result.load_time_ms}ms` : 'N/A',
+    'Tamaño': result.size_kb ? `${result.size_kb} KB` : 'N/A',
+    'Compresión': result.compression_ratio ? `${result.compression_ratio}%` : 'N/A',
+    'GZIP': result.gzip_enabled ? 'Sí' : 'No',
+    'Redirects': result.redirect_count || 0,
+    'Modo': result.mode || 'N/A',
+    'Conexión reutilizada': result.connection_reused ? 'Sí' : 'No'
+  });
+  metricsGrid.appendChild(basicMetrics);
+  
+  // Métricas de rendimiento
+  const performanceMetrics = crearSeccionMetricas('Rendimiento', {
+    'Imágenes': result.image_count || 0,
+    'Scripts': result.script_count || 0,
+    'CSS': result.css_count || 0,
+    'Recursos externos': result.external_resources || 0,
+    'Estilos inline': result.inline_styles || 0,
+    'Scripts inline': result.inline_scripts || 0
+  });
+  metricsGrid.appendChild(performanceMetrics);
+  
+  // Fases de la descarga
+  if (result.ttfb_ms !== undefined && result.ttfb_ms !== null) {
+    const phaseMetrics = crearSeccionMetricas('Fases de la Descarga', {
+      'DNS': `${result.dns_ms}ms`,
+      'Conexión TCP': `${result.connect_ms}ms`,
+      'TLS': `${result.tls_ms}ms`,
+      'TTFB': `${result.ttfb_ms}ms`,
+      'Descarga': `${result.download_ms}ms`,
+      'Último byte': result.ttlb_ms !== undefined && result.ttlb_ms !== null ? `${result.ttlb_ms}ms` : 'N/A',
+      'Velocidad de lectura': result.bytes_per_second ? `${(result.bytes_per_second / 1024).toFixed(1)} KB/s` : 'N/A',
+      'Cuerpo truncado': result.truncated ? 'Sí' : 'No',
+      'Espera en cola': result.queue_delay_ms !== undefined ? `${result.queue_delay_ms}ms` : 'N/A'
+    });
+    metricsGrid.appendChild(phaseMetrics);
+  }
+  
+  // Peso de la página (modo de subrecursos)
+  if (result.page_weight_kb !== undefined && result.page_weight_kb !== null) {
+    const tipos = result.subresource_weight_by_type || {};
+    const masLento = (result.slowest_subresources || [])[0];
+    const weightMetrics = crearSeccionMetricas('Peso de la Página', {
+      'Peso total': `${result.page_weight_kb} KB`,
+      'Subrecursos': `${result.subresource_count} (${result.subresource_kb} KB)`,
+      'CSS': tipos.css ? `${tipos.css.count} · ${tipos.css.kb} KB` : 'N/A',
+      'Scripts': tipos.script ? `${tipos.script.count} · ${tipos.script.kb} KB` : 'N/A',
+      'Imágenes': tipos.img ? `${tipos.img.count} · ${tipos.img.kb} KB` : 'N/A',
+      'Ruta crítica estimada': `${result.critical_path_ms}ms`,
+      'Más lento': masLento ? `${masLento.ms}ms` : 'N/A',
+      'Reutilizados de la tarea': result.subresource_cache_hits || 0,
+      'Errores': result.subresource_errors || 0
+    });
+    metricsGrid.appendChild(weightMetrics);
+  }
+  
+  // Compresión real de la transferencia (modo de compresión)
+  if (result.transfer_encodings) {
+    const codificaciones = result.transfer_encodings;
+    const simulados = result.compression_simulated || {};
+    const mejorSimulada = simulados[result.compression_best_simulated];
+    const enRed = (codificacion) => {
+      const medicion = codificaciones[codificacion];
+      if (!medicion || medicion.error) return 'N/A';
+      return `${(medicion.wire_bytes / 1024).toFixed(1)} KB (${medicion.content_encoding}) · ${medicion.ms}ms`;
+    };
+    const compressionMetrics = crearSeccionMetricas('Compresión en la Red', {
+      'identity': enRed('identity'),
+      'gzip': enRed('gzip'),
+      'br': enRed('br'),
+      'Mejor servida': result.compression_served || 'N/A',
+      'Ratio en la red': result.transfer_compression_ratio !== null ? `${result.transfer_compression_ratio}%` : 'N/A',
+      'Mejor simulada': mejorSimulada ? `${result.compression_best_simulated} · ${(mejorSimulada.bytes / 1024).toFixed(1)} KB` : 'N/A',
+      'Desperdicio': result.compression_waste_kb !== null ? `${result.compression_waste_kb} KB` : 'N/A',
+      'Tiempo desperdiciado': result.compression_waste_ms !== null ? `${result.compression_waste_ms}ms` : 'N/A',
+      'Brotli': result.brotli_enabled ? 'Sí' : 'No'
+    });
+    metricsGrid.appendChild(compressionMetrics);
+  }
+  
+  // Revalidación condicional
+  if (result.revalidated) {
+    const revalidationMetrics = crearSeccionMetricas('Revalidación', {
+      'Respuesta': result.not_modified ? '304 No modificado' : `${result.status} (modificado)`,
+      'Respondió': result.revalidation_source === 'cdn' ? 'CDN' : (result.revalidation_source === 'origin' ? 'Origen' : 'N/A'),
+      'Ahorro de tiempo': `${result.revalidation_saved_ms}ms`,
+      'Ahorro de tamaño': `${result.revalidation_saved_kb} KB`
+    });
+    metricsGrid.appendChild(revalidationMetrics);
+  }
+  
+  // Métricas de SEO
+  const seoMetrics = crearSeccionMetricas('SEO', {
+    'Meta descripción': result.meta_description ? 'Sí' : 'No',
+    'Meta keywords': result.meta_keywords ? 'Sí' : 'No',
+    'URL canónica': result.canonical_url ? 'Sí' : 'No',
+    'H1': result.h1_count || 0,
+    'H2': result.h2_count || 0,
+    'H3': result.h3_count || 0,
+    'Open Graph': result.og_tags || 0,
+    'Twitter Cards': result.twitter_cards || 0
+  });
+  metricsGrid.appendChild(seoMetrics);
+  
+  // Métricas de seguridad
+  const securityMetrics = crearSeccionMetricas('Seguridad', {
+    'HTTPS': result.https_enabled ? 'Sí' : 'No',
+    'Headers de seguridad': result.security_headers || 0,
+    'Grado SSL': result.ssl_grade || 'N/A',
+    'Protección XSS': result.xss_protection ? 'Sí' : 'No',
+    'CSP': result.content_security_policy ? 'Sí' : 'No'
+  });
+  metricsGrid.appendChild(securityMetrics);
+  
+  // Métricas de accesibilidad
+  const accessibilityMetrics = crearSeccionMetricas('Accesibilidad', {
+    'Alt text imágenes': result.alt_text_images || 'N/A',
+    'Labels de formularios': result.form_labels || 0,
+    'ARIA labels': result.aria_labels || 0,
+    'HTML semántico': result.semantic_html || 0,
+    'Problemas de contraste': result.color_contrast_issues || 0
+  });
+  metricsGrid.appendChild(accessibilityMetrics);
+  
+  // Información adicional
+  const additionalMetrics = crearSeccionMetricas('Información Adicional', {
+    'Servidor': result.server || 'N/A',
+    'Tipo de contenido': result.content_type || 'N/A',
+    'Headers de cache': result.cache_headers || 0,
+    'Última modificación': result.last_modified || 'N/A',
+    'ETag': result.etag ? 'Sí' : 'No'
+  });
+  metricsGrid.appendChild(additionalMetrics);
+  
+  // Agregar métricas de HTML si están disponibles
+  if (result.html_lines && result.html_lines > 0) {
+    const htmlMetrics = crearSeccionMetricas('Código HTML', {
+      'Líneas de código': result.html_lines || 0,
+      'Caracteres': result.html_chars ? result.html_chars.toLocaleString() : 0
+    });
+    metricsGrid.appendChild(htmlMetrics);
+  }
+  
+  metricsContainer.appendChild(metricsGrid);
+  repetitionContent.appendChild(metricsContainer);
+  repetitionCard.appendChild(repetitionContent);
+  
+  return repetitionCard;
 }
 
 function crearSeccionMetricas(titulo, metricas) {
@@ -594,6 +841,18 @@ function exportarCSV() {
   mostrarNotificacion('Archivo CSV exportado exitosamente', 'success');
 }
 
+function exportarDesdeServidor(formato) {
+  if (!ultimaTarea) {
+    mostrarNotificacion('No hay resultados para exportar', 'error');
+    return;
+  }
+
+  // El servidor genera el archivo desde su tabla columnar, sin pasar por el navegador
+  const a = document.createElement('a');
+  a.href = `/exportar/${ultimaTarea}?formato=${formato}`;
+  a.click();
+}
+
 function descargarArchivo(blob, nombreArchivo) {
   const url = URL.createObjectURL(blob);
   const a = document.createElement('a');
@@ -607,11 +866,14 @@ function resetearInterfaz() {
   document.getElementById('analyzeBtn').disabled = false;
   document.getElementById('analyzeBtn').innerHTML = '<i class="fas fa-play"></i> Iniciar Análisis';
   document.getElementById('loading').classList.remove('show');
+  document.getElementById('cancelBtn').style.display = 'none';
 }
 
 function habilitarBotonesExportacion() {
   document.getElementById('exportJsonBtn').disabled = false;
   document.getElementById('exportCsvBtn').disabled = false;
+  document.getElementById('exportNdjsonBtn').disabled = !ultimaTarea;
+  document.getElementById('exportColumnarBtn').disabled = !ultimaTarea;
 }
 
 function mostrarNotificacion(mensaje, tipo) {
@@ -0,0 +1,152 @@
+import asyncio
+import time
+from urllib.parse import urljoin, urlparse
+
+from fetcher import TAMANO_BLOQUE_DESCARGA, obtener_sesion
+
+METODOS_VALIDOS = ('GET', 'HEAD')
+METODO_DEFAULT = 'GET'
+MAX_POR_PAGINA_DEFAULT = 50
+CONCURRENCIA_DEFAULT = 8
+TIMEOUT_RECURSO = 10
+NUM_MAS_LENTOS = 5
+TIPOS_RECURSO = ('css', 'script', 'img')
+
+
+def resolver_recursos(url_pagina, recursos, max_por_pagina=MAX_POR_PAGINA_DEFAULT):
+    """
+    Convierte los (tipo, src, bloqueante) que encontró el extractor en URLs
+    absolutas http(s), sin repetidos ni data:/blob:, y retorna los primeros
+    max_por_pagina (los bloqueantes primero).
+    """
+    vistos = set()
+    resueltos = []
+    for tipo, src, bloqueante in recursos:
+        absoluta = urljoin(url_pagina, src.strip()).split('#', 1)[0]
+        if urlparse(absoluta).scheme not in ('http', 'https') or absoluta in vistos:
+            continue
+        vistos.add(absoluta)
+        resueltos.append((tipo, absoluta, bloqueante))
+    resueltos.sort(key=lambda recurso: not recurso[2])
+    return resueltos[:max_por_pagina]
+
+
+def medir_recurso(url, metodo=METODO_DEFAULT, timeout=TIMEOUT_RECURSO):
+    """
+    Pide un subrecurso con la sesión keep-alive de su host y retorna su status,
+    los bytes transferidos y el tiempo en ms. Con GET el cuerpo se cuenta por
+    bloques sin guardarlo ni descomprimirlo; con HEAD se usa Content-Length.
+    """
+    inicio = time.perf_counter()
+    try:
+        sesion = obtener_sesion(url)
+        if metodo == 'HEAD':
+            response = sesion.head(url, timeout=timeout, allow_redirects=True)
+            tamano = int(response.headers.get('Content-Length') or 0)
+        else:
+            with sesion.get(url, timeout=timeout, stream=True) as response:
+                tamano = sum(
+                    len(bloque) for bloque in response.raw.stream(TAMANO_BLOQUE_DESCARGA, decode_content=False)
+                )
+        error = None if response.ok else f"HTTP {response.status_code}"
+        status = response.status_code
+    except Exception as e:
+        status, tamano, error = 0, 0, str(e)
+    return {
+        'status': status,
+        'bytes': tamano,
+        'ms': round((time.perf_counter() - inicio) * 1000, 2),
+        'error': error
+    }
+
+
+def resumir_recursos(recursos, mediciones, resultado):
+    """
+    Campos de peso de la página a partir de los recursos resueltos y sus
+    mediciones ((medicion, reutilizado) en el mismo orden). La ruta crítica se
+    estima como la carga del HTML más el recurso bloqueante más lento, ya que
+    el navegador los pide en paralelo y no puede pintar hasta tenerlos.
+    """
+    por_tipo = {tipo: {'count': 0, 'kb': 0.0} for tipo in TIPOS_RECURSO}
+    total_bytes = 0
+    errores = 0
+    reutilizados = 0
+    bloqueo_ms = 0
+    detalle = []
+    for (tipo, url, bloqueante), (medicion, reutilizado) in zip(recursos, mediciones):
+        total_bytes += medicion['bytes']
+        por_tipo[tipo]['count'] += 1
+        por_tipo[tipo]['kb'] += medicion['bytes'] / 1024
+        if medicion['error']:
+            errores += 1
+        if reutilizado:
+            reutilizados += 1
+        if bloqueante and not medicion['error']:
+            bloqueo_ms = max(bloqueo_ms, medicion['ms'])
+        detalle.append({
+            'url': url,
+            'type': tipo,
+            'ms': medicion['ms'],
+            'kb': round(medicion['bytes'] / 1024, 2),
+            'blocking': bloqueante
+        })
+
+    for pesos in por_tipo.values():
+        pesos['kb'] = round(pesos['kb'], 2)
+    detalle.sort(key=lambda recurso: recurso['ms'], reverse=True)
+    return {
+        'subresource_count': len(recursos),
+        'subresource_kb': round(total_bytes / 1024, 2),
+        'page_weight_kb': round((resultado.get('size_bytes', 0) + total_bytes) / 1024, 2),
+        'subresource_weight_by_type': por_tipo,
+        'slowest_subresources': detalle[:NUM_MAS_LENTOS],
+        'critical_path_ms': round(resultado.get('load_time_ms', 0) + bloqueo_ms, 0),
+        'subresource_errors': errores,
+        'subresource_cache_hits': reutilizados
+    }
+
+
+class CacheRecursos:
+    """
+    Mediciones de subrecursos compartidas por todas las páginas de una tarea y
+    indexadas por URL absoluta: un recurso común a varias páginas se pide una
+    sola vez y las demás reutilizan su medición, aunque todavía esté en curso.
+    Se usa desde el loop de la tarea; las descargas van al pool de hilos que se
+    le pase, con a lo sumo `concurrencia` a la vez.
+    """
+
+    def __init__(self, metodo=METODO_DEFAULT, max_por_pagina=MAX_POR_PAGINA_DEFAULT,
+                 concurrencia=CONCURRENCIA_DEFAULT):
+        if metodo not in METODOS_VALIDOS:
+            raise ValueError(f"Método no válido: {metodo}")
+        self.metodo = metodo
+        self.max_por_pagina = max_por_pagina
+        self._limite = asyncio.Semaphore(concurrencia)
+        self._mediciones = {}
+
+    def __len__(self):
+        return len(self._mediciones)
+
+    async def _pedir(self, url, hilos):
+        async with self._limite:
+            return await asyncio.get_running_loop().run_in_executor(hilos, medir_recurso, url, self.metodo)
+
+    async def _medir(self, url, hilos):
+        medicion = self._mediciones.get(url)
+        reutilizado = medicion is not None
+        if medicion is None:
+            medicion = asyncio.ensure_future(self._pedir(url, hilos))
+            self._mediciones[url] = medicion
+        # shield: si se cancela una página no se cancela la medición que comparten otras
+        return await asyncio.shield(medicion), reutilizado
+
+    async def medir_pagina(self, url_pagina, recursos, resultado, hilos):
+        """Mide los subrecursos de una página y retorna sus campos de peso (ver resumir_recursos)"""
+        resueltos = resolver_recursos(url_pagina, recursos, self.max_por_pagina)
+        mediciones = await asyncio.gather(*(self._medir(url, hilos) for _, url, _ in resueltos))
+        return resumir_recursos(resueltos, mediciones, resultado)
+
+    def cancelar(self):
+        """Cancela las mediciones que sigan en curso"""
+        for medicion in self._mediciones.values():
+            medicion.cancel()
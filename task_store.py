@@ -0,0 +1,237 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from columnar import TablaResultados
+from latency_sketch import LatenciasPorUrl
+from load_test import SerieCarga
+
+# Almacén de tareas de la aplicación: "sqlite" (persistente, por defecto) o "memoria"
+ALMACEN_DEFAULT = os.environ.get('WEB_ANALYZER_ALMACEN', 'sqlite')
+RUTA_DB_DEFAULT = os.environ.get(
+    'WEB_ANALYZER_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tareas.db')
+)
+# Tareas terminadas que se mantienen cargadas en memoria y segundos sin uso antes de descargarlas
+MAX_EN_MEMORIA_DEFAULT = int(os.environ.get('WEB_ANALYZER_TAREAS_EN_MEMORIA', 16))
+TTL_DEFAULT = int(os.environ.get('WEB_ANALYZER_TTL_TAREAS', 300))
+
+ESTADOS_ACTIVOS = ('queued', 'processing')
+
+
+def nueva_tarea(total):
+    """Estructura en memoria de una tarea recién creada"""
+    return {
+        'status': 'queued',
+        'progress': 0,
+        'completados': 0,
+        'total': total,
+        'tabla': TablaResultados(),
+        'latencias': LatenciasPorUrl()
+    }
+
+
+def registrar_latencia(task, url, resultado):
+    """Agrega el tiempo de carga de un resultado a los sketches de la tarea"""
+    if resultado.get('load_time_ms'):
+        task['latencias'].agregar(url, resultado['load_time_ms'])
+
+
+def tabla_desde_blob(blob):
+    return TablaResultados.desde_bytes(blob) if blob else TablaResultados()
+
+
+class AlmacenTareas(ABC):
+    """
+    Interfaz del almacén de tareas. Se usa como un dict (tasks[task_id],
+    tasks.get(task_id)) y, además, terminar(task_id) avisa que la tarea ya no
+    va a cambiar para que el almacén pueda persistirla y sacarla de memoria.
+    """
+
+    @abstractmethod
+    def __setitem__(self, task_id, task):
+        pass
+
+    @abstractmethod
+    def get(self, task_id, default=None):
+        pass
+
+    @abstractmethod
+    def terminar(self, task_id):
+        pass
+
+    def __getitem__(self, task_id):
+        task = self.get(task_id)
+        if task is None:
+            raise KeyError(task_id)
+        return task
+
+    def __contains__(self, task_id):
+        return self.get(task_id) is not None
+
+
+class AlmacenMemoria(AlmacenTareas):
+    """Todas las tareas en un dict del proceso, sin límite ni persistencia"""
+
+    def __init__(self):
+        self._tareas = {}
+
+    def __setitem__(self, task_id, task):
+        self._tareas[task_id] = task
+
+    def get(self, task_id, default=None):
+        return self._tareas.get(task_id, default)
+
+    def terminar(self, task_id):
+        pass
+
+
+class AlmacenSQLite(AlmacenTareas):
+    """
+    Mantiene en memoria solo las tareas activas y un LRU acotado de tareas
+    terminadas (que además expiran tras ttl segundos sin uso). Las tareas
+    terminadas se guardan en SQLite con sus resultados en formato columnar y se vuelven a
+    cargar cuando se piden. Al arrancar, las tareas que quedaron a medias por
+    un reinicio se marcan como canceladas.
+    """
+
+    def __init__(self, ruta=RUTA_DB_DEFAULT, max_en_memoria=MAX_EN_MEMORIA_DEFAULT, ttl=TTL_DEFAULT):
+        self.ruta = ruta
+        self.max_en_memoria = max_en_memoria
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._activas = {}
+        self._terminadas = OrderedDict()  # task_id -> (task, último uso)
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self._crear_tablas()
+
+    def _crear_tablas(self):
+        with self._lock, self._conexion:
+            self._conexion.execute("""
+                CREATE TABLE IF NOT EXISTS tareas (
+                    task_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    progress INTEGER NOT NULL,
+                    completados INTEGER NOT NULL,
+                    total INTEGER NOT NULL,
+                    cache TEXT,
+                    creada REAL NOT NULL,
+                    actualizada REAL NOT NULL,
+                    registro BLOB,
+                    latencias TEXT,
+                    perfil TEXT,
+                    carga TEXT,
+                    rastreo TEXT
+                )
+            """)
+            self._conexion.execute(
+                "UPDATE tareas SET status = 'cancelled' WHERE status IN (?, ?)", ESTADOS_ACTIVOS
+            )
+
+    def __setitem__(self, task_id, task):
+        ahora = time.time()
+        with self._lock:
+            self._activas[task_id] = task
+            self._terminadas.pop(task_id, None)
+            with self._conexion:
+                self._conexion.execute(
+                    "INSERT OR REPLACE INTO tareas VALUES (?, ?, ?, ?, ?, NULL, ?, ?, NULL, NULL, NULL, NULL, NULL)",
+                    (task_id, task['status'], task['progress'], task['completados'], task['total'], ahora, ahora)
+                )
+
+    def get(self, task_id, default=None):
+        with self._lock:
+            task = self._activas.get(task_id)
+            if task is not None:
+                return task
+            entrada = self._terminadas.get(task_id)
+            if entrada is not None:
+                self._terminadas[task_id] = (entrada[0], time.monotonic())
+                self._terminadas.move_to_end(task_id)
+                self._purgar()
+                return entrada[0]
+
+            task = self._cargar(task_id)
+            if task is None:
+                return default
+            self._retener(task_id, task)
+            return task
+
+    def terminar(self, task_id):
+        """Persiste la tarea con sus resultados y la pasa al LRU de tareas terminadas"""
+        with self._lock:
+            task = self._activas.pop(task_id, None)
+            if task is None:
+                return
+            with self._conexion:
+                self._conexion.execute(
+                    "UPDATE tareas SET status = ?, progress = ?, completados = ?, total = ?, cache = ?, "
+                    "actualizada = ?, registro = ?, latencias = ?, perfil = ?, carga = ?, rastreo = ? "
+                    "WHERE task_id = ?",
+                    (task['status'], task['progress'], task['completados'], task['total'],
+                     json.dumps(task.get('cache')), time.time(), task['tabla'].a_bytes(),
+                     json.dumps(task['latencias'].a_dict()), task.get('perfil'),
+                     json.dumps(task['carga'].a_dict()) if 'carga' in task else None,
+                     json.dumps(task['rastreo']) if 'rastreo' in task else None, task_id)
+                )
+            self._retener(task_id, task)
+
+    def _cargar(self, task_id):
+        fila = self._conexion.execute(
+            "SELECT status, progress, completados, total, cache, registro, latencias, perfil, carga, rastreo "
+            "FROM tareas WHERE task_id = ?",
+            (task_id,)
+        ).fetchone()
+        if fila is None:
+            return None
+
+        status, progress, completados, total, cache, blob, latencias, perfil, carga, rastreo = fila
+        # Las tareas cortadas por un reinicio no llegaron a guardar resultados ni sketches
+        task = {
+            'status': status,
+            'progress': progress,
+            'completados': completados,
+            'total': total,
+            'tabla': tabla_desde_blob(blob),
+            'latencias': LatenciasPorUrl.desde_dict(json.loads(latencias)) if latencias else LatenciasPorUrl()
+        }
+        cache = json.loads(cache) if cache else None
+        if cache is not None:
+            task['cache'] = cache
+        if perfil is not None:
+            task['perfil'] = perfil
+        if carga:
+            task['carga'] = SerieCarga.desde_dict(json.loads(carga))
+        if rastreo:
+            task['rastreo'] = json.loads(rastreo)
+        return task
+
+    def _retener(self, task_id, task):
+        self._terminadas[task_id] = (task, time.monotonic())
+        self._terminadas.move_to_end(task_id)
+        self._purgar()
+
+    def _purgar(self):
+        """Descarga de memoria las tareas terminadas vencidas o que exceden el límite"""
+        limite = time.monotonic() - self.ttl
+        while self._terminadas:
+            task_id, (_, ultimo_uso) = next(iter(self._terminadas.items()))
+            if len(self._terminadas) <= self.max_en_memoria and ultimo_uso >= limite:
+                break
+            self._terminadas.popitem(last=False)
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.close()
+
+
+def crear_almacen(tipo=ALMACEN_DEFAULT):
+    """Crea el almacén de tareas configurado"""
+    if tipo == 'memoria':
+        return AlmacenMemoria()
+    if tipo == 'sqlite':
+        return AlmacenSQLite()
+    raise ValueError(f"Almacén de tareas no válido: {tipo}")
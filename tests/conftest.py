@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos del proyecto están en la raíz del repositorio
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+os.environ.setdefault('WEB_ANALYZER_ALMACEN', 'memoria')
+os.environ.setdefault('WEB_ANALYZER_HISTORIAL_ACTIVO', '0')
+
+
+@pytest.fixture(scope='session')
+def servidor():
+    """Servidor de páginas sintéticas compartido por los tests que descargan"""
+    from fixture_server import ServidorFixture
+    with ServidorFixture() as srv:
+        yield srv
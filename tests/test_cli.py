@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from cli import Corrida, guardar_checkpoint, leer_bases, leer_checkpoint, main, recuperar_salida
+
+
+URLS = [('https://a.com/', None), ('https://b.com/', 3), ('https://c.com/', None)]
+
+
+def pendientes(corrida):
+    return [(t['url'], t['indice']) for lote in corrida.lotes(2, {}) for t in lote]
+
+
+def test_mapa_de_bits_y_lotes():
+    corrida = Corrida(URLS, 2)
+    assert corrida.total == 7
+    corrida.marcar('https://b.com/', 1)
+    corrida.marcar('https://b.com/', 1)
+    corrida.marcar('https://b.com/', 7)
+    corrida.marcar('https://otra.com/', 0)
+    assert corrida.hechos == 1
+    assert ('https://b.com/', 1) not in pendientes(corrida)
+    assert len(pendientes(corrida)) == 6
+
+
+def test_reanudar_desde_checkpoint_y_salida_cortada(tmp_path):
+    ruta_salida = tmp_path / 'resultados.ndjson'
+    ruta_checkpoint = tmp_path / 'resultados.ndjson.checkpoint'
+
+    corrida = Corrida(URLS, 2)
+    with open(ruta_salida, 'wb') as salida:
+        for url, indice in [('https://a.com/', 0), ('https://b.com/', 2)]:
+            salida.write((json.dumps({'url': url, 'indice': indice, 'resultado': {}}) + '\n').encode())
+            corrida.marcar(url, indice)
+        guardar_checkpoint(str(ruta_checkpoint), corrida, salida)
+        # Después del checkpoint: una línea completa y otra a medias (corte abrupto)
+        salida.write((json.dumps({'url': 'https://c.com/', 'indice': 1, 'resultado': {}}) + '\n').encode())
+        salida.write(b'{"url": "https://a.com/", "ind')
+
+    reanudada = Corrida(URLS, 2)
+    desde = leer_checkpoint(str(ruta_checkpoint), reanudada)
+    assert reanudada.hechos == 2
+    recuperar_salida(str(ruta_salida), reanudada, desde)
+
+    assert reanudada.hechos == 3
+    assert set(pendientes(reanudada)) == {
+        ('https://a.com/', 1), ('https://b.com/', 0), ('https://b.com/', 1), ('https://c.com/', 0)
+    }
+    # La línea incompleta se cortó: la salida termina en una línea entera
+    contenido = ruta_salida.read_bytes()
+    assert contenido.endswith(b'\n') and len(contenido.splitlines()) == 3
+
+
+def test_checkpoint_de_otra_entrada_se_rechaza(tmp_path):
+    ruta_checkpoint = tmp_path / 'c.checkpoint'
+    corrida = Corrida(URLS, 2)
+    with open(tmp_path / 'salida', 'wb') as salida:
+        guardar_checkpoint(str(ruta_checkpoint), corrida, salida)
+    with pytest.raises(ValueError):
+        leer_checkpoint(str(ruta_checkpoint), Corrida(URLS, 3))
+    assert leer_checkpoint(str(tmp_path / 'no-existe'), corrida) == 0
+
+
+def test_a_medias_y_bases_de_revalidacion(tmp_path):
+    corrida = Corrida(URLS, 2)
+    corrida.marcar('https://a.com/', 0)
+    corrida.marcar('https://b.com/', 0)
+    corrida.marcar('https://c.com/', 0)
+    corrida.marcar('https://c.com/', 1)
+    corrida.marcar('https://b.com/', 2)
+    assert corrida.a_medias() == {'https://a.com/', 'https://b.com/'}
+
+    ruta = tmp_path / 'resultados.ndjson'
+    with open(ruta, 'w') as salida:
+        for url, indice in [('https://a.com/', 0), ('https://b.com/', 2), ('https://b.com/', 0), ('https://c.com/', 0)]:
+            salida.write(json.dumps({'url': url, 'indice': indice, 'resultado': {'etag': f"{url}{indice}"}}) + '\n')
+    assert leer_bases(str(ruta), corrida.a_medias()) == {
+        'https://a.com/': {'etag': 'https://a.com/0'},
+        'https://b.com/': {'etag': 'https://b.com/0'}
+    }
+
+
+def test_reanudar_con_revalidar_usa_la_primera_repeticion_escrita(servidor, tmp_path):
+    entrada = tmp_path / 'urls.txt'
+    entrada.write_text(servidor.url(kb=5) + '\n')
+    salida = tmp_path / 'resultados.ndjson'
+    argumentos = [str(entrada), '-o', str(salida), '-r', '2', '--revalidar', '-c', '2', '--procesos', '1']
+    assert main(argumentos) == 0
+
+    # Se pierde la segunda repetición: la corrida se reanuda solo con la primera escrita
+    primera = [linea for linea in salida.read_text().splitlines() if json.loads(linea)['indice'] == 0]
+    salida.write_text(primera[0] + '\n')
+    (tmp_path / 'resultados.ndjson.checkpoint').unlink()
+    assert main(argumentos) == 0
+
+    resultados = {item['indice']: item['resultado'] for item in map(json.loads, salida.read_text().splitlines())}
+    assert resultados[1]['revalidated'] is True
@@ -0,0 +1,72 @@
+import io
+
+import pytest
+
+from columnar import MAGIA, TablaResultados, generar_columnar, leer_resultados_columnar
+
+
+def resultados_variados():
+    """Resultados con formas distintas, nulos, booleanos, objetos y URLs repetidas"""
+    pares = []
+    for i in range(250):
+        url = f"https://ejemplo.com/p/{i % 7}"
+        if i % 10 == 0:
+            resultado = {'status': 0, 'error': 'Timeout', 'load_time_ms': None, 'title': 'Timeout'}
+        else:
+            resultado = {
+                'status': 200,
+                'error': None,
+                'load_time_ms': 100.0 + i,
+                'size_bytes': 1000 * i,
+                'title': f"Página {i % 7}",
+                'gzip_enabled': i % 2 == 0,
+                'server': 'nginx' if i % 3 else None,
+                'subresource_weight_by_type': {'css': {'count': i, 'kb': 1.5}} if i % 4 == 0 else None,
+                'ratio': 0.5 if i % 5 else 3
+            }
+        pares.append((url, resultado))
+    return pares
+
+
+@pytest.mark.parametrize('filas_por_bloque', [1, 16, 1000])
+def test_ida_y_vuelta_conserva_filas_y_orden_de_campos(filas_por_bloque):
+    pares = resultados_variados()
+    datos = b''.join(generar_columnar(pares, filas_por_bloque=filas_por_bloque))
+    assert datos.startswith(MAGIA)
+
+    leidos = list(leer_resultados_columnar(io.BytesIO(datos)))
+    assert leidos == pares
+    for (_, original), (_, leido) in zip(pares, leidos):
+        assert list(leido) == list(original)
+        for campo, valor in original.items():
+            assert type(leido[campo]) is type(valor)
+
+
+def test_tabla_a_bytes_y_desde_bytes():
+    pares = resultados_variados()
+    tabla = TablaResultados.desde_pares(pares)
+    assert len(tabla) == len(pares)
+
+    copia = TablaResultados.desde_bytes(tabla.a_bytes())
+    assert list(copia.filas()) == pares
+    assert copia.lista_urls() == tabla.lista_urls()
+    assert copia.resultados_de('https://ejemplo.com/p/3') == tabla.resultados_de('https://ejemplo.com/p/3')
+
+
+def test_lectura_con_stream_que_entrega_de_a_pocos_bytes():
+    class StreamLento(io.RawIOBase):
+        def __init__(self, datos):
+            self._datos = io.BytesIO(datos)
+
+        def read(self, n=-1):
+            return self._datos.read(min(n, 3) if n and n > 0 else 3)
+
+    pares = resultados_variados()
+    datos = b''.join(generar_columnar(pares, filas_por_bloque=50))
+    assert list(leer_resultados_columnar(StreamLento(datos))) == pares
+
+
+def test_archivo_vacio_y_magia_incorrecta():
+    assert list(leer_resultados_columnar(io.BytesIO(b''.join(generar_columnar([]))))) == []
+    with pytest.raises(ValueError):
+        list(leer_resultados_columnar(io.BytesIO(b'no es columnar')))
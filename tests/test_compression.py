@@ -0,0 +1,52 @@
+import zlib
+
+import pytest
+
+from compression import _Decodificador, brotli, resumir_compresion
+
+CUERPO = b'<html><body>' + b'<p>texto repetido</p>' * 2000 + b'</body></html>'
+
+
+def comprimir(wbits):
+    compresor = zlib.compressobj(6, zlib.DEFLATED, wbits)
+    return compresor.compress(CUERPO) + compresor.flush()
+
+
+@pytest.mark.parametrize('codificacion, wbits', [
+    ('gzip', 31), ('deflate', zlib.MAX_WBITS), ('deflate', -zlib.MAX_WBITS)
+])
+def test_decodifica_gzip_y_deflate_con_y_sin_cabecera(codificacion, wbits):
+    comprimido = comprimir(wbits)
+    decodificador = _Decodificador(codificacion)
+    for inicio in range(0, len(comprimido), 100):
+        decodificador.agregar(comprimido[inicio:inicio + 100])
+    assert decodificador.bytes == len(CUERPO)
+
+
+def test_gzip_invalido_no_se_reintenta_como_deflate():
+    with pytest.raises(zlib.error):
+        _Decodificador('gzip').agregar(comprimir(-zlib.MAX_WBITS))
+
+
+def medicion(codificacion, wire_bytes, decoded_bytes, decode_error=None):
+    return {
+        'status': 200, 'content_encoding': codificacion, 'wire_bytes': wire_bytes, 'decoded_bytes': decoded_bytes,
+        'decode_error': decode_error, 'ttfb_ms': 5.0, 'ms': 10.0, 'truncated': False, 'error': None
+    }
+
+
+def test_ratio_no_disponible_si_la_mejor_no_se_decodifica():
+    campos = resumir_compresion({
+        'identity': medicion('identity', 1000, 1000),
+        'gzip': medicion('gzip', 300, 1000),
+        'br': medicion('br', 250, None, 'brotli no está instalado: no se pueden decodificar respuestas br')
+    }, {})
+    assert campos['compression_served'] == 'br'
+    assert campos['transfer_compression_ratio'] is None
+    assert 'brotli' in campos['transfer_compression_ratio_error']
+
+
+@pytest.mark.skipif(brotli is not None, reason='brotli está instalado')
+def test_br_sin_brotli_explica_el_motivo():
+    with pytest.raises(ValueError, match='brotli'):
+        _Decodificador('br')
@@ -0,0 +1,81 @@
+import pytest
+
+from crawler import FiltroBloom, FronteraRastreo, canonicalizar_url
+
+
+def test_bloom_sin_falsos_negativos_y_tasa_de_falsos_positivos_acotada():
+    filtro = FiltroBloom(capacidad=20000, tasa_error=0.01)
+    agregadas = [f"https://ejemplo.com/p/{i}" for i in range(20000)]
+    assert all(filtro.agregar(url) or url in filtro for url in agregadas)
+    assert all(url in filtro for url in agregadas)
+
+    nuevas = [f"https://ejemplo.com/q/{i}" for i in range(20000)]
+    falsos_positivos = sum(url in filtro for url in nuevas)
+    # Margen sobre la tasa nominal por la varianza de la muestra
+    assert falsos_positivos / len(nuevas) < 0.02
+
+
+def test_bloom_agregar_informa_si_era_nueva():
+    filtro = FiltroBloom(capacidad=100)
+    assert filtro.agregar('a') is True
+    assert filtro.agregar('a') is False
+    assert len(filtro) == 1
+    with pytest.raises(ValueError):
+        FiltroBloom(capacidad=0)
+
+
+def test_canonicalizacion():
+    assert canonicalizar_url('HTTP://Ejemplo.COM:80/a/./b/../c?z=1&utm_source=x&a=2#frag') == \
+        'http://ejemplo.com/a/c?a=2&z=1'
+    assert canonicalizar_url('/x', 'https://ejemplo.com:8443/y/') == 'https://ejemplo.com:8443/x'
+    assert canonicalizar_url('mailto:a@b.com') is None
+    assert canonicalizar_url('https://ejemplo.com/foto.JPG') is None
+
+
+def frontera(**opciones):
+    f = FronteraRastreo(retraso_ms=0, capacidad_vistos=1000, **opciones)
+    f.agregar_host('https://ejemplo.com/')
+    return f
+
+
+def test_frontera_deduplica_filtra_externas_y_profundidad():
+    f = frontera(max_profundidad=1)
+    assert f.agregar_semilla('https://ejemplo.com/#inicio')
+    assert not f.agregar_semilla('https://EJEMPLO.com/')
+    assert not f.agregar('https://otro.com/', 1)
+    assert not f.agregar('https://ejemplo.com/lejos', 2)
+    assert f.agregar('https://ejemplo.com/cerca', 1)
+    estadisticas = f.estadisticas()
+    assert (estadisticas['admitidas'], estadisticas['repetidas'], estadisticas['externas']) == (2, 1, 1)
+
+
+def test_frontera_respeta_max_paginas_y_max_frontera():
+    f = frontera(max_paginas=5, max_frontera=3)
+    admitidas = [f.agregar(f"https://ejemplo.com/{i}", 1) for i in range(10)]
+    assert admitidas == [True] * 3 + [False] * 7
+    assert len(f) == 3 and not f.hay_lugar()
+    # Las descartadas por frontera llena no quedan como vistas: pueden volver a entrar
+    assert f.estadisticas()['descartadas'] == 7
+
+    while isinstance(f.siguiente(), tuple):
+        pass
+    assert f.agregar('https://ejemplo.com/3', 1)
+    assert f.agregar('https://ejemplo.com/4', 1)
+    assert f.completa()
+    assert not f.agregar('https://ejemplo.com/5', 1)
+
+
+def test_frontera_round_robin_y_retraso_por_host():
+    f = FronteraRastreo(retraso_ms=1000, capacidad_vistos=1000)
+    for host in ('https://a.com/', 'https://b.com/'):
+        f.agregar_host(host)
+        f.agregar(f"{host}1", 0)
+        f.agregar(f"{host}2", 0)
+
+    primeras = [f.siguiente(ahora=0.0)[0], f.siguiente(ahora=0.0)[0]]
+    assert sorted(primeras) == ['https://a.com/1', 'https://b.com/1']
+    # Los dos hosts están en su retraso de cortesía: se informa cuánto falta
+    assert f.siguiente(ahora=0.5) == pytest.approx(0.5)
+    assert isinstance(f.siguiente(ahora=1.0), tuple)
+    assert isinstance(f.siguiente(ahora=1.0), tuple)
+    assert f.siguiente(ahora=5.0) is None
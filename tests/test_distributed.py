@@ -0,0 +1,89 @@
+import pytest
+
+from distributed import ColaTrabajos, clave_coordinador
+
+
+def nueva_cola(duracion_lease=30, max_intentos=3, num_trabajos=3):
+    entregados = []
+    cola = ColaTrabajos(duracion_lease=duracion_lease, max_intentos=max_intentos)
+    trabajos = [{'url': f"https://ejemplo.com/{i}", 'mode': 'cold', 'indice': i} for i in range(num_trabajos)]
+    cola.agregar('t1', trabajos, lambda trabajo, resultado: entregados.append((trabajo['indice'], resultado)))
+    return cola, entregados
+
+
+def test_entrega_normal_y_liberar_devuelve_lo_no_entregado():
+    cola, entregados = nueva_cola()
+    lease = cola.pedir('w1', 2)
+    assert [t['indice'] for t in lease['trabajos']] == [0, 1]
+
+    assert cola.entregar(lease['lease'], lease['trabajos'][0]['clave'], {'error': None})
+    cola.liberar(lease['lease'])
+    assert [indice for indice, _ in entregados] == [0]
+    assert entregados[0][1]['intentos'] == 1
+
+    # El trabajo 1 volvió al frente de la cola
+    siguiente = cola.pedir('w2', 5)
+    assert [t['indice'] for t in siguiente['trabajos']] == [1, 2]
+
+
+def test_lease_vencido_se_reasigna_y_cuenta_intentos():
+    cola, entregados = nueva_cola(duracion_lease=-1, num_trabajos=1)
+    primero = cola.pedir('w1')
+    # El lease ya venció: el siguiente pedido lo reasigna con otro intento
+    segundo = cola.pedir('w2')
+    assert segundo['trabajos'][0]['clave'] == primero['trabajos'][0]['clave']
+
+    # El worker del lease vencido debe abandonarlo, pero su resultado vale si llega primero
+    assert cola.entregar(primero['lease'], primero['trabajos'][0]['clave'], {'error': None, 'worker': 'w1'}) is False
+    # El lease nuevo sigue válido; su resultado repetido se ignora
+    assert cola.entregar(segundo['lease'], segundo['trabajos'][0]['clave'], {'error': None, 'worker': 'w2'}) is True
+    assert len(entregados) == 1
+    assert entregados[0][1]['worker'] == 'w1'
+    assert entregados[0][1]['intentos'] == 2
+
+
+def test_tras_max_intentos_el_trabajo_falla_una_sola_vez():
+    cola, entregados = nueva_cola(duracion_lease=-1, max_intentos=2, num_trabajos=2)
+    assert cola.pedir('w1') is not None
+    assert cola.pedir('w1') is not None
+    # Segundo vencimiento: se agotaron los intentos
+    assert cola.pedir('w1') is None
+    cola.revisar()
+
+    assert sorted(indice for indice, _ in entregados) == [0, 1]
+    for _, resultado in entregados:
+        assert resultado['error'].startswith('Ningún worker entregó')
+        assert resultado['intentos'] == 2
+    assert cola.estado()['leases'] == 0
+
+
+def test_cancelar_tarea_invalida_leases_y_pendientes():
+    cola, entregados = nueva_cola()
+    lease = cola.pedir('w1', 1)
+    cola.cancelar_tarea('t1')
+    assert cola.pedir('w1') is None
+    assert cola.renovar(lease['lease']) is False
+    assert cola.entregar(lease['lease'], lease['trabajos'][0]['clave'], {'error': None}) is False
+    assert entregados == []
+
+
+def test_clave_del_coordinador_siempre_obligatoria():
+    assert clave_coordinador('0.0.0.0:5002', 'propia') == 'propia'
+    for direccion in ('127.0.0.1:5002', '0.0.0.0:5002'):
+        with pytest.raises(ValueError):
+            clave_coordinador(direccion)
+
+
+def test_liberar_no_permite_superar_max_intentos():
+    cola, entregados = nueva_cola(max_intentos=2, num_trabajos=2)
+    for _ in range(2):
+        lease = cola.pedir('w1', 1)
+        assert lease['trabajos'][0]['indice'] == 0
+        cola.liberar(lease['lease'])
+
+    # El trabajo 0 ya se entregó en 2 leases: falla y el siguiente lease trae el 1
+    lease = cola.pedir('w1', 5)
+    assert [t['indice'] for t in lease['trabajos']] == [1]
+    assert [indice for indice, _ in entregados] == [0]
+    assert entregados[0][1]['error'].startswith('Ningún worker entregó')
+    assert entregados[0][1]['intentos'] == 2
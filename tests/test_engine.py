@@ -0,0 +1,82 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from async_engine import MotorAnalisis
+from load_test import ProgramaCarga, SerieCarga
+
+
+@pytest.fixture
+def motor():
+    motor = MotorAnalisis(10, 1)
+    yield motor
+    motor.cerrar(cancelar=True)
+
+
+def test_ejecutar_analiza_cada_trabajo(servidor, motor):
+    trabajos = [
+        {'url': servidor.url(kb=20, semilla=i, redirecciones=i % 2, seguridad=1), 'indice': 0}
+        for i in range(6)
+    ]
+    resultados = []
+    asyncio.run(motor.ejecutar(trabajos, lambda trabajo, resultado: resultados.append(resultado)))
+
+    assert len(resultados) == len(trabajos)
+    for resultado in resultados:
+        assert resultado['error'] is None and resultado['status'] == 200
+        assert resultado['security_headers'] == 5
+        assert resultado['cache_hit'] is False
+    assert sorted(resultado['redirect_count'] for resultado in resultados) == [0, 0, 0, 1, 1, 1]
+
+
+def test_carga_acota_los_envios_pendientes(servidor, motor):
+    # El servidor tarda 300 ms y se piden 200 req/s con 2 cupos: casi todo se descarta
+    programa = ProgramaCarga(200, 1)
+    serie = SerieCarga.para(programa)
+    asyncio.run(motor.ejecutar_carga(
+        [servidor.url(kb=1, latencia_ms=300)], programa, lambda trabajo, resultado: serie.registrar(resultado),
+        max_en_vuelo=2
+    ))
+
+    resumen = serie.resumen()
+    assert resumen['completados'] + resumen['descartados'] == len(programa)
+    assert resumen['descartados'] > 0
+    # Los descartados no entran en la latencia: todas las medidas incluyen los 300 ms del servidor
+    assert resumen['latencia']['minimo'] >= 300
+
+
+def test_prueba_de_carga_acota_las_filas_guardadas(servidor, motor, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, 'MAX_FILAS_CARGA', 5)
+    payload = {'urls': [{'url': servidor.url(kb=1), 'repeticiones': 1}], 'carga': {'rps': 50, 'duracion_s': 1}}
+    programa = app.ProgramaCarga(**payload['carga'])
+    app.tasks['carga'] = app.nueva_tarea(len(programa))
+    app.tasks['carga']['carga'] = app.SerieCarga.para(programa)
+    # Las pruebas de carga no usan la cache de métricas: alcanza con el motor
+    asyncio.run(app.ejecutar_analisis('carga', payload, SimpleNamespace(motor=motor), historial=False))
+
+    task = app.tasks['carga']
+    assert task['status'] == 'done' and task['completados'] == len(programa)
+    assert len(task['tabla']) == 5
+    assert task['carga'].resumen()['completados'] + task['carga'].resumen()['descartados'] == len(programa)
+    assert task['latencias'].total.cuenta == len(programa)
+
+
+def test_compresion_medida_contra_gzip_y_sin_comprimir(servidor, motor):
+    resultados = {}
+    trabajos = [{'url': servidor.url(kb=100, gzip=gzip), 'indice': 0} for gzip in (0, 1)]
+    asyncio.run(motor.ejecutar(
+        trabajos, lambda trabajo, resultado: resultados.__setitem__(trabajo['url'], resultado), compresion={}
+    ))
+
+    sin_gzip, con_gzip = (resultados[trabajo['url']] for trabajo in trabajos)
+    assert sin_gzip['compression_served'] == 'identity' and sin_gzip['gzip_enabled'] is False
+    assert sin_gzip['transfer_compression_ratio'] == 100.0
+    assert sin_gzip['compression_waste_kb'] > 50
+
+    assert con_gzip['compression_served'] == 'gzip' and con_gzip['gzip_enabled'] is True
+    medicion = con_gzip['transfer_encodings']['gzip']
+    assert medicion['decoded_bytes'] == con_gzip['size_bytes'] > medicion['wire_bytes']
+    assert con_gzip['transfer_compression_ratio'] < 50
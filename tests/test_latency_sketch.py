@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from latency_sketch import HistogramaLatencias, LatenciasPorUrl
+
+
+def exacto(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[int(p / 100 * (len(ordenados) - 1))]
+
+
+def valores_lognormales(n, semilla):
+    generador = random.Random(semilla)
+    return [generador.lognormvariate(4, 1) for _ in range(n)]
+
+
+@pytest.mark.parametrize('p', [50, 90, 95, 99])
+def test_percentil_con_error_relativo_acotado(p):
+    valores = valores_lognormales(20000, 1)
+    sketch = HistogramaLatencias()
+    for valor in valores:
+        sketch.agregar(valor)
+    assert sketch.percentil(p) == pytest.approx(exacto(valores, p), rel=sketch.precision)
+
+
+def test_fusionar_equivale_a_agregar_todo_junto():
+    partes = [valores_lognormales(5000, semilla) for semilla in range(4)]
+    fusionado = HistogramaLatencias()
+    for parte in partes:
+        sketch = HistogramaLatencias()
+        for valor in parte:
+            sketch.agregar(valor)
+        fusionado.fusionar(sketch)
+
+    junto = HistogramaLatencias()
+    todos = [valor for parte in partes for valor in parte]
+    for valor in todos:
+        junto.agregar(valor)
+
+    assert fusionado.buckets == junto.buckets
+    assert (fusionado.cuenta, fusionado.minimo, fusionado.maximo) == (junto.cuenta, junto.minimo, junto.maximo)
+    for p in (50, 99):
+        assert fusionado.percentil(p) == junto.percentil(p)
+        assert fusionado.percentil(p) == pytest.approx(exacto(todos, p), rel=fusionado.precision)
+
+
+def test_fusionar_precisiones_distintas_falla():
+    with pytest.raises(ValueError):
+        HistogramaLatencias(0.01).fusionar(HistogramaLatencias(0.02))
+
+
+def test_ida_y_vuelta_por_dict_y_por_url():
+    latencias = LatenciasPorUrl()
+    for i, valor in enumerate(valores_lognormales(1000, 7) + [0.0]):
+        latencias.agregar(f"https://ejemplo.com/{i % 3}", valor)
+    copia = LatenciasPorUrl.desde_dict(latencias.a_dict())
+    assert copia.a_dict() == latencias.a_dict()
+
+    otra = LatenciasPorUrl.desde_dict(latencias.a_dict())
+    copia.fusionar(otra)
+    assert copia.total.cuenta == 2 * latencias.total.cuenta
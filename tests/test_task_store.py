@@ -0,0 +1,34 @@
+import sqlite3
+
+from columnar import MAGIA
+from task_store import AlmacenSQLite, nueva_tarea, registrar_latencia
+
+
+def test_tarea_terminada_se_guarda_en_columnar_y_se_recarga(tmp_path):
+    ruta = str(tmp_path / 'tareas.db')
+    almacen = AlmacenSQLite(ruta, max_en_memoria=0)
+    task = nueva_tarea(3)
+    almacen['t1'] = task
+    for i in range(3):
+        resultado = {'status': 200, 'load_time_ms': 100.0 + i, 'error': None}
+        task['tabla'].agregar('https://ejemplo.com/', resultado)
+        registrar_latencia(task, 'https://ejemplo.com/', resultado)
+    task.update(status='done', progress=100, completados=3)
+    almacen.terminar('t1')
+
+    # Con max_en_memoria=0 la tarea sale de memoria y se lee de SQLite
+    cargada = almacen.get('t1')
+    assert cargada is not task
+    assert list(cargada['tabla'].filas()) == list(task['tabla'].filas())
+    assert cargada['latencias'].a_dict() == task['latencias'].a_dict()
+    almacen.cerrar()
+
+    with sqlite3.connect(ruta) as conexion:
+        registro, = conexion.execute("SELECT registro FROM tareas WHERE task_id = 't1'").fetchone()
+    assert registro.startswith(MAGIA)
+
+
+def test_tareas_en_curso_quedan_canceladas_al_reabrir(tmp_path):
+    ruta = str(tmp_path / 'tareas.db')
+    AlmacenSQLite(ruta)['t1'] = nueva_tarea(1)
+    assert AlmacenSQLite(ruta).get('t1')['status'] == 'cancelled'
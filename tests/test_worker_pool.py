@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from worker_pool import PoolTareas
+
+
+@pytest.fixture
+def pool():
+    pool = PoolTareas(max_tareas=1, max_en_vuelo=2, procesos_parseo=1)
+    pool.iniciar()
+    yield pool
+    pool.cerrar()
+
+
+def tarea(eventos, task_id, corridas, canceladas):
+    async def correr(_pool):
+        corridas.append(task_id)
+        try:
+            while not eventos[task_id].is_set():
+                await asyncio.sleep(0.01)
+        except asyncio.CancelledError:
+            canceladas.append(task_id)
+            raise
+    return correr
+
+
+def esperar(condicion, segundos=5):
+    limite = time.monotonic() + segundos
+    while not condicion():
+        if time.monotonic() > limite:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_cola_con_prioridad_y_cancelacion(pool):
+    eventos = {task_id: threading.Event() for task_id in ('a', 'b', 'c', 'd')}
+    corridas, canceladas = [], []
+    pool.enviar('a', tarea(eventos, 'a', corridas, canceladas))
+    assert esperar(lambda: corridas == ['a'])
+
+    # Con un solo cupo el resto espera; la prioridad adelanta a 'c'
+    pool.enviar('b', tarea(eventos, 'b', corridas, canceladas))
+    pool.enviar('c', tarea(eventos, 'c', corridas, canceladas), prioridad=1)
+    pool.enviar('d', tarea(eventos, 'd', corridas, canceladas))
+    assert esperar(lambda: pool.tareas_en_cola() == 3)
+    assert [pool.posicion_en_cola(task_id) for task_id in ('c', 'b', 'd', 'a')] == [1, 2, 3, None]
+
+    # Cancelar una tarea en espera la saca de la cola sin ejecutarla
+    assert pool.cancelar('b')
+    assert pool.cancelar('no-existe') is False
+
+    # Cancelar la activa libera el cupo para la siguiente
+    assert pool.cancelar('a')
+    assert esperar(lambda: corridas == ['a', 'c'])
+    assert canceladas == ['a']
+
+    eventos['c'].set()
+    assert esperar(lambda: corridas == ['a', 'c', 'd'])
+    eventos['d'].set()
+    assert esperar(lambda: pool.tareas_activas() == 0 and pool.tareas_en_cola() == 0)
+    assert 'b' not in corridas
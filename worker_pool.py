@@ -0,0 +1,133 @@
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+
+from async_engine import MotorAnalisis, MAX_EN_VUELO_DEFAULT
+from cache import GestorCache, MAX_ENTRADAS_DEFAULT
+
+# Configuración del pool de la aplicación
+MAX_TAREAS_DEFAULT = int(os.environ.get('WEB_ANALYZER_MAX_TAREAS', 4))
+MAX_EN_VUELO_POOL = int(os.environ.get('WEB_ANALYZER_MAX_EN_VUELO', 2 * MAX_EN_VUELO_DEFAULT))
+PROCESOS_PARSEO_POOL = int(os.environ.get('WEB_ANALYZER_PROCESOS_PARSEO', 0)) or None
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class PoolTareas:
+    """
+    Pool de workers de toda la aplicación. Mantiene un MotorAnalisis de larga
+    vida sobre un loop asyncio en su propio hilo y una cola de tareas con
+    prioridad: como máximo max_tareas se ejecutan a la vez y el resto espera
+    en estado "queued". Las tareas activas comparten los cupos de descarga de
+    forma justa y se pueden cancelar en cualquier momento.
+    """
+
+    def __init__(self, max_tareas=MAX_TAREAS_DEFAULT, max_en_vuelo=MAX_EN_VUELO_DEFAULT, procesos_parseo=None):
+        self.max_tareas = max_tareas
+        self.motor = MotorAnalisis(max_en_vuelo, procesos_parseo)
+        self.loop = asyncio.new_event_loop()
+        self._hilo = threading.Thread(target=self._correr_loop, name='pool-tareas', daemon=True)
+        self._gestor_cache = GestorCache()
+        self._lock = threading.Lock()
+        self._cola = []  # heap de (-prioridad, secuencia, task_id, fabrica)
+        self._secuencia = itertools.count()
+        self._activas = {}
+        self._iniciado = False
+
+    def _correr_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def iniciar(self):
+        """Arranca el loop, el proceso de la cache y precalienta los workers de parseo"""
+        with self._lock:
+            if self._iniciado:
+                return
+            self._iniciado = True
+        self._gestor_cache.start()
+        self.motor.precalentar()
+        self._hilo.start()
+
+    def nueva_cache(self, max_entradas=MAX_ENTRADAS_DEFAULT):
+        """Crea una cache de métricas compartible entre los procesos de parseo"""
+        return self._gestor_cache.CacheMetricas(max_entradas)
+
+    def enviar(self, task_id, fabrica, prioridad=0):
+        """
+        Encola una tarea. fabrica(pool) debe retornar la corrutina a ejecutar;
+        se llama recién cuando la tarea sale de la cola.
+        """
+        with self._lock:
+            heapq.heappush(self._cola, (-prioridad, next(self._secuencia), task_id, fabrica))
+        self.loop.call_soon_threadsafe(self._admitir)
+
+    def posicion_en_cola(self, task_id):
+        """Posición (desde 1) de una tarea en espera, o None si no está en la cola"""
+        with self._lock:
+            ordenadas = sorted(self._cola)
+        for posicion, entrada in enumerate(ordenadas, start=1):
+            if entrada[2] == task_id:
+                return posicion
+        return None
+
+    def tareas_activas(self):
+        with self._lock:
+            return len(self._activas)
+
+    def tareas_en_cola(self):
+        with self._lock:
+            return len(self._cola)
+
+    def cancelar(self, task_id):
+        """Saca una tarea de la cola o cancela su ejecución. Retorna False si no existe"""
+        with self._lock:
+            for i, entrada in enumerate(self._cola):
+                if entrada[2] == task_id:
+                    self._cola.pop(i)
+                    heapq.heapify(self._cola)
+                    return True
+            ejecucion = self._activas.get(task_id)
+        if ejecucion is None:
+            return False
+        self.loop.call_soon_threadsafe(ejecucion.cancel)
+        return True
+
+    def _admitir(self):
+        """Arranca tareas de la cola mientras haya lugar (se ejecuta en el loop)"""
+        while True:
+            with self._lock:
+                if len(self._activas) >= self.max_tareas or not self._cola:
+                    return
+                _, _, task_id, fabrica = heapq.heappop(self._cola)
+                ejecucion = self.loop.create_task(fabrica(self))
+                self._activas[task_id] = ejecucion
+            ejecucion.add_done_callback(lambda _, task_id=task_id: self._terminar(task_id))
+
+    def _terminar(self, task_id):
+        with self._lock:
+            self._activas.pop(task_id, None)
+        self._admitir()
+
+    def cerrar(self):
+        """Cancela todo y libera los workers"""
+        with self._lock:
+            self._cola.clear()
+            activas = list(self._activas.values())
+        for ejecucion in activas:
+            self.loop.call_soon_threadsafe(ejecucion.cancel)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.motor.cerrar(cancelar=True)
+        self._gestor_cache.shutdown()
+
+
+def obtener_pool():
+    """Retorna el pool de la aplicación, creándolo y precalentándolo la primera vez"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PoolTareas(MAX_TAREAS_DEFAULT, MAX_EN_VUELO_POOL, PROCESOS_PARSEO_POOL)
+            _pool.iniciar()
+        return _pool